@@ -1,30 +1,195 @@
 from __future__ import annotations
-from collections.abc import Iterator
-from dataclasses import dataclass
+from collections.abc import Callable, Iterator, Mapping
+from dataclasses import dataclass, fields
+import math
+import weakref
 from logging_setup import logging
 
 log = logging.getLogger(__name__)
 
+# Maps the structural key of every live node to the node itself. Entries vanish once
+# nothing else references the node, so the table never keeps a tree alive.
+_UNIQUE_TABLE: weakref.WeakValueDictionary[tuple, AlgebraNode] = (
+    weakref.WeakValueDictionary()
+)
 
-class AlgebraNode:
-    def children(self) -> list[AlgebraNode]:
-        ret = []
-        for value in vars(self).values():
-            if isinstance(value, AlgebraNode):
-                ret.append(value)
-            if isinstance(value, tuple):
-                ret.extend(value)
-        return ret
+# empty frozensets are not shared by the interpreter, so numeric nodes share this one
+_NO_VARS: frozenset[str] = frozenset()
 
-    def walk(self) -> Iterator["AlgebraNode"]:
-        """Gets all nodes of the tree."""
-        # log.debug(f"walking {self}")
-        yield self
-        for child in self.children():
-            yield from child.walk()
+def number_key(value: int | float | complex) -> tuple:
+    """
+    Returns a key that tells numbers apart if they print differently: 1 == 1.0 and 0.0 == -0.0,
+    so the type and the signs of float and complex zeros are part of it
+    """
+    kind = type(value)
+    if kind is float:
+        return (kind, value, math.copysign(1.0, value))  # type: ignore[arg-type]
+    if kind is complex:
+        return (
+            kind,
+            value,
+            math.copysign(1.0, value.real),
+            math.copysign(1.0, value.imag),
+        )
+    return (kind, value)
+
+
+# methods every node class has to define, the base class only declares them
+_NODE_METHODS = ("children", "with_children")
+
+
+class _Interned(type):
+    """
+    Metaclass that hash-conses node construction.
+
+    Calling a node class looks the structural key (class + fields) up in the unique table
+    first, so building a node that already exists returns the existing object. Children
+    are interned before their parents, which makes the key's hash and equality shallow:
+    child hashes are cached and children compare by identity.
 
+    It also checks that every node class below the base defines _NODE_METHODS.
+    """
+
+    def __init__(cls, name: str, bases: tuple[type, ...], namespace: dict, **kwargs):
+        super().__init__(name, bases, namespace, **kwargs)
+        # the base is the only class without an interned base of its own
+        if any(isinstance(base, _Interned) for base in bases):
+            missing = [
+                method for method in _NODE_METHODS if not callable(getattr(cls, method, None))
+            ]
+            if missing:
+                raise TypeError(f"the node class {name} does not define {', '.join(missing)}")
+
+    def __call__(cls, *args, **kwargs):
+        if kwargs:
+            args = cls._bind_args(args, kwargs)
+        key = cls._intern_key(*args)
+        node = _UNIQUE_TABLE.get(key)
+        if node is None:
+            node = super().__call__(*args)
+            object.__setattr__(node, "_hash", hash(key))
+            node._set_metadata()
+            node = _UNIQUE_TABLE.setdefault(key, node)
+        return node
+
+    def _bind_args(cls, args: tuple, kwargs: dict) -> tuple:
+        names = [f.name for f in fields(cls)]  # type: ignore[arg-type]
+        return (*args, *(kwargs[name] for name in names[len(args) :]))
+
+    def _intern_key(cls, *args) -> tuple:
+        return (cls, *args)
+
+
+class AlgebraNode(metaclass=_Interned):
+    """
+    Base class of the algebra tree.
+
+    Nodes are interned: structurally equal nodes are the same object, so equality is an
+    identity check and the hash is computed once, when the node is first built.
+    The metadata below is derived from the children at the same time, so reading it is O(1).
+
+    Attributes:
+        free_vars (frozenset[str]): The names of all variables in the subtree.
+        size (int): The number of nodes in the subtree.
+        depth (int): The length of the longest root-to-leaf path, a leaf has depth 1.
+        is_numeric (bool): True if the subtree contains no variables.
+        is_polynomial (bool): True if the subtree is a polynomial in its variables, i.e. it only
+            raises them to literal natural exponents and only inverts numeric subtrees.
+    """
+
+    __slots__ = (
+        "_hash",
+        "free_vars",
+        "size",
+        "depth",
+        "is_numeric",
+        "is_polynomial",
+        "__weakref__",
+    )
+
+    _hash: int
+    free_vars: frozenset[str]
+    size: int
+    depth: int
+    is_numeric: bool
+    is_polynomial: bool
+    # defined by every subclass (see _Interned): the direct children, in field order
+    children: Callable[[], tuple[AlgebraNode, ...]]
+    # the node of the same type with the given children in place of its own, in field order
+    with_children: Callable[[tuple[AlgebraNode, ...]], AlgebraNode]
+
+    def _set_metadata(self) -> None:
+        free_vars = _NO_VARS
+        size = 1
+        depth = 0
+        polynomial = True
+        for child in self.children():
+            # share the child's set whenever it already covers everything seen so far
+            if child.free_vars and not child.free_vars <= free_vars:
+                free_vars = free_vars | child.free_vars if free_vars else child.free_vars
+            size += child.size
+            depth = max(depth, child.depth)
+            polynomial = polynomial and child.is_polynomial
+        object.__setattr__(self, "free_vars", free_vars)
+        object.__setattr__(self, "size", size)
+        object.__setattr__(self, "depth", depth + 1)
+        object.__setattr__(self, "is_numeric", not free_vars)
+        object.__setattr__(self, "is_polynomial", self._is_polynomial(polynomial))
+
+    def _is_polynomial(self, children_polynomial: bool) -> bool:
+        """Decides is_polynomial, given whether all children are polynomials"""
+        return children_polynomial
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        # the whole tree is pickled as its binary form (see serialize.py): compact, without
+        # recursion however deep it is, and unpickled through the constructors, so interned
+        from serialize import from_bytes, to_bytes  # serialize imports this module
+
+        return (from_bytes, (to_bytes(self),))
+
+    def __copy__(self) -> AlgebraNode:
+        return self
+
+    def __deepcopy__(self, memo: dict) -> AlgebraNode:
+        return self
 
-@dataclass(frozen=True)
+    def walk(self) -> Iterator["AlgebraNode"]:
+        """Gets all nodes of the tree, in pre-order."""
+        # an explicit stack instead of nested generators, which cost O(depth) per node
+        stack: list[AlgebraNode] = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children()))
+
+    def substitute(self, bindings: Mapping[str, AlgebraNode]) -> AlgebraNode:
+        """
+        Replaces the variables named in bindings by their nodes. Subtrees without any of them
+        are kept as they are, so the cost depends on the paths to the replaced variables
+        """
+        names = frozenset(bindings)
+        done: dict[AlgebraNode, AlgebraNode] = {}
+        stack: list[tuple[AlgebraNode, bool]] = [(self, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node in done:
+                continue
+            if node.free_vars.isdisjoint(names):
+                done[node] = node
+            elif isinstance(node, Var):
+                done[node] = bindings[node.name]
+            elif not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children())
+            else:
+                done[node] = node.with_children(tuple(done[child] for child in node.children()))
+        return done[self]
+
+
+@dataclass(frozen=True, eq=False, slots=True)
 class Num(AlgebraNode):
     """
     A numeric literal node.
@@ -35,11 +200,23 @@ class Num(AlgebraNode):
 
     value: int | float
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return ()
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        if children:
+            raise ValueError(f"{type(self).__name__} nodes have no children")
+        return self
+
+    @classmethod
+    def _intern_key(cls, value: int | float) -> tuple:
+        return (cls, *number_key(value))
+
     def __repr__(self) -> str:
         return str(self.value)
 
 
-@dataclass(repr=False, frozen=True)
+@dataclass(repr=False, frozen=True, eq=False, slots=True)
 class Var(AlgebraNode):
     """
     A symbolic variable node.
@@ -50,11 +227,26 @@ class Var(AlgebraNode):
 
     name: str
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return ()
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        if children:
+            raise ValueError(f"{type(self).__name__} nodes have no children")
+        return self
+
+    def _set_metadata(self) -> None:
+        object.__setattr__(self, "free_vars", frozenset((self.name,)))
+        object.__setattr__(self, "size", 1)
+        object.__setattr__(self, "depth", 1)
+        object.__setattr__(self, "is_numeric", False)
+        object.__setattr__(self, "is_polynomial", True)
+
     def __repr__(self) -> str:
         return self.name
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Neg(AlgebraNode):
     """
     A unary negation node.
@@ -65,13 +257,20 @@ class Neg(AlgebraNode):
 
     expr: AlgebraNode
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return (self.expr,)
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        (expr,) = children
+        return type(self)(expr)
+
     def __repr__(self) -> str:
         if isinstance(self.expr, (Num, Var)):
             return f"-({self.expr!r})"
         return f"-({self.expr!r})"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Sum(AlgebraNode):
     """
     An n-ary addition node.
@@ -82,11 +281,17 @@ class Sum(AlgebraNode):
 
     terms: tuple[AlgebraNode, ...]
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return self.terms
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        return Sum(tuple(children))
+
     def __repr__(self) -> str:
         return "(" + " + ".join(repr(term) for term in self.terms) + ")"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Prod(AlgebraNode):
     """
     An n-ary multiplication node.
@@ -97,6 +302,12 @@ class Prod(AlgebraNode):
 
     factors: tuple[AlgebraNode, ...]
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return self.factors
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        return Prod(tuple(children))
+
     def __repr__(self) -> str:
         out = str(self.factors[0])
         for factor1, factor2 in zip(self.factors, self.factors[1:]):
@@ -107,7 +318,7 @@ class Prod(AlgebraNode):
         return out
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Pow(AlgebraNode):
     """
     An exponentiation node.
@@ -120,11 +331,27 @@ class Pow(AlgebraNode):
     base: AlgebraNode
     exp: AlgebraNode
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return (self.base, self.exp)
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        base, exp = children
+        return Pow(base, exp)
+
+    def _is_polynomial(self, children_polynomial: bool) -> bool:
+        if not children_polynomial or not self.exp.is_numeric:
+            return False
+        if self.base.is_numeric:
+            return True
+        # x^2 is a polynomial, x^(1+1) might be one, but that is only known after evaluating it
+        exp = self.exp
+        return isinstance(exp, Num) and type(exp.value) is int and exp.value >= 0
+
     def __repr__(self) -> str:
         return f"({self.base!r}^{self.exp!r})"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Inv(AlgebraNode):
     """
     A multiplicative inverse node.
@@ -135,5 +362,15 @@ class Inv(AlgebraNode):
 
     expr: AlgebraNode
 
+    def children(self) -> tuple[AlgebraNode, ...]:
+        return (self.expr,)
+
+    def with_children(self, children: tuple[AlgebraNode, ...]) -> AlgebraNode:
+        (expr,) = children
+        return type(self)(expr)
+
+    def _is_polynomial(self, children_polynomial: bool) -> bool:
+        return self.expr.is_numeric
+
     def __repr__(self) -> str:
         return f"({self.expr!r})⁻¹"
@@ -1,21 +1,24 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from collections.abc import Iterable
 from tokens import TokenKind
 
 
 class Node:
+    __slots__ = ()
+
     def children(self) -> Iterable["Node"]:
-        return tuple(value for value in vars(self).values() if isinstance(value, Node))
+        return ()
 
     def label(self) -> str:
         parts = []
-        for name, value in vars(self).items():
+        for field in fields(self):  # type: ignore[arg-type]
+            value = getattr(self, field.name)
             if isinstance(value, Node):
                 continue
             if isinstance(value, TokenKind):
-                parts.append(f"{name}={value.name}")
+                parts.append(f"{field.name}={value.name}")
             else:
-                parts.append(f"{name}={value!r}")
+                parts.append(f"{field.name}={value!r}")
         return f"{self.__class__.__name__}({', '.join(parts)})"
 
     def pretty(self, prefix: str = "", is_last: bool = True) -> str:
@@ -38,27 +41,33 @@ class Node:
 
 
 class Leaf(Node):
-    pass
+    __slots__ = ()
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Number(Leaf):
     value: int | float
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Symbol(Leaf):
     name: str
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Unary(Node):
     op: TokenKind
     expr: Node
 
+    def children(self) -> Iterable[Node]:
+        return (self.expr,)
+
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Binary(Node):
     op: TokenKind
     left: Node
     right: Node
+
+    def children(self) -> Iterable[Node]:
+        return (self.left, self.right)
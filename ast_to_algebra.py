@@ -5,6 +5,13 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# operators that chain into one n-ary node, the second of each pair inverts its right operand
+SUM_OPS = (TokenKind.PLUS, TokenKind.MINUS)
+PROD_OPS = (TokenKind.STAR, TokenKind.SLASH)
+
+# an operand of the node being converted, and whether it is subtracted / divided by
+Operand = tuple[ParserNode, bool]
+
 
 class ConverterError(Exception):
     pass
@@ -15,54 +22,83 @@ class Converter:
         self.tree = tree
 
     def convert_full(self) -> AlgebraNode:
-        # I can freely get the 0th of the tuple, because I know that because the parent isnt binary it wont be converted
-        return self.convert(self.tree)[0]
+        return self.convert(self.tree)
+
+    def convert(self, tree: ParserNode) -> AlgebraNode:
+        """
+        Converts a parser tree bottom up, with an explicit stack instead of recursion.
+        Chains of + and - become one Sum, chains of * and / one Prod, so a + b + c + ...
+        takes linear time however the chain leans
+        """
+        converted: dict[int, AlgebraNode] = {}  # id of a parser node -> its conversion
+        stack: list[tuple[ParserNode, list[Operand] | None]] = [(tree, None)]
+        while stack:
+            node, operands = stack.pop()
+            if operands is None:
+                operands = self.operands(node)
+                stack.append((node, operands))
+                stack.extend((operand, None) for operand, _ in reversed(operands))
+                continue
+            converted[id(node)] = self.build(
+                node, [(converted.pop(id(operand)), inverted) for operand, inverted in operands]
+            )
+        log.debug("converted a tree into %d algebra nodes", converted[id(tree)].size)
+        return converted[id(tree)]
 
-    def convert(self, node, parent=None) -> tuple[AlgebraNode, ...]:
-        # Tuples are used for Sum / Prod
-        log.debug(f"converting:\n  {node} \n with parent \n {parent}")
+    def operands(self, node: ParserNode) -> list[Operand]:
+        """Gets the parser nodes that node is built from, see build"""
         match node:
+            case Binary(op=op) if op in SUM_OPS:
+                return self.chain(node, SUM_OPS)
+            case Binary(op=op) if op in PROD_OPS:
+                return self.chain(node, PROD_OPS)
+            case Binary(op=TokenKind.CARET, left=left, right=right):
+                return [(left, False), (right, False)]
             case Binary():
-                return self.convert_binary(node, parent)
+                raise ConverterError("Unkown Binary Operator")
+            case Unary(expr=expr):
+                return [(expr, False)]
+            case Number() | Symbol():
+                return []
+        raise ConverterError("Unknown Parser Node")
+
+    def chain(self, node: Binary, ops: tuple[TokenKind, TokenKind]) -> list[Operand]:
+        """
+        Gets the operands of the chain of ops binary nodes below node, left to right.
+        The right operand of the inverting op (- or /) is inverted as a whole, a - (b + c)
+        stays a - (b + c)
+        """
+        operands: list[Operand] = []
+        stack: list[Operand] = [(node, False)]
+        while stack:
+            current, inverted = stack.pop()
+            if not inverted and isinstance(current, Binary) and current.op in ops:
+                stack.append((current.right, current.op is ops[1]))
+                stack.append((current.left, False))
+            else:
+                operands.append((current, inverted))
+        return operands
+
+    def build(self, node: ParserNode, operands: list[tuple[AlgebraNode, bool]]) -> AlgebraNode:
+        """Builds the algebra node for node from its converted operands"""
+        match node:
+            case Binary(op=op) if op in SUM_OPS:
+                return Sum(tuple(Neg(term) if inverted else term for term, inverted in operands))
+            case Binary(op=op) if op in PROD_OPS:
+                return Prod(
+                    tuple(Inv(factor) if inverted else factor for factor, inverted in operands)
+                )
+            case Binary(op=TokenKind.CARET):
+                (base, _), (exp, _) = operands
+                return Pow(base, exp)
+            case Unary(op=TokenKind.MINUS):
+                return Neg(operands[0][0])
+            case Unary(op=TokenKind.PLUS):
+                return operands[0][0]
             case Unary():
-                return self.convert_unary(node)
+                raise ConverterError("Unknown Unary Operator")
             case Number(value=v):
-                return (Num(v),)
+                return Num(v)
             case Symbol(name=n):
-                return (Var(n),)
+                return Var(n)
         raise ConverterError("Unknown Parser Node")
-
-    def convert_binary(self, node: Binary, parent=None) -> tuple[AlgebraNode, ...]:
-        op = node.op
-        left = node.left
-        right = node.right
-        if isinstance(parent, Binary) and op == parent.op:
-            return (*self.convert(left, node), *self.convert(right, node))
-
-        match op:
-            case TokenKind.STAR:
-                return (Prod((*self.convert(left, node), *self.convert(right, node))),)
-            case TokenKind.SLASH:
-                # I can freely get the 0th of the tuple, because I know that because the node isnt binary it wont be converted
-                return (Prod((*self.convert(left, node), Inv(self.convert(right)[0]))),)
-            case TokenKind.PLUS:
-                return (Sum((*self.convert(left, node), *self.convert(right, node))),)
-            case TokenKind.MINUS:
-                # I can freely get the 0th of the tuple, because I know that because the node isnt binary it wont be converted
-                return (Sum((*self.convert(left, node), Neg(self.convert(right)[0]))),)
-            case TokenKind.CARET:
-                return (Pow(*self.convert(left), *self.convert(right)),)
-            case _:
-                raise ConverterError("Unkown Binary Operator")
-
-    def convert_unary(self, node: Unary) -> tuple[AlgebraNode, ...]:
-        op = node.op
-        expr = node.expr
-        match op:
-            case TokenKind.MINUS:
-                # I can freely get the 0th of the tuple, because I know that because the parent isnt binary it wont be converted
-                expr = self.convert(expr, node)[0]
-                return (Neg(expr),)
-            case TokenKind.PLUS:
-                return self.convert(expr, node)
-        raise ConverterError("Unknown Unary Operator")
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the CAS pipeline. Run them as modules from the repository root, e.g.
+    python -m benchmarks.memory
+"""
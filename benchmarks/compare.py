@@ -0,0 +1,66 @@
+"""
+Compares two result files written by benchmarks.run, case by case.
+
+Run from the repository root:
+    python -m benchmarks.compare old.json new.json [--threshold 0.1]
+Exits with status 1 if any case got slower by more than the threshold (10% by default).
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_medians(path: str) -> tuple[dict, dict[str, float]]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    medians = {
+        result["name"]: result["median"]
+        for result in data["results"]
+        if result["status"] == "ok"
+    }
+    return data["meta"], medians
+
+
+def compare(old: dict[str, float], new: dict[str, float], threshold: float) -> list[str]:
+    """Prints one line per case present in both files and returns the names of the regressions"""
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        ratio = new[name] / old[name]
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            marker = "  faster"
+        print(
+            f"{name:<40}{old[name] * 1000:>12.3f}{new[name] * 1000:>12.3f} ms  x{ratio:.2f}{marker}"
+        )
+    for name in sorted(old.keys() - new.keys()):
+        print(f"{name:<40}  only in the old results")
+    for name in sorted(new.keys() - old.keys()):
+        print(f"{name:<40}  only in the new results")
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("old")
+    arg_parser.add_argument("new")
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression",
+    )
+    args = arg_parser.parse_args()
+
+    old_meta, old = load_medians(args.old)
+    new_meta, new = load_medians(args.new)
+    print(f"old: {old_meta.get('revision')}  new: {new_meta.get('revision')}")
+    regressions = compare(old, new, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
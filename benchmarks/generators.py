@@ -0,0 +1,105 @@
+"""
+Seeded generators for benchmark inputs. Every generator returns source strings, so the same
+input can be fed to any stage of the pipeline and regenerated exactly on another commit.
+"""
+
+import random
+import string
+from dataclasses import dataclass, field
+
+
+def default_op_weights() -> dict[str, float]:
+    return {"+": 3, "-": 1, "*": 3, "/": 1, "^": 1, "implicit": 1}
+
+
+@dataclass
+class GeneratorConfig:
+    """
+    Shape of the random expressions.
+
+    Attributes:
+        size (int): Number of leaves (numbers and variables) per expression.
+        max_depth (int): Operators nested deeper than this are replaced by leaves.
+        n_vars (int): Number of distinct variables, 0 gives purely numerical expressions.
+        op_weights (dict[str, float]): Relative frequency of "+", "-", "*", "/", "^" and
+            "implicit" (implicit multiplication). Missing operators never occur.
+        float_ratio (float): Share of numeric leaves that are decimals instead of integers.
+    """
+
+    size: int = 50
+    max_depth: int = 10
+    n_vars: int = 3
+    op_weights: dict[str, float] = field(default_factory=default_op_weights)
+    float_ratio: float = 0.1
+
+
+class ExpressionGenerator:
+    """
+    Builds random expressions from a seed, the same seed always gives the same expressions.
+    Args:
+        seed (int): The random seed
+        config (GeneratorConfig): The shape of the expressions
+    """
+
+    def __init__(self, seed: int, config: GeneratorConfig | None = None):
+        self.config = config or GeneratorConfig()
+        if self.config.n_vars > len(string.ascii_lowercase):
+            raise ValueError("at most 26 single letter variables are supported")
+        self._random = random.Random(seed)
+        self._variables = string.ascii_lowercase[: self.config.n_vars]
+        self._ops = [op for op, weight in self.config.op_weights.items() if weight > 0]
+        self._weights = [self.config.op_weights[op] for op in self._ops]
+
+    def source(self) -> str:
+        """Returns one random expression"""
+        return self._expr(self.config.size, 0)
+
+    def sources(self, count: int) -> list[str]:
+        return [self.source() for _ in range(count)]
+
+    def _leaf(self) -> str:
+        rnd = self._random
+        if self._variables and rnd.random() < 0.5:
+            return rnd.choice(self._variables)
+        if rnd.random() < self.config.float_ratio:
+            return f"{rnd.randint(1, 9)}.{rnd.randint(1, 9)}"
+        return str(rnd.randint(1, 9))
+
+    def _expr(self, leaves: int, depth: int) -> str:
+        if leaves <= 1 or depth >= self.config.max_depth or not self._ops:
+            return self._leaf()
+        op = self._random.choices(self._ops, self._weights)[0]
+        if op == "^":
+            # small literal exponents keep the numbers (and expansions) bounded
+            base = self._expr(leaves - 1, depth + 1)
+            return f"({base})^{self._random.randint(0, 3)}"
+        left_leaves = self._random.randint(1, leaves - 1)
+        left = self._expr(left_leaves, depth + 1)
+        right = self._expr(leaves - left_leaves, depth + 1)
+        if op == "implicit":
+            return f"({left})({right})"
+        return f"({left}){op}({right})"
+
+
+def _variable(index: int) -> str:
+    return string.ascii_lowercase[index % len(string.ascii_lowercase)]
+
+
+def product_of_sums(factors: int, terms: int) -> str:
+    """(a+b+c)*(d+e+f)*... with the given number of factors and terms per factor"""
+    sums = []
+    for i in range(factors):
+        sums.append(
+            "(" + "+".join(_variable(i * terms + j) for j in range(terms)) + ")"
+        )
+    return "*".join(sums)
+
+
+def nested_parens(depth: int) -> str:
+    """((((x+1)+1)+1)...) nested depth times"""
+    return "(" * depth + "x" + "+1)" * depth
+
+
+def long_sum(terms: int, n_vars: int = 3) -> str:
+    """a+2b+3c+4a+... with the given number of terms"""
+    return "+".join(f"{i % 9 + 1}{_variable(i % n_vars)}" for i in range(terms))
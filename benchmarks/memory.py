@@ -0,0 +1,83 @@
+"""
+Measures the memory footprint of the node and token classes, in bytes per object.
+
+Field values are built before measuring. "allocated" is everything a construction allocates,
+which for algebra nodes includes their entry in the interning table, "object" is
+sys.getsizeof of the instance alone.
+Run from the repository root:
+    python -m benchmarks.memory [--count N] [--json]
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from collections.abc import Callable
+
+from algebra_nodes import Num, Var, Sum, Pow
+from parser_nodes import Binary, Number
+from tokens import Token, TokenKind
+
+
+def bytes_per_object(
+    factory: Callable[[object], object], args: list
+) -> tuple[float, int]:
+    """
+    Returns the average number of bytes allocated by calling factory once per item of args,
+    and the size of a single resulting object
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(arg) for arg in args]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    allocated = after - before - sys.getsizeof(objects)
+    object_size = sys.getsizeof(objects[0])
+    del objects
+    return allocated / len(args), object_size
+
+
+def measure(count: int) -> dict[str, tuple[float, int]]:
+    ints = list(range(1000, 1000 + count))
+    names = [f"v{i}" for i in ints]
+    # children of the composite nodes, distinct from the literals measured for Num itself
+    nums = [Num(-i) for i in ints]
+    x = Var("x")
+    leaf = Number(1)
+    sum_terms = [(x, num) for num in nums]
+    return {
+        "Token": bytes_per_object(lambda i: Token(TokenKind.NUMBER, "1", i, 1), ints),
+        "parser Number": bytes_per_object(Number, ints),
+        "parser Binary": bytes_per_object(
+            lambda _: Binary(TokenKind.PLUS, leaf, leaf), ints
+        ),
+        "Num": bytes_per_object(Num, ints),
+        "Var": bytes_per_object(Var, names),
+        "Pow": bytes_per_object(lambda num: Pow(x, num), nums),
+        "Sum": bytes_per_object(Sum, sum_terms),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--count", type=int, default=100_000)
+    arg_parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = arg_parser.parse_args()
+
+    results = measure(args.count)
+    if args.json:
+        out = {
+            name: {"allocated": allocated, "object": size}
+            for name, (allocated, size) in results.items()
+        }
+        print(json.dumps(out, indent=2))
+        return
+    print(f"{'':<16}{'allocated':>10}{'object':>8}  (bytes per object)")
+    for name, (allocated, size) in results.items():
+        print(f"{name:<16}{allocated:>10.1f}{size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Times every pipeline stage separately on seeded inputs and stores the results as JSON.
+
+Run from the repository root:
+    python -m benchmarks.run [--quick] [--repeat N] [--filter TEXT] [--output results.json]
+Compare two result files with benchmarks.compare.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from ast_to_algebra import Converter
+from benchmarks.generators import (
+    ExpressionGenerator,
+    GeneratorConfig,
+    long_sum,
+    nested_parens,
+    product_of_sums,
+)
+from lexer import Lexer
+from parser import Parser
+from simplify import Simplifier
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class BenchCase:
+    """
+    One benchmark: a stage run over a fixed list of inputs.
+
+    Attributes:
+        name (str): Unique name, used to match cases between result files.
+        stage (str): "lex", "parse", "convert", "simplify" or "eval".
+        sources (list[str]): The inputs, all of them are processed per timed run.
+        params (dict): How the inputs were generated, stored with the results.
+    """
+
+    name: str
+    stage: str
+    sources: list[str]
+    params: dict = field(default_factory=dict)
+
+
+def _lex(sources: list[str]) -> Callable[[], object]:
+    return lambda: [Lexer(source).tokenize() for source in sources]
+
+
+def _parse(sources: list[str]) -> Callable[[], object]:
+    token_lists = [Lexer(source).tokenize() for source in sources]
+    return lambda: [Parser(tokens).parse() for tokens in token_lists]
+
+
+def _convert(sources: list[str]) -> Callable[[], object]:
+    trees = [Parser(Lexer(source).tokenize()).parse() for source in sources]
+    return lambda: [Converter(tree).convert_full() for tree in trees]
+
+
+def _algebra_trees(sources: list[str]) -> list:
+    return [
+        Converter(Parser(Lexer(source).tokenize()).parse()).convert_full()
+        for source in sources
+    ]
+
+
+def _simplify(sources: list[str]) -> Callable[[], object]:
+    trees = _algebra_trees(sources)
+    # a fresh simplifier per run, so no run profits from a cache filled by the previous one
+    return lambda: [Simplifier().simplify(tree) for tree in trees]
+
+
+def _eval(sources: list[str]) -> Callable[[], object]:
+    trees = _algebra_trees(sources)
+    simplifier = Simplifier()
+    return lambda: [simplifier.eval(tree) for tree in trees]
+
+
+STAGES: dict[str, Callable[[list[str]], Callable[[], object]]] = {
+    "lex": _lex,
+    "parse": _parse,
+    "convert": _convert,
+    "simplify": _simplify,
+    "eval": _eval,
+}
+
+
+def build_cases(seed: int, quick: bool = False) -> list[BenchCase]:
+    scale = 0.2 if quick else 1.0
+    cases: list[BenchCase] = []
+
+    def add(name: str, stages: tuple[str, ...], sources: list[str], **params) -> None:
+        for stage in stages:
+            cases.append(BenchCase(f"{stage}/{name}", stage, sources, params))
+
+    pipeline = ("lex", "parse", "convert", "simplify")
+    for label, size, count in (("small", 10, 200), ("medium", 100, 20), ("large", 1000, 2)):
+        config = GeneratorConfig(size=size, max_depth=12, n_vars=3)
+        count = max(1, int(count * scale))
+        sources = ExpressionGenerator(seed, config).sources(count)
+        add(f"random-{label}", pipeline, sources, seed=seed, size=size, count=count)
+
+    numeric = GeneratorConfig(
+        size=50,
+        n_vars=0,
+        op_weights={"+": 3, "-": 1, "*": 3, "^": 1, "implicit": 1},
+    )
+    count = max(1, int(100 * scale))
+    sources = ExpressionGenerator(seed, numeric).sources(count)
+    add("numeric", ("eval",), sources, seed=seed, size=50, count=count)
+
+    for factors, terms in ((3, 3), (4, 3), (3, 5)):
+        add(
+            f"product-of-sums-{factors}x{terms}",
+            ("parse", "simplify"),
+            [product_of_sums(factors, terms)],
+            factors=factors,
+            terms=terms,
+        )
+
+    depth = 150
+    add(f"nested-parens-{depth}", pipeline, [nested_parens(depth)], depth=depth)
+
+    terms = int(2000 * scale)
+    add(f"long-sum-{terms}", pipeline, [long_sum(terms)], terms=terms)
+    return cases
+
+
+def time_case(case: BenchCase, repeat: int) -> dict:
+    """Runs the case once to warm up and check it works, then repeat timed runs"""
+    result = {"name": case.name, "stage": case.stage, "params": case.params}
+    try:
+        run = STAGES[case.stage](case.sources)
+        run()
+    except Exception as e:
+        result["status"] = f"error: {type(e).__name__}: {e}"
+        return result
+
+    times = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    result.update(
+        status="ok",
+        repeat=repeat,
+        min=min(times),
+        median=statistics.median(times),
+        mean=statistics.fmean(times),
+    )
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(seed: int, repeat: int, quick: bool, name_filter: str | None) -> dict:
+    results = []
+    for case in build_cases(seed, quick):
+        if name_filter and name_filter not in case.name:
+            continue
+        result = time_case(case, repeat)
+        results.append(result)
+        if result["status"] == "ok":
+            print(f"{case.name:<40}{result['median'] * 1000:>12.3f} ms", file=sys.stderr)
+        else:
+            print(f"{case.name:<40}  {result['status']}", file=sys.stderr)
+    return {
+        "format_version": FORMAT_VERSION,
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "seed": seed,
+            "repeat": repeat,
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--quick", action="store_true", help="smaller inputs, for a fast check")
+    arg_parser.add_argument("--filter", help="only run cases whose name contains this text")
+    arg_parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = arg_parser.parse_args()
+
+    data = run(args.seed, args.repeat, args.quick, args.filter)
+    text = json.dumps(data, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Bounded in-memory caches, used to memoize results keyed by (interned) algebra nodes
+"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    """
+    Statistics of a cache, in the same shape as functools.lru_cache's cache_info()
+
+    Attributes:
+        hits (int): Lookups that found a stored result
+        misses (int): Lookups that did not
+        maxsize (int): The maximum number of entries kept
+        currsize (int): The number of entries currently stored
+    """
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """
+    A dict with a size cap, evicting the least recently used entry once the cap is reached.
+    Args:
+        maxsize (int): The maximum number of entries kept, must be positive
+    """
+
+    def __init__(self, maxsize: int):
+        if maxsize <= 0:
+            raise ValueError(f"maxsize has to be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value stored for key and marks it as recently used, or default on a miss"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Stores value under key, evicting the oldest entry if the cache is full"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every entry and resets the counters"""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
@@ -0,0 +1,226 @@
+"""
+A persistent cache of simplification results, shared by runs and processes through a sqlite file.
+
+Inputs and results are stored in their binary form (see serialize.py), together with the
+version of the simplifier that computed them, so results of older rules are never reused.
+The database runs in WAL mode: readers do not block the writer, and writers wait for each other
+up to a timeout instead of failing right away. Hits only read: the access times they update are
+buffered and written in one transaction per _ACCESS_BATCH hits, before an eviction and on close.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+
+from algebra_nodes import AlgebraNode
+from cache import CacheInfo
+from serialize import SerializeError, from_bytes, to_bytes
+from simplify import Simplifier
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 100_000
+# seconds a process waits for another one's write to finish
+DEFAULT_TIMEOUT = 30.0
+# puts between two checks of the size cap, so it can be exceeded by this much per process
+_EVICT_INTERVAL = 64
+# hits whose access times are written together, so reads rarely take the write lock
+_ACCESS_BATCH = 256
+
+# stored as the database's user_version, a database with another one is emptied and recreated
+# 2: inputs and results in the binary form
+_SCHEMA_VERSION = 2
+_SCHEMA = (
+    """
+    CREATE TABLE results (
+        version TEXT NOT NULL,
+        input BLOB NOT NULL,
+        result BLOB NOT NULL,
+        accessed REAL NOT NULL,
+        PRIMARY KEY (version, input)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX results_accessed ON results (accessed)",
+)
+
+
+class DiskCache:
+    """
+    Maps input trees to simplified trees, in a sqlite database. Once it holds more than
+    max_entries results, the least recently used are evicted first.
+    Every process has to open its own DiskCache, connections cannot be shared.
+    Args:
+        path (str): The database file, created if it does not exist
+        max_entries (int): The size cap
+        timeout (float): Seconds to wait for a lock held by another process
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        if max_entries <= 0:
+            raise ValueError(f"max_entries has to be positive, got {max_entries}")
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        # access times of hits that are not written yet, by (version, input)
+        self._accessed: dict[tuple[str, bytes], float] = {}
+        # autocommit, every statement is its own transaction
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._connection.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._create_schema()
+
+    def _schema_version(self) -> int:
+        return self._connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def _create_schema(self) -> None:
+        if self._schema_version() == _SCHEMA_VERSION:
+            return
+        # takes the write lock before checking again, another process may be creating it as well
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            old_version = self._schema_version()
+            if old_version != _SCHEMA_VERSION:
+                if old_version != 0 or self._has_results_table():
+                    log.warning(
+                        f"dropping the entries of {self.path}, its schema version {old_version}"
+                        f" is not {_SCHEMA_VERSION}"
+                    )
+                self._connection.execute("DROP TABLE IF EXISTS results")
+                for statement in _SCHEMA:
+                    self._connection.execute(statement)
+                self._connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def _has_results_table(self) -> bool:
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'"
+            ).fetchone()
+            is not None
+        )
+
+    def get(self, node: AlgebraNode, version: str) -> AlgebraNode | None:
+        """Returns the result stored for node by a simplifier of version, None on a miss"""
+        key = to_bytes(node)
+        row = self._connection.execute(
+            "SELECT result FROM results WHERE version = ? AND input = ?", (version, key)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            result = from_bytes(row[0])
+        except SerializeError as e:
+            log.warning(f"dropping an unreadable entry of {self.path}: {e}")
+            self._connection.execute(
+                "DELETE FROM results WHERE version = ? AND input = ?", (version, key)
+            )
+            self.misses += 1
+            return None
+        self._accessed[version, key] = time.time()
+        if len(self._accessed) >= _ACCESS_BATCH:
+            self.flush_accessed()
+        self.hits += 1
+        return result
+
+    def flush_accessed(self) -> None:
+        """Writes the buffered access times of hits, in one transaction"""
+        if not self._accessed:
+            return
+        # access times only order the eviction, so a failed write drops them instead of retrying
+        updates = [(accessed, version, key) for (version, key), accessed in self._accessed.items()]
+        self._accessed.clear()
+        self._connection.execute("BEGIN")
+        try:
+            self._connection.executemany(
+                "UPDATE results SET accessed = ? WHERE version = ? AND input = ?", updates
+            )
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def put(self, node: AlgebraNode, result: AlgebraNode, version: str) -> None:
+        """Stores result for node, evicting the oldest entries if the cache is over its cap"""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (version, to_bytes(node), to_bytes(result), time.time()),
+        )
+        self._puts += 1
+        if self._puts % _EVICT_INTERVAL == 0:
+            self.evict()
+
+    def simplify(self, simplifier: Simplifier, node: AlgebraNode) -> AlgebraNode:
+        """
+        Simplifies node with simplifier, reusing the stored result if there is one.
+        A database that stays locked or fails otherwise only costs the reuse, not the result
+        """
+        version = simplifier.version
+        try:
+            cached = self.get(node, version)
+        except sqlite3.Error as e:
+            log.warning(f"could not read {self.path}: {e}")
+            return simplifier.simplify(node)
+        if cached is not None:
+            return cached
+        result = simplifier.simplify(node)
+        try:
+            self.put(node, result, version)
+        except sqlite3.Error as e:
+            log.warning(f"could not write {self.path}: {e}")
+        return result
+
+    def evict(self) -> int:
+        """Deletes the least recently used entries above the size cap, returns how many"""
+        self.flush_accessed()
+        excess = len(self) - self.max_entries
+        if excess <= 0:
+            return 0
+        self._connection.execute(
+            "DELETE FROM results WHERE (version, input) IN "
+            "(SELECT version, input FROM results ORDER BY accessed LIMIT ?)",
+            (excess,),
+        )
+        log.debug("evicted %d entries from %s", excess, self.path)
+        return excess
+
+    def clear(self) -> None:
+        """Drops every entry, of every version, and resets the counters"""
+        self._connection.execute("DELETE FROM results")
+        self._accessed.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Hits and misses of this process, the size of the shared database"""
+        return CacheInfo(self.hits, self.misses, self.max_entries, len(self))
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        """Writes the buffered access times and closes the connection"""
+        try:
+            self.flush_accessed()
+        except sqlite3.Error as e:
+            log.warning(f"could not write the access times to {self.path}: {e}")
+        self._connection.close()
+
+    def __enter__(self) -> DiskCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
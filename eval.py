@@ -0,0 +1,177 @@
+"""
+Compiles algebra trees into reusable Python functions of their variables, so that one expression
+can be evaluated many times without walking the tree again
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from collections.abc import Mapping
+
+from algebra_nodes import AlgebraNode, Num, Var, Neg, Inv, Sum, Prod, Pow
+from cache import LRUCache
+
+log = logging.getLogger(__name__)
+
+# n-ary nodes with more operands than this are compiled to sum() / math.prod() calls,
+# because a long a + b + c + ... chain is a deeply nested tree for Python's own compiler
+MAX_INLINE_OPERANDS = 32
+COMPILED_CACHE_SIZE = 1024
+
+
+class EvalError(Exception):
+    pass
+
+
+class CompiledExpr:
+    """
+    An algebra tree compiled into a Python function.
+    Args:
+        node (AlgebraNode): The compiled expression
+        variables (tuple[str, ...]): The free variables, sorted. They are the positional
+            parameters of function, in this order
+        source (str): The generated Python code
+        function (Callable): The compiled function, the fastest way to call it repeatedly
+    """
+
+    def __init__(self, node: AlgebraNode, variables: tuple[str, ...], source: str, function):
+        self.node = node
+        self.variables = variables
+        self.source = source
+        self.function = function
+        self._positions = {name: i for i, name in enumerate(variables)}
+
+    def __call__(self, *args: int | float, **bindings: int | float) -> int | float:
+        """Evaluates the expression, variables are bound positionally (see variables) or by name"""
+        if not bindings:
+            return self.function(*args)
+        return self.function(*self._bind(args, bindings))
+
+    def evaluate(self, bindings: Mapping[str, int | float]) -> int | float:
+        """Evaluates the expression with the variables bound by a mapping, extra names are ignored"""
+        try:
+            return self.function(*(bindings[name] for name in self.variables))
+        except KeyError as e:
+            raise EvalError(f"no value given for the variable {e.args[0]}") from None
+
+    def _bind(self, args: tuple, bindings: dict) -> list:
+        values: list = [*args, *([None] * (len(self.variables) - len(args)))]
+        for name, value in bindings.items():
+            if name not in self._positions:
+                raise EvalError(f"{name} is not a variable of {self.node!r}")
+            values[self._positions[name]] = value
+        missing = [name for name, value in zip(self.variables, values) if value is None]
+        if missing:
+            raise EvalError(f"no value given for the variables {', '.join(missing)}")
+        return values
+
+    def __repr__(self) -> str:
+        return f"CompiledExpr({self.node!r}, variables={self.variables})"
+
+
+def _literal(value: int | float | complex, constants: dict[str, int | float | complex]) -> str:
+    # values without a literal that evaluates back to them are passed in by name
+    if isinstance(value, complex) or isinstance(value, float) and not math.isfinite(value):
+        name = f"c{len(constants)}"
+        constants[name] = value
+        return name
+    text = repr(value)
+    # -0.0 is not below 0, but needs the parentheses as much as -1
+    return f"({text})" if text.startswith("-") else text
+
+
+def _operation(node: AlgebraNode, operands: list[str]) -> str:
+    match node:
+        case Sum():
+            if not operands:
+                return "0"
+            if len(operands) > MAX_INLINE_OPERANDS:
+                return f"sum(({', '.join(operands)},))"
+            return " + ".join(operands)
+        case Prod():
+            if not operands:
+                return "1"
+            if len(operands) > MAX_INLINE_OPERANDS:
+                return f"prod(({', '.join(operands)},))"
+            return " * ".join(operands)
+        case Pow():
+            return f"{operands[0]} ** {operands[1]}"
+        case Neg():
+            return f"-{operands[0]}"
+        case Inv():
+            return f"1 / {operands[0]}"
+    raise EvalError(f"Node type {type(node)} not recognized")
+
+
+def generate_source(
+    node: AlgebraNode,
+) -> tuple[str, tuple[str, ...], dict[str, int | float | complex]]:
+    """
+    Generates a function named _compiled, taking the sorted variables as positional parameters v0, v1, ...
+    Every distinct subtree becomes one assignment, so shared subtrees are computed once.
+    The variable names never appear in the code, so expressions that only differ in their
+    variable names generate the same code.
+    Returns the code, the variables and the non-literal constants the code refers to
+    """
+    variables = tuple(sorted(node.free_vars))
+    arg_names = {name: f"v{i}" for i, name in enumerate(variables)}
+    constants: dict[str, int | float | complex] = {}
+    operand: dict[AlgebraNode, str] = {}
+    lines: list[str] = []
+    # post-order with an explicit stack, deep trees must not hit the recursion limit
+    stack: list[tuple[AlgebraNode, bool]] = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        if current in operand:
+            continue
+        match current:
+            case Num(value):
+                operand[current] = _literal(value, constants)
+                continue
+            case Var(name):
+                operand[current] = arg_names[name]
+                continue
+        if not children_done:
+            stack.append((current, True))
+            stack.extend((child, False) for child in reversed(current.children()))
+            continue
+        temp = f"t{len(lines)}"
+        lines.append(f"    {temp} = {_operation(current, [operand[c] for c in current.children()])}")
+        operand[current] = temp
+
+    params = ", ".join(arg_names.values())
+    source = "\n".join([f"def _compiled({params}):", *lines, f"    return {operand[node]}"])
+    return source, variables, constants
+
+
+_code_cache = LRUCache(COMPILED_CACHE_SIZE)  # generated source -> code object
+_compiled_cache = LRUCache(COMPILED_CACHE_SIZE)  # node -> CompiledExpr
+
+
+def compile_expr(node: AlgebraNode) -> CompiledExpr:
+    """
+    Compiles node into a reusable function of its variables.
+    Results are cached by node, and the code objects by their source, so recompiling an
+    expression, or one that only differs in its variable names, is a cache lookup
+    """
+    compiled = _compiled_cache.get(node)
+    if compiled is not None:
+        return compiled
+
+    source, variables, constants = generate_source(node)
+    code = _code_cache.get(source)
+    if code is None:
+        code = compile(source, "<compiled expression>", "exec")
+        _code_cache.put(source, code)
+    namespace = {"prod": math.prod, **constants}
+    exec(code, namespace)
+    compiled = CompiledExpr(node, variables, source, namespace["_compiled"])
+    _compiled_cache.put(node, compiled)
+    log.debug("compiled %d nodes into %d lines", node.size, source.count("\n"))
+    return compiled
+
+
+def evaluate(node: AlgebraNode, bindings: Mapping[str, int | float] | None = None) -> int | float:
+    """Evaluates node once with the given variable values, compiling it (or reusing the cached compilation)"""
+    return compile_expr(node).evaluate(bindings or {})
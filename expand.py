@@ -0,0 +1,157 @@
+"""
+Expands products and natural powers of polynomials, working on the sparse term dicts of
+polynomial.py (exponent vector -> coefficient). Like terms are merged as they are generated,
+so the full cross product of the terms is never materialized.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from collections.abc import Iterable
+from typing import Union
+
+log = logging.getLogger(__name__)
+
+# the exponent of every variable, in the order of the polynomial's variables
+Monomial = tuple[int, ...]
+Coefficient = Union[int, float, complex]
+Terms = dict[Monomial, Coefficient]
+
+# results with more terms than this are not worth expanding, the factored form is more useful
+DEFAULT_MAX_TERMS = 100_000
+# powers whose coefficients could grow past this many bits are left factored as well, computing
+# and printing them would take far longer than the term count suggests
+MAX_COEFFICIENT_BITS = 4096
+
+
+class ExpansionError(Exception):
+    pass
+
+
+def _check_size(terms: Terms, max_terms: int | None) -> None:
+    if max_terms is not None and len(terms) > max_terms:
+        raise ExpansionError(f"the expansion has more than {max_terms} terms")
+
+
+def _check_power_size(terms: Terms, n: int, max_terms: int | None) -> None:
+    """
+    Raises ExpansionError before expanding the n-th power of terms if its result could have more
+    than max_terms terms or coefficients of more than MAX_COEFFICIENT_BITS bits. None skips both
+    """
+    if max_terms is None:
+        return
+    # the multinomial coefficients are at most k^n, the coefficients themselves add their n-th power
+    largest = max(abs(coefficient) for coefficient in terms.values())
+    bits = n * (math.log2(len(terms)) + (math.log2(largest) if largest > 1 else 0.0))
+    if bits > MAX_COEFFICIENT_BITS:
+        raise ExpansionError(
+            f"the coefficients of the expansion could have {bits:.0f} bits,"
+            f" more than {MAX_COEFFICIENT_BITS}"
+        )
+    # at most one term per exponent distribution, and per monomial within the degrees reachable
+    distributions = math.comb(n + len(terms) - 1, len(terms) - 1)
+    width = len(next(iter(terms)))
+    degrees = math.prod(n * max(monomial[i] for monomial in terms) + 1 for i in range(width))
+    if min(distributions, degrees) > max_terms:
+        raise ExpansionError(f"the expansion could have more than {max_terms} terms")
+
+
+def _drop_zeros(terms: Terms) -> Terms:
+    return {monomial: c for monomial, c in terms.items() if c != 0}
+
+
+def multiply_terms(a: Terms, b: Terms, max_terms: int | None = None) -> Terms:
+    """Multiplies two polynomials over the same variables"""
+    if len(b) > len(a):
+        a, b = b, a
+    out: Terms = {}
+    for monomial_b, coefficient_b in b.items():
+        if not any(monomial_b):
+            # scaling by a constant keeps the monomials
+            for monomial, coefficient in a.items():
+                out[monomial] = out.get(monomial, 0) + coefficient * coefficient_b
+            continue
+        for monomial_a, coefficient_a in a.items():
+            monomial = tuple([x + y for x, y in zip(monomial_a, monomial_b)])
+            out[monomial] = out.get(monomial, 0) + coefficient_a * coefficient_b
+        _check_size(out, max_terms)
+    return _drop_zeros(out)
+
+
+def expand_product(factors: Iterable[Terms], width: int, max_terms: int | None = None) -> Terms:
+    """
+    Multiplies any number of polynomials over the same width variables. The smallest factors are
+    multiplied first, which keeps the intermediate products small
+    """
+    out: Terms = {(0,) * width: 1}
+    for factor in sorted(factors, key=len):
+        if not factor:
+            return {}
+        out = multiply_terms(out, factor, max_terms)
+    return out
+
+
+def _multinomial_power(items: list[tuple[Monomial, Coefficient]], n: int) -> Terms:
+    """
+    Expands (t_1 + ... + t_k)^n term by term: the multinomial theorem gives every distribution
+    e_1 + ... + e_k = n of the exponents the coefficient n! / (e_1! ... e_k!), which is built up
+    as C(r, e_j), r being the part of n not yet given to the terms before t_j
+    """
+    k = len(items)
+    width = len(items[0][0])
+    out: Terms = {}
+    # depth first over the exponent distributions, with the partial monomial and coefficient
+    stack: list[tuple[int, int, Monomial, Coefficient]] = [(0, n, (0,) * width, 1)]
+    while stack:
+        j, remaining, monomial, coefficient = stack.pop()
+        term_monomial, term_coefficient = items[j]
+        if j == k - 1 or remaining == 0:
+            # the rest of the exponent goes to t_j, the terms after it get 0
+            final = tuple([m + remaining * e for m, e in zip(monomial, term_monomial)])
+            out[final] = out.get(final, 0) + coefficient * term_coefficient**remaining
+            continue
+        for e in range(remaining + 1):
+            stack.append(
+                (
+                    j + 1,
+                    remaining - e,
+                    tuple([m + e * t for m, t in zip(monomial, term_monomial)]),
+                    coefficient * math.comb(remaining, e) * term_coefficient**e,
+                )
+            )
+    return _drop_zeros(out)
+
+
+def power_terms(terms: Terms, n: int, width: int, max_terms: int | None = None) -> Terms:
+    """
+    Raises a polynomial over width variables to the natural power n.
+    Raises ExpansionError up front if the result could be too large (see _check_power_size)
+    """
+    if n == 0:
+        return {(0,) * width: 1}
+    if not terms:
+        return {}
+    _check_power_size(terms, n, max_terms)
+    if len(terms) == 1:
+        # a monomial: scale the exponents, no multiplications needed
+        ((monomial, coefficient),) = terms.items()
+        return {tuple(e * n for e in monomial): coefficient**n}
+    k = len(terms)
+    distributions = math.comb(n + k - 1, k - 1)
+    if distributions <= (DEFAULT_MAX_TERMS if max_terms is None else max_terms):
+        # every exponent distribution is visited once, no intermediate powers are built.
+        # The result has at most as many terms as there are distributions
+        return _multinomial_power(list(terms.items()), n)
+    # too many distributions to visit, but most of them may be like terms, e.g. in (1 + x + x^2)^50.
+    # Squaring merges those early, the size check then catches results that are really too big
+    log.debug("expanding a %d term polynomial to the power %d by squaring", k, n)
+    result: Terms = {(0,) * width: 1}
+    square = terms
+    while n:
+        if n & 1:
+            result = multiply_terms(result, square, max_terms)
+        n >>= 1
+        if n:
+            square = multiply_terms(square, square, max_terms)
+    return result
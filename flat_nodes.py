@@ -0,0 +1,412 @@
+"""
+A struct-of-arrays representation of algebra trees, for trees too big for one object per node.
+
+A FlatTree stores the nodes in post-order in parallel arrays: every node is an opcode, an operand
+(the constant or symbol index of a leaf, the number of children of a Sum or Prod) and the index
+at which its subtree starts. A subtree is a contiguous slice ending at its root, its last child
+ends right before the root and each earlier child right before the next one starts. Numbers and
+variable names live in a constant pool and a symbol table, like in serialize.py.
+
+Traversal, evaluation and simplification are single passes over the arrays with a value stack,
+never building AlgebraNode objects. NumPy is optional, only to_numpy needs it.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from array import array
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+from algebra_nodes import AlgebraNode, Num, Var, Neg, Inv, Sum, Prod, Pow, number_key
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+# opcodes
+NUM = 0
+VAR = 1
+SUM = 2
+PROD = 3
+NEG = 4
+INV = 5
+POW = 6
+# an entry removed during simplify, dropped when the arrays are compacted
+_DELETED = 255
+
+_NODE_OPCODES = {Num: NUM, Var: VAR, Sum: SUM, Prod: PROD, Neg: NEG, Inv: INV, Pow: POW}
+_FIXED_ARITY = {NUM: 0, VAR: 0, NEG: 1, INV: 1, POW: 2}
+
+# signed 32 bit indices, so a tree holds at most 2**31 - 1 nodes at 9 bytes per node
+_INDEX_TYPE = "i"
+
+
+class FlatTreeError(Exception):
+    pass
+
+
+class FlatTree:
+    """
+    An algebra tree in post-order arrays, the last node is the root.
+    Nodes are appended children first (see append_num, append_var, append), so a tree can be built
+    without ever creating AlgebraNode objects.
+    Attributes:
+        ops (array): The opcode of every node
+        operands (array): Constant pool index (NUM), symbol table index (VAR), number of
+            children (SUM, PROD), 0 for the others
+        starts (array): The index of the first node of every node's subtree
+        constants (list[int | float | complex]): The constant pool
+        names (list[str]): The symbol table
+    """
+
+    def __init__(self):
+        self.ops = array("B")
+        self.operands = array(_INDEX_TYPE)
+        self.starts = array(_INDEX_TYPE)
+        self.constants: list[int | float | complex] = []
+        self.names: list[str] = []
+        self._constant_index: dict[tuple, int] = {}
+        self._name_index: dict[str, int] = {}
+        # the roots of the complete subtrees at the end, i.e. the operands of the next append
+        self._roots: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    @property
+    def root(self) -> int:
+        if len(self._roots) != 1:
+            raise FlatTreeError(f"the arrays hold {len(self._roots)} trees instead of one")
+        return self._roots[0]
+
+    def _push(self, op: int, operand: int, start: int) -> int:
+        index = len(self.ops)
+        self.ops.append(op)
+        self.operands.append(operand)
+        self.starts.append(start)
+        return index
+
+    def _constant(self, value: int | float | complex) -> int:
+        key = number_key(value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def append_num(self, value: int | float | complex) -> int:
+        """Appends a number, returns its index"""
+        index = len(self.ops)
+        self._push(NUM, self._constant(value), index)
+        self._roots.append(index)
+        return index
+
+    def append_var(self, name: str) -> int:
+        """Appends a variable, returns its index"""
+        symbol = self._name_index.get(name)
+        if symbol is None:
+            symbol = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        index = len(self.ops)
+        self._push(VAR, symbol, index)
+        self._roots.append(index)
+        return index
+
+    def append(self, op: int, arity: int | None = None) -> int:
+        """
+        Appends an operator whose children are the last arity complete subtrees, returns its index.
+        arity is only needed for SUM and PROD
+        """
+        if op in (SUM, PROD):
+            if arity is None:
+                raise FlatTreeError("SUM and PROD need the number of their children")
+        elif op in (NEG, INV, POW):
+            arity = _FIXED_ARITY[op]
+        else:
+            raise FlatTreeError(f"{op} is not an operator opcode")
+        if arity > len(self._roots):
+            raise FlatTreeError(f"the operator needs {arity} children, there are {len(self._roots)}")
+        index = len(self.ops)
+        start = self.starts[self._roots[-arity]] if arity else index
+        self._push(op, arity if op in (SUM, PROD) else 0, start)
+        if arity:
+            del self._roots[-arity:]
+        self._roots.append(index)
+        return index
+
+    def arity(self, index: int) -> int:
+        op = self.ops[index]
+        if op == SUM or op == PROD:
+            return self.operands[index]
+        return _FIXED_ARITY[op]
+
+    def children(self, index: int) -> list[int]:
+        """Gets the indices of the children of the node at index, in order"""
+        children = []
+        child = index - 1
+        for _ in range(self.arity(index)):
+            children.append(child)
+            child = self.starts[child] - 1
+        children.reverse()
+        return children
+
+    def subtree(self, index: int) -> range:
+        """The indices of the subtree of the node at index, in post-order"""
+        return range(self.starts[index], index + 1)
+
+    def walk(self) -> Iterator[int]:
+        """Gets the indices of all nodes in pre-order"""
+        stack = [self.root]
+        while stack:
+            index = stack.pop()
+            yield index
+            stack.extend(reversed(self.children(index)))
+
+    @classmethod
+    def from_node(cls, node: AlgebraNode) -> FlatTree:
+        """Flattens node. Shared subtrees are stored once per occurrence, node.size entries in total"""
+        tree = cls()
+        stack: list[tuple[AlgebraNode, bool]] = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            children = current.children()
+            if children and not children_done:
+                stack.append((current, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+            match current:
+                case Num(value):
+                    tree.append_num(value)
+                case Var(name):
+                    tree.append_var(name)
+                case _:
+                    op = _NODE_OPCODES.get(type(current))
+                    if op is None:
+                        raise FlatTreeError(f"Node type {type(current)} not recognized")
+                    tree.append(op, len(children))
+        return tree
+
+    def to_node(self) -> AlgebraNode:
+        """Builds the AlgebraNode tree"""
+        root = self.root
+        constants = self.constants
+        names = self.names
+        stack: list[AlgebraNode] = []
+        for index in range(self.starts[root], root + 1):
+            op = self.ops[index]
+            operand = self.operands[index]
+            if op == NUM:
+                stack.append(Num(constants[operand]))
+            elif op == VAR:
+                stack.append(Var(names[operand]))
+            elif op == SUM or op == PROD:
+                operands = tuple(stack[len(stack) - operand :])
+                del stack[len(stack) - operand :]
+                stack.append(Sum(operands) if op == SUM else Prod(operands))
+            elif op == POW:
+                exp = stack.pop()
+                stack.append(Pow(stack.pop(), exp))
+            elif op == NEG:
+                stack.append(Neg(stack.pop()))
+            else:
+                stack.append(Inv(stack.pop()))
+        return stack[0]
+
+    def evaluate(self, bindings: Mapping[str, Any] | None = None) -> Any:
+        """
+        Evaluates the tree in one pass over the arrays, with the variables bound by bindings.
+        The values can be NumPy arrays, which evaluates element-wise
+        """
+        bindings = bindings or {}
+        try:
+            symbols = [bindings[name] for name in self.names]
+        except KeyError as e:
+            raise FlatTreeError(f"no value given for the variable {e.args[0]}") from None
+        root = self.root
+        constants = self.constants
+        ops = self.ops
+        operands = self.operands
+        stack: list[Any] = []
+        for index in range(self.starts[root], root + 1):
+            op = ops[index]
+            if op == NUM:
+                stack.append(constants[operands[index]])
+            elif op == VAR:
+                stack.append(symbols[operands[index]])
+            elif op == SUM or op == PROD:
+                count = operands[index]
+                values = stack[len(stack) - count :]
+                del stack[len(stack) - count :]
+                stack.append(sum(values, 0) if op == SUM else math.prod(values))
+            elif op == POW:
+                exp = stack.pop()
+                stack.append(stack.pop() ** exp)
+            elif op == NEG:
+                stack.append(-1 * stack.pop())
+            else:
+                stack.append(1 / stack.pop())
+        return stack[0]
+
+    def simplify(self) -> FlatTree:
+        """
+        Returns a simplified copy, computed in one pass over the arrays: numeric subtrees are
+        folded into numbers, nested sums and products flattened, the numbers among their operands
+        combined, and the identities x^1 = x, x^0 = 1^x = 1, 0x = 0, --x = x and 1/(1/x) = x
+        applied. Number folding follows Simplifier.eval
+        """
+        out = FlatTree()
+        out.names = list(self.names)
+        out._name_index = dict(self._name_index)
+        ops = out.ops
+        operands = out.operands
+        starts = out.starts
+        constants = out.constants
+        # output index of the root of every simplified subtree that has no parent yet
+        roots: list[int] = []
+
+        def truncate(start: int) -> None:
+            del ops[start:], operands[start:], starts[start:]
+
+        def replace_with_num(start: int, value: int | float | complex) -> None:
+            truncate(start)
+            roots.append(out._push(NUM, out._constant(value), start))
+
+        def last_live(index: int) -> int:
+            # a subtree's root is its last entry that was not deleted
+            while ops[index] == _DELETED:
+                index -= 1
+            return index
+
+        root = self.root
+        for index in range(self.starts[root], root + 1):
+            op = self.ops[index]
+            operand = self.operands[index]
+            if op == NUM:
+                roots.append(out._push(NUM, out._constant(self.constants[operand]), len(ops)))
+                continue
+            if op == VAR:
+                roots.append(out._push(VAR, operand, len(ops)))
+                continue
+
+            arity = operand if op == SUM or op == PROD else _FIXED_ARITY[op]
+            children = roots[len(roots) - arity :]
+            del roots[len(roots) - arity :]
+            start = starts[children[0]] if children else len(ops)
+
+            if op == NEG or op == INV:
+                (child,) = children
+                if ops[child] == NUM:
+                    value = constants[operands[child]]
+                    replace_with_num(start, -1 * value if op == NEG else 1 / value)
+                elif ops[child] == op:
+                    # the child's only child takes its place
+                    ops[child] = _DELETED
+                    roots.append(last_live(child - 1))
+                else:
+                    roots.append(out._push(op, 0, start))
+                continue
+
+            if op == POW:
+                base, exp = children
+                base_value = constants[operands[base]] if ops[base] == NUM else None
+                exp_value = constants[operands[exp]] if ops[exp] == NUM else None
+                if base_value is not None and exp_value is not None:
+                    replace_with_num(start, base_value**exp_value)
+                elif exp_value == 0 or base_value == 1:
+                    replace_with_num(start, 1)
+                elif exp_value == 1:
+                    ops[exp] = _DELETED
+                    roots.append(base)
+                else:
+                    roots.append(out._push(POW, 0, start))
+                continue
+
+            # SUM and PROD
+            identity = 0 if op == SUM else 1
+            value: int | float | complex = identity
+            # flattened, the operands of a nested node of the same type become this node's
+            flat: list[int] = []
+            for child in children:
+                if ops[child] != op:
+                    flat.append(child)
+                    continue
+                ops[child] = _DELETED
+                nested = []
+                operand_root = child - 1
+                for _ in range(operands[child]):
+                    operand_root = last_live(operand_root)
+                    nested.append(operand_root)
+                    operand_root = starts[operand_root] - 1
+                flat.extend(reversed(nested))
+            first_number = -1
+            count = 0
+            for child in flat:
+                if ops[child] == NUM:
+                    number = constants[operands[child]]
+                    value = value + number if op == SUM else value * number
+                    if first_number == -1:
+                        first_number = child
+                    else:
+                        ops[child] = _DELETED
+                else:
+                    count += 1
+            if first_number != -1 and (count == 0 or op == PROD and value == 0):
+                replace_with_num(start, value)
+                continue
+            if first_number != -1:
+                if value == identity:
+                    ops[first_number] = _DELETED
+                else:
+                    # the combined number takes the place of the first one
+                    operands[first_number] = out._constant(value)
+                    count += 1
+            if count == 0:
+                replace_with_num(start, identity)
+            elif count == 1:
+                # the only operand left takes the node's place
+                roots.append(last_live(len(ops) - 1))
+            else:
+                roots.append(out._push(op, count, start))
+
+        return out._compacted(roots)
+
+    def _compacted(self, roots: list[int]) -> FlatTree:
+        """Copies the entries that were not deleted, recomputing where every subtree starts"""
+        out = FlatTree()
+        out.names = self.names
+        out._name_index = self._name_index
+        out.constants = self.constants
+        out._constant_index = self._constant_index
+        (root,) = roots
+        new_roots: list[int] = []  # starts of the complete subtrees, in the new arrays
+        for index in range(self.starts[root], root + 1):
+            op = self.ops[index]
+            if op == _DELETED:
+                continue
+            position = len(out.ops)
+            arity = self.operands[index] if op == SUM or op == PROD else _FIXED_ARITY[op]
+            start = new_roots[len(new_roots) - arity] if arity else position
+            if arity:
+                del new_roots[len(new_roots) - arity :]
+            new_roots.append(start)
+            out._push(op, self.operands[index], start)
+        out._roots = [len(out.ops) - 1]
+        return out
+
+    def to_numpy(self) -> dict[str, Any]:
+        """Zero-copy NumPy views of the arrays, keyed by their attribute names"""
+        if np is None:
+            raise ImportError("to_numpy needs numpy (pip install numpy)")
+        return {
+            "ops": np.frombuffer(self.ops, dtype=np.uint8),
+            "operands": np.frombuffer(self.operands, dtype=np.int32),
+            "starts": np.frombuffer(self.starts, dtype=np.int32),
+        }
+
+    def __repr__(self) -> str:
+        return f"FlatTree({len(self)} nodes)"
@@ -0,0 +1,112 @@
+"""
+Edits of single subterms of an expression, re-simplifying only what the edit changed.
+
+Nodes are frozen, so replacing a subterm copies the path from the root to it and shares every
+other subtree with the old tree. A memoizing Simplifier then finds the untouched subtrees in its
+cache, and only the copied ancestors and the new subterm are simplified again.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from algebra_nodes import AlgebraNode
+from ast_to_algebra import Converter
+from lexer import Lexer
+from parser import Parser
+from simplify import Simplifier
+
+log = logging.getLogger(__name__)
+
+# A position in a tree: the index into children() at every level, from the root down
+Path = tuple[int, ...]
+
+# memoized subtrees of an IncrementalSession's default simplifier
+DEFAULT_CACHE_SIZE = 100_000
+
+
+class IncrementalError(Exception):
+    pass
+
+
+def _child(node: AlgebraNode, index: int, path: Path) -> AlgebraNode:
+    children = node.children()
+    if not 0 <= index < len(children):
+        raise IncrementalError(f"{path} is not a path in the tree, {node!r} has no child {index}")
+    return children[index]
+
+
+def node_at(root: AlgebraNode, path: Path) -> AlgebraNode:
+    """Gets the node at path"""
+    node = root
+    for index in path:
+        node = _child(node, index, path)
+    return node
+
+
+def replace_at(root: AlgebraNode, path: Path, replacement: AlgebraNode) -> AlgebraNode:
+    """
+    Returns root with the node at path replaced. Only the nodes on the path are rebuilt, every
+    other subtree is shared with root
+    """
+    ancestors = []
+    node = root
+    for index in path:
+        ancestors.append(node)
+        node = _child(node, index, path)
+    new = replacement
+    for ancestor, index in zip(reversed(ancestors), reversed(path)):
+        children = ancestor.children()
+        new = ancestor.with_children((*children[:index], new, *children[index + 1 :]))
+    return new
+
+
+def to_algebra(source: str) -> AlgebraNode:
+    """Lexes, parses and converts source, without simplifying it"""
+    return Converter(Parser(Lexer(source).iter_tokens()).parse()).convert_full()
+
+
+class IncrementalSession:
+    """
+    An expression that is edited one subterm at a time and kept simplified.
+    Args:
+        tree (AlgebraNode | str): The expression, or its source
+        simplifier (Simplifier | None): Has to memoize (see Simplifier's cache_size), its cache
+            is what carries the results of untouched subtrees from one edit to the next. It should
+            hold at least the size of the tree. A Simplifier caching DEFAULT_CACHE_SIZE results is
+            created if None
+    Attributes:
+        tree (AlgebraNode): The current expression, unsimplified. Paths point into this tree
+    """
+
+    def __init__(self, tree: AlgebraNode | str, simplifier: Simplifier | None = None):
+        if simplifier is None:
+            simplifier = Simplifier(cache_size=DEFAULT_CACHE_SIZE)
+        elif simplifier.cache_info() is None:
+            raise IncrementalError("the simplifier has to memoize, create it with a cache_size")
+        self.simplifier = simplifier
+        self.tree = to_algebra(tree) if isinstance(tree, str) else tree
+        self._result: AlgebraNode | None = None
+
+    @property
+    def result(self) -> AlgebraNode:
+        """The simplified expression, computed on first access after an edit"""
+        if self._result is None:
+            self._result = self.simplifier.simplify(self.tree)
+        return self._result
+
+    def node_at(self, path: Path) -> AlgebraNode:
+        return node_at(self.tree, path)
+
+    def replace(self, path: Path, replacement: AlgebraNode | str) -> AlgebraNode:
+        """
+        Replaces the node at path with replacement (or the expression it is the source of)
+        and returns the new simplified result
+        """
+        if isinstance(replacement, str):
+            replacement = to_algebra(replacement)
+        self.tree = replace_at(self.tree, path, replacement)
+        self._result = None
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("replaced the node at %s with %s", path, replacement)
+        return self.result
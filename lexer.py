@@ -2,7 +2,11 @@
 This module converts the input string into a series of tokens, getting it ready for the parser
 """
 
-from typing import Dict, List
+import mmap
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Dict, Union
 from tokens import Token, TokenKind
 import logging
 
@@ -31,97 +35,128 @@ IGNORED_CHARS = {
 }
 
 
+def _build_token_re(symbol_pattern: str) -> re.Pattern[str]:
+    """
+    Builds the master pattern with one named group per token class.
+    ERROR matches any single character the other groups don't, so finditer covers the input without gaps
+    """
+    ignored = "".join(re.escape(ch) for ch in sorted(IGNORED_CHARS))
+    operators = "".join(re.escape(ch) for ch in CHAR_TO_TOKEN)
+    return re.compile(
+        f"(?P<SKIP>[{ignored}]+)"
+        # spaces are consumed inside numbers so that "2 3" can be reported instead of silently multiplied
+        r"|(?P<NUMBER>\d[\d., ]*)"
+        f"|(?P<SYMBOL>{symbol_pattern})"
+        f"|(?P<OP>[{operators}])"
+        r"|(?P<ERROR>.)",
+        re.DOTALL,
+    )
+
+
+# a letter is a word character that is neither a digit nor an underscore
+_LETTER = r"[^\W\d_]"
+# a reference to an earlier result, e.g. %3 in the REPL
+_HISTORY_REFERENCE = r"%\d+"
+
+
+def _build_token_res() -> Dict[tuple[bool, bool, bool], re.Pattern]:
+    """The master pattern per (multi_letter_symbols, history_references, text source)"""
+    token_res: Dict[tuple[bool, bool, bool], re.Pattern] = {}
+    for multi_letter in (False, True):
+        for history in (False, True):
+            symbol = _LETTER + "+" if multi_letter else _LETTER
+            if history:
+                symbol = f"{_HISTORY_REFERENCE}|{symbol}"
+            pattern = _build_token_re(symbol)
+            token_res[(multi_letter, history, True)] = pattern
+            # for bytes sources only ASCII letters are letters
+            token_res[(multi_letter, history, False)] = re.compile(
+                pattern.pattern.encode(), re.DOTALL
+            )
+    return token_res
+
+
+_TOKEN_RES = _build_token_res()
+
+# bytes-like sources, e.g. a memory-mapped file, are lexed without decoding them first
+Source = Union[str, bytes, bytearray, memoryview, mmap.mmap]
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[mmap.mmap]:
+    """Memory-maps a file read-only, as a source for Lexer that is never loaded into memory as a whole"""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
 class Lexer:
     """
     Converts the inputted string into tokens
     Args:
-        input (str): The input
-        pos (int): The current position in the input
-        token_start (int): The beginning of the Token currently parsed, used for debugging purposes
+        source (Source): The input. Bytes-like sources are read as ASCII, and the positions of
+            their tokens are byte offsets
+        multi_letter_symbols (bool): Lex runs of letters as one symbol ("ab" -> ab) instead of
+            one symbol per letter ("ab" -> a, b, which the parser multiplies implicitly)
+        history_references (bool): Lex "%" followed by digits as one symbol ("%3" -> %3), the
+            REPL's references to earlier results
+        pos (int): The position in the input up to which it has been tokenized
     """
 
-    def __init__(self, source: str):
+    def __init__(
+        self, source: Source, multi_letter_symbols: bool = False, history_references: bool = False
+    ):
         """Store input text and initialize lexer state"""
         self.source = source
+        self.multi_letter_symbols = multi_letter_symbols
+        self.history_references = history_references
         self.pos = 0
-        self.token_start = 0
-
-    def _peek(self):
-        if self.pos >= len(self.source):
-            return "\0"
-        return self.source[self.pos]
-
-    def _advance(self) -> str:
-        """Returns the current character and moves one char"""
-        ch = self._peek()
-        log.debug(f"processing character at index {self.pos}: '{ch}'")
-        if ch != "\0":
-            self.pos += 1
-        return ch
 
     def tokenize(self) -> list[Token]:
-        """Runs _next_token until every token is processed and added to a list of tokens, which then is outputted"""
-        token_list: list[Token] = []
-        while True:
-            tok = self._next_token()  # should always return one Token
-            token_list.append(tok)
-            log.debug(f"Successfully processed token number {len(token_list)}: {tok}")
-            if tok.kind is TokenKind.EOF:
-                break
+        """Scans the whole input in one pass and returns its tokens, ending with an EOF token"""
+        token_list = list(self.iter_tokens())
+        log.debug("Tokenized %d characters into %d tokens", self.pos, len(token_list))
         return token_list
 
-    def _next_token(self) -> Token:
-        """Outputs one Token and changes the position to the beginning of the next Token"""
-
-        self._skip_ignored()
-
-        self.token_start = self.pos
-        ch = self._advance()
-
-        # Identify the next token
-        if ch == "\0":
-            return Token(TokenKind.EOF, "", self.token_start)
-
-        elif ch.isdigit():
-            return self._tokenize_number()
-
-        elif ch.isalpha():
-            return Token(TokenKind.SYMBOL, ch, self.token_start, ch)
-
-        elif ch in CHAR_TO_TOKEN:
-            return Token(CHAR_TO_TOKEN[ch], ch, self.token_start)
-
-        else:
-            raise LexerError(
-                f"The character {ch} at the position {self.token_start} could not be recognized by the lexer"
-            )
-
-    def _tokenize_number(self) -> Token:
+    def iter_tokens(self) -> Iterator[Token]:
+        """
+        Yields the tokens one at a time while scanning, ending with an EOF token.
+        Errors are raised when the scan reaches them, so tokens before an error have already
+        been yielded by then
+        """
+        is_text = isinstance(self.source, str)
+        token_re = _TOKEN_RES[(self.multi_letter_symbols, self.history_references, is_text)]
+        for match in token_re.finditer(self.source):  # type: ignore[arg-type]
+            group = match.lastgroup
+            if group == "SKIP":
+                continue
+            lexeme = match.group() if is_text else match.group().decode("latin-1")
+            start = match.start()
+            self.pos = start
+            if group == "OP":
+                yield Token(CHAR_TO_TOKEN[lexeme], lexeme, start)
+            elif group == "SYMBOL":
+                yield Token(TokenKind.SYMBOL, lexeme, start, lexeme)
+            elif group == "NUMBER":
+                yield self._tokenize_number(lexeme, start)
+            else:
+                raise LexerError(
+                    f"The character {lexeme} at the position {start} could not be recognized by the lexer"
+                )
+        self.pos = len(self.source)
+        yield Token(TokenKind.EOF, "", self.pos)
+
+    def _tokenize_number(self, lexeme: str, start: int) -> Token:
         """Makes a Token out of a Number"""
-        separator_number = 0
-        while self._peek().isdigit() or self._peek() in [",", ".", " "]:
-            ch = self._advance()
-            if ch in [",", "."]:
-                separator_number += 1
-
-        lexeme = self._get_token_lexeme()
-        for char in lexeme.strip():
-            if char == " ":
-                raise LexerError("Space in the middle of a number")
+        if " " in lexeme.strip():
+            raise LexerError(f"Space in the middle of a number at the position {start}")
 
+        separator_number = lexeme.count(",") + lexeme.count(".")
         if separator_number == 1:
             lexeme = lexeme.replace(",", ".")
-            return Token(TokenKind.NUMBER, lexeme, self.token_start, float(lexeme))
+            return Token(TokenKind.NUMBER, lexeme, start, float(lexeme))
         elif separator_number == 0:
-            return Token(TokenKind.NUMBER, lexeme, self.token_start, int(lexeme))
+            return Token(TokenKind.NUMBER, lexeme, start, int(lexeme))
         else:
-            raise LexerError("Too many commas / points in one number")
-
-    def _get_token_lexeme(self):
-        """returns a string from the beginning of the token to the current position of the token"""
-        return self.source[self.token_start : self.pos]
-
-    def _skip_ignored(self):
-        while self._peek() in IGNORED_CHARS:
-            self._advance()
-            log.debug(f"Current pos: {self.pos}, skipping char")
+            raise LexerError(
+                f"Too many commas / points in one number at the position {start}"
+            )
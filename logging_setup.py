@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 import os
 import sys
+from typing import TextIO
 
 DEFAULT_FORMAT = "%(asctime)s %(levelname)s %(name)s:%(lineno)d: %(message)s"
 DEFAULT_DATEFMT = "%H:%M:%S"
@@ -13,9 +14,10 @@ def setup_logging(
     enabled: bool | None = None,
     level: int | None = None,
     fmt: str = DEFAULT_FORMAT,
+    stream: TextIO | None = None,
 ) -> None:
     """
-    Console-only logging (stdout).
+    Console-only logging (stdout, or stream if given).
     - Call once from your CAS entry point (main/CLI/REPL).
     - Use enabled=False to silence logs.
     - Use level=logging.DEBUG to see debug logs.
@@ -51,7 +53,7 @@ def setup_logging(
     if root.handlers:
         return
 
-    handler = logging.StreamHandler(sys.stdout)
+    handler = logging.StreamHandler(sys.stdout if stream is None else stream)
     handler.setLevel(level)
     handler.setFormatter(logging.Formatter(fmt=fmt, datefmt=DEFAULT_DATEFMT))
     root.addHandler(handler)
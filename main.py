@@ -1,47 +1,209 @@
 from logging_setup import setup_logging
+import argparse
+import contextlib
+import json
 import logging
 import sys
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import TextIO
 
-# import tokens
-from lexer import Lexer
-from parser import Parser
-from ast_to_algebra import Converter
-from algebra_nodes import Var
-from simplify import Simplifier, SimplifierError
+from disk_cache import DEFAULT_MAX_ENTRIES, DiskCache
+from parallel import iter_simplify_parallel
+from pipeline import BatchItem, run_pipeline, simplify_lines
+from simplify import Simplifier
 
-setup_logging(level=__import__("logging").INFO)
 log = logging.getLogger(__name__)
 
-if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) != 1:
-        raise TypeError("Wrong number of Arguments")
-    source = args[0]
-    log.info(f"Received {source} as input")
-
-    lex = Lexer(source)
-    tokens = lex.tokenize()
-    log.info("Tokenized succefully")
-    tok_printable = "\n".join(str(tok) for tok in tokens)
-    log.debug(f"Tokens: \n {tok_printable}")
-
-    p = Parser(tokens)
-    tree = p.parse()
-    log.info("Parsed successfully")
-    log.debug(f"AST tree: \n {tree}")
-
-    c = Converter(tree)
-    alg_tree = c.convert_full()
-    log.info("Converted from AST to Algebra succefully")
-    log.debug(alg_tree)
-
-    # for i in alg_tree.children():
-    #     log.debug(i)
-    # log.debug("\n")
-    # for i in alg_tree.walk():
-    #     log.debug(i)
-
-    s = Simplifier()
-    simplified = s.simplify(alg_tree)
+
+def non_negative_int(text: str) -> int:
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return value
+
+
+def positive_int(text: str) -> int:
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not positive")
+    return value
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(description="Simplifies algebraic expressions")
+    arg_parser.add_argument("expression", nargs="?", help="the expression to simplify")
+    arg_parser.add_argument(
+        "--metrics",
+        choices=["json"],
+        help="print per-stage time, size and peak memory to stderr in the given format",
+    )
+    arg_parser.add_argument(
+        "--batch",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="simplify one expression per line of FILE (stdin if FILE is - or left out)",
+    )
+    arg_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="batch output: the result per line, or one JSON object per line",
+    )
+    arg_parser.add_argument(
+        "--cache-size",
+        type=non_negative_int,
+        default=10_000,
+        help="batch mode: how many simplified subexpressions are memoized across lines"
+        " (per process), 0 to disable",
+    )
+    arg_parser.add_argument(
+        "--jobs",
+        type=non_negative_int,
+        default=1,
+        help="batch mode: number of worker processes, 0 for one per CPU",
+    )
+    arg_parser.add_argument(
+        "--disk-cache",
+        metavar="PATH",
+        help="reuse results of earlier runs stored in the sqlite database PATH, and store new ones",
+    )
+    arg_parser.add_argument(
+        "--disk-cache-size",
+        type=positive_int,
+        default=DEFAULT_MAX_ENTRIES,
+        help="how many results the disk cache keeps, the least recently used are evicted first",
+    )
+    return arg_parser
+
+
+def parallel_lines(
+    lines: Iterable[str],
+    jobs: int | None,
+    cache_size: int | None,
+    disk_cache_path: str | None = None,
+    disk_cache_size: int = DEFAULT_MAX_ENTRIES,
+) -> Iterator[BatchItem]:
+    """Like simplify_lines, but spread over worker processes. Items keep their line index"""
+    line_indices: deque[int] = deque()
+
+    def sources() -> Iterator[str]:
+        for index, line in enumerate(lines):
+            source = line.rstrip("\r\n")
+            if source.strip():
+                line_indices.append(index)
+                yield source
+
+    # results come back in input order, so the indices pop off in the same order they were queued
+    for item in iter_simplify_parallel(
+        sources(),
+        max_workers=jobs,
+        cache_size=cache_size,
+        disk_cache_path=disk_cache_path,
+        disk_cache_size=disk_cache_size,
+        ordered=True,
+    ):
+        item.index = line_indices.popleft()
+        yield item
+
+
+def run_batch(items: Iterable[BatchItem], out: TextIO, output_format: str) -> tuple[int, int]:
+    """
+    Writes one output line per item as soon as it is available, flushing it so that a pipe
+    reading the output gets it right away.
+    Errors are written in place of the result instead of aborting the run.
+    Returns the number of processed expressions and how many of them failed
+    """
+    count = 0
+    errors = 0
+    for item in items:
+        count += 1
+        line_number = item.index + 1
+        if item.error is not None:
+            errors += 1
+        if output_format == "json":
+            record: dict[str, object] = {"line": line_number, "input": item.source}
+            if item.error is None:
+                record["result"] = repr(item.result)
+            else:
+                record["error"] = item.error
+            out.write(json.dumps(record) + "\n")
+        elif item.error is None:
+            out.write(f"{item.result!r}\n")
+        else:
+            out.write(f"error: line {line_number}: {item.error}\n")
+        out.flush()
+    return count, errors
+
+
+def open_disk_cache(args: argparse.Namespace) -> DiskCache | None:
+    if args.disk_cache is None:
+        return None
+    return DiskCache(args.disk_cache, max_entries=args.disk_cache_size)
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = build_arg_parser()
+    args, extra = arg_parser.parse_known_args(argv)
+    # argparse takes an expression starting with a minus, like -x+2, for an unknown option
+    if len(extra) == 1 and args.expression is None and not extra[0].startswith("--"):
+        args.expression = extra[0]
+    elif extra:
+        arg_parser.error(
+            f"unrecognized arguments: {' '.join(extra)}"
+            " (pass an expression that starts with a minus after --)"
+        )
+    if (args.expression is None) == (args.batch is None):
+        arg_parser.error("pass either an expression or --batch")
+    if args.batch is not None and args.metrics is not None:
+        arg_parser.error("--metrics is only supported for a single expression")
+
+    if args.batch is not None:
+        # stdout only holds the results
+        setup_logging(level=logging.WARNING, stream=sys.stderr)
+        cache_size = args.cache_size or None
+        # stdin is not ours to close
+        if args.batch == "-":
+            opened: contextlib.AbstractContextManager[TextIO] = contextlib.nullcontext(sys.stdin)
+        else:
+            opened = open(args.batch, encoding="utf-8")
+        with opened as lines:
+            if args.jobs == 1:
+                disk_cache = open_disk_cache(args)
+                items = simplify_lines(lines, Simplifier(cache_size=cache_size), disk_cache)
+            else:
+                disk_cache = None
+                items = parallel_lines(
+                    lines, args.jobs or None, cache_size, args.disk_cache, args.disk_cache_size
+                )
+            try:
+                count, errors = run_batch(items, sys.stdout, args.format)
+            finally:
+                if disk_cache is not None:
+                    disk_cache.close()
+        print(f"{count} expressions, {errors} errors", file=sys.stderr)
+        return 1 if errors else 0
+
+    setup_logging(level=logging.INFO, stream=sys.stderr)
+    source = args.expression
+    log.info("Received %s as input", source)
+    disk_cache = open_disk_cache(args)
+    try:
+        result = run_pipeline(
+            source, disk_cache=disk_cache, collect_metrics=args.metrics is not None
+        )
+    finally:
+        if disk_cache is not None:
+            disk_cache.close()
     log.info("simplified successfully")
-    print(simplified)
+    print(result.result)
+
+    if args.metrics == "json":
+        assert result.metrics is not None
+        print(result.metrics.to_json(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
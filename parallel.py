@@ -0,0 +1,173 @@
+"""
+Simplifies batches of expressions on several cores, running the whole pipeline
+(lex, parse, convert, simplify) in worker processes.
+The results come back pickled, which sends every tree in its binary form (see serialize.py)
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+from multiprocessing.util import Finalize
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+
+from disk_cache import DEFAULT_MAX_ENTRIES, DiskCache
+from pipeline import BatchItem, simplify_source
+from simplify import Simplifier
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_CACHE_SIZE = 10_000
+
+# one simplifier per worker process, created by the pool initializer and kept warm between chunks
+_worker_simplifier: Simplifier | None = None
+# every worker process opens its own connection to the shared database
+_worker_disk_cache: DiskCache | None = None
+
+
+def _init_worker(
+    cache_size: int | None,
+    disk_cache_path: str | None = None,
+    disk_cache_size: int = DEFAULT_MAX_ENTRIES,
+) -> None:
+    global _worker_simplifier, _worker_disk_cache
+    _worker_simplifier = Simplifier(cache_size=cache_size)
+    if disk_cache_path is not None:
+        _worker_disk_cache = DiskCache(disk_cache_path, max_entries=disk_cache_size)
+        # workers leave through os._exit, which skips atexit but runs these finalizers
+        Finalize(None, _worker_disk_cache.close, exitpriority=10)
+
+
+def worker_simplifier() -> Simplifier:
+    """Returns the warm simplifier of the current worker process, or a fresh one outside of a pool"""
+    if _worker_simplifier is None:
+        return Simplifier()
+    return _worker_simplifier
+
+
+def _run_chunk(start: int, sources: list[str]) -> list[BatchItem]:
+    simplifier = worker_simplifier()
+    return [
+        simplify_source(start + offset, source, simplifier, _worker_disk_cache)
+        for offset, source in enumerate(sources)
+    ]
+
+
+def make_pool(
+    max_workers: int | None = None,
+    cache_size: int | None = DEFAULT_CACHE_SIZE,
+    disk_cache_path: str | None = None,
+    disk_cache_size: int = DEFAULT_MAX_ENTRIES,
+) -> ProcessPoolExecutor:
+    """
+    Creates a process pool whose workers each keep one memoizing Simplifier for their whole life,
+    and a connection to the DiskCache at disk_cache_path if it is given.
+    Pass it as executor to reuse warm workers across several batches
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(cache_size, disk_cache_path, disk_cache_size),
+    )
+
+
+def _chunks(sources: Iterable[str], chunk_size: int) -> Iterator[tuple[int, list[str]]]:
+    iterator = iter(sources)
+    start = 0
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+def iter_simplify_parallel(
+    sources: Iterable[str],
+    *,
+    max_workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache_size: int | None = DEFAULT_CACHE_SIZE,
+    disk_cache_path: str | None = None,
+    disk_cache_size: int = DEFAULT_MAX_ENTRIES,
+    ordered: bool = False,
+    executor: Executor | None = None,
+) -> Iterator[BatchItem]:
+    """
+    Simplifies every source in worker processes and yields the items as their chunk completes.
+    Only a few chunks per worker are in flight at any time, so sources can be a long lazy iterable.
+    When ordered, chunks that finished but wait for an earlier one count as in flight as well.
+    Errors are captured per item, see BatchItem.
+    Args:
+        sources (Iterable[str]): The expressions
+        max_workers (int | None): Worker processes, defaults to the number of CPUs. With an
+            executor it only bounds the chunks in flight, pass the executor's worker count
+        chunk_size (int): Expressions sent to a worker at once
+        cache_size (int | None): Memoization cache size of each worker's Simplifier
+        disk_cache_path (str | None): A DiskCache database the workers share
+        disk_cache_size (int): The size cap of the DiskCache
+        ordered (bool): Yield in input order instead of completion order
+        executor (Executor | None): An existing pool (see make_pool) to use instead of a new one.
+            It is not shut down afterwards
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size has to be positive, got {chunk_size}")
+    workers = max_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if executor is None:
+        pool = make_pool(workers, cache_size, disk_cache_path, disk_cache_size)
+    else:
+        pool = executor
+    max_in_flight = 2 * workers
+    chunks = _chunks(sources, chunk_size)
+    pending: set[Future[list[BatchItem]]] = set()
+    finished: dict[int, list[BatchItem]] = {}  # only used when ordered
+    next_start = 0
+    try:
+        while True:
+            free = max(0, max_in_flight - len(pending) - len(finished))
+            for start, chunk in itertools.islice(chunks, free):
+                pending.add(pool.submit(_run_chunk, start, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                items = future.result()
+                if not ordered:
+                    yield from items
+                    continue
+                finished[items[0].index] = items
+            while next_start in finished:
+                items = finished.pop(next_start)
+                next_start += len(items)
+                yield from items
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def simplify_parallel(
+    sources: Iterable[str],
+    *,
+    max_workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache_size: int | None = DEFAULT_CACHE_SIZE,
+    disk_cache_path: str | None = None,
+    disk_cache_size: int = DEFAULT_MAX_ENTRIES,
+    executor: Executor | None = None,
+) -> list[BatchItem]:
+    """Simplifies every source in worker processes and returns the items in input order"""
+    return list(
+        iter_simplify_parallel(
+            sources,
+            max_workers=max_workers,
+            chunk_size=chunk_size,
+            cache_size=cache_size,
+            disk_cache_path=disk_cache_path,
+            disk_cache_size=disk_cache_size,
+            ordered=True,
+            executor=executor,
+        )
+    )
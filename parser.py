@@ -1,21 +1,62 @@
+from collections import deque
+from collections.abc import Iterable
 from tokens import Token, TokenKind
 import logging
 from parser_nodes import Unary, Binary, Number, Symbol, ParserNode
 
 log = logging.getLogger(__name__)
 
+# Binding powers for the table-driven parse(). A sign applies to the whole product after it,
+# so it binds weaker than * and /, but stronger than the + and - of the surrounding sum.
+_SUM, _SIGN, _PRODUCT, _POWER = 1, 2, 3, 4
+_BINARY_PRECEDENCE = {
+    TokenKind.PLUS: _SUM,
+    TokenKind.MINUS: _SUM,
+    TokenKind.STAR: _PRODUCT,
+    TokenKind.SLASH: _PRODUCT,
+    TokenKind.CARET: _POWER,
+}
+_RIGHT_ASSOCIATIVE = frozenset((TokenKind.CARET,))
+# tokens that start an operand directly after another one, which multiplies them implicitly
+_IMPLICIT_PRODUCT = frozenset((TokenKind.SYMBOL, TokenKind.NUMBER, TokenKind.LPAREN))
+_SIGNS = frozenset((TokenKind.PLUS, TokenKind.MINUS))
+# operator stack entry of an open parenthesis, its precedence stops every reduction
+_GROUP = (0, None, False)
+
 
 class ParserError(Exception):
     pass
 
 
 class Parser:
-    def __init__(self, tokens: list[Token]):
-        self.tokens = tokens
+    """
+    Parses tokens into a parser tree
+    Args:
+        tokens (Iterable[Token]): The tokens, ending with an EOF token. An iterator, like
+            Lexer.iter_tokens(), is consumed lazily: only the tokens peeked at are held
+        pos (int): The number of tokens consumed so far
+    """
+
+    def __init__(self, tokens: Iterable[Token]):
+        self._tokens = iter(tokens)
+        self._lookahead: deque[Token] = deque()
+        self._eof: Token | None = None
         self.pos = 0
 
     def peek(self, offset: int = 0) -> Token:
-        return self.tokens[self.pos + offset]
+        lookahead = self._lookahead
+        while len(lookahead) <= offset:
+            if self._eof is not None:
+                # the EOF token repeats, so peeking past the end is harmless
+                lookahead.append(self._eof)
+                continue
+            tok = next(self._tokens, None)
+            if tok is None:
+                raise ParserError("the tokens ended without an EOF token")
+            if tok.kind is TokenKind.EOF:
+                self._eof = tok
+            lookahead.append(tok)
+        return lookahead[offset]
 
     def at_end(self) -> bool:
         return self.peek().kind is TokenKind.EOF
@@ -23,98 +64,103 @@ class Parser:
     def advance(self):
         if self.at_end():
             raise ParserError("advance() called at EOF")
-        log.debug(
-            f"processed token {self.peek()}. Currently at position {self.pos + 1}"
-        )
-        tok = self.peek()
+        tok = self._lookahead.popleft()
         self.pos += 1
+        log.debug("processed token %s. Currently at position %d", tok, self.pos)
         return tok
 
-    def check(self, kind: TokenKind) -> bool:
-        if self.at_end():
-            return False
-        return self.peek().kind is kind
-
-    def match(self, *kinds: TokenKind) -> bool:
-        for kind in kinds:
-            if self.check(kind):
-                return True
-        return False
+    def _consume(self) -> None:
+        # advance() without the checks, for a token that has just been peeked at
+        self._lookahead.popleft()
+        self.pos += 1
 
-    def parse(self):
-        # Parsing hierarchy: Sum -> exp -> Product -> Unary -> Atom
+    def parse(self) -> ParserNode:
         if self.at_end():
             raise ParserError("empty Input")
-        tree = self.parse_sum()
-        if self.pos + 1 < len(self.tokens):
-            log.debug(f"Not all Tokens consumed. Currently at token {self.peek()}")
+        tree = self.parse_operators()
+        if not self.at_end():
+            log.debug("Not all Tokens consumed. Currently at token %s", self.peek())
         return tree
 
-    def parse_sum(self) -> ParserNode:
-        left = self.parse_unary()
-        while (
-            self.match(TokenKind.PLUS, TokenKind.MINUS)
-            and not self.check(TokenKind.RPAREN)
-            and not self.at_end()
-        ):
-            op = self.advance().kind
-            right = self.parse_unary()
-            left = Binary(op, left, right)
-
-        if self.check(TokenKind.RPAREN):
-            self.advance()
-        return left
-
-    def parse_unary(self) -> ParserNode:
-        if self.match(TokenKind.PLUS, TokenKind.MINUS):
-            op = self.advance().kind
-            expr = self.parse_prod()
-            return Unary(op, expr)
-
-        return self.parse_prod()
-
-    def parse_prod(self) -> ParserNode:
-        left = self.parse_exp()
-        while (
-            self.match(
-                TokenKind.STAR,
-                TokenKind.SLASH,
-                TokenKind.SYMBOL,
-                TokenKind.NUMBER,
-                TokenKind.LPAREN,
-            )
-            and not self.at_end()
-        ):
-            if self.match(TokenKind.STAR, TokenKind.SLASH):
-                op = self.peek().kind
-                self.advance()
+    def parse_operators(self) -> ParserNode:
+        """
+        Table-driven operator precedence parsing of a sum, with explicit operand and operator
+        stacks, so it takes linear time and no recursion however long or nested the input is.
+        The grammar is Sum -> Unary -> Product -> exp -> Atom: a sign applies to the product after
+        it, products may be implicit, and ^ is right associative
+        """
+        peek = self.peek
+        consume = self._consume
+        operands: list[ParserNode] = []
+        # (precedence, operator, is_sign), see _GROUP for open parentheses
+        operators: list[tuple[int, TokenKind | None, bool]] = []
+        expect_operand = True
+        sign_allowed = True  # only a sum (or a parenthesis) may start with a sign
+        while True:
+            tok = peek()
+            kind = tok.kind
+            if expect_operand:
+                if kind is TokenKind.NUMBER:
+                    assert isinstance(tok.value, int | float)
+                    operands.append(Number(tok.value))
+                    expect_operand = False
+                elif kind is TokenKind.SYMBOL:
+                    assert isinstance(tok.value, str)
+                    operands.append(Symbol(tok.value))
+                    expect_operand = False
+                elif kind is TokenKind.LPAREN:
+                    operators.append(_GROUP)
+                    sign_allowed = True
+                elif kind in _SIGNS and sign_allowed:
+                    operators.append((_SIGN, kind, True))
+                    sign_allowed = False
+                else:
+                    raise ParserError(f"Token {tok} not an atom")
+                consume()
+                continue
+
+            if kind is TokenKind.EOF:
+                # missing closing parentheses are tolerated
+                _reduce(operands, operators, 0)
+                break
+            if kind is TokenKind.RPAREN:
+                consume()
+                _reduce(operands, operators, 1)
+                if not operators:
+                    # a ")" without a "(" ends the input, the remaining tokens are ignored
+                    break
+                operators.pop()  # the matching _GROUP
+                continue
+
+            if kind in _IMPLICIT_PRODUCT:
+                kind = TokenKind.STAR  # the token itself is read as the next operand
             else:
-                op = TokenKind.STAR
-            right = self.parse_exp()
-            left = Binary(op, left, right)
-        return left
-
-    def parse_exp(self) -> ParserNode:
-        left = self.parse_atom()
-        log.debug(f"currently at {self.peek()}")
-        if self.match(TokenKind.CARET) and not self.at_end():
-            self.advance()
-            right = self.parse_exp()
-            left = Binary(TokenKind.CARET, left, right)
-        return left
-
-    def parse_atom(self) -> ParserNode:
-        tok = self.peek()
-        match tok.kind:
-            case TokenKind.NUMBER:
-                assert isinstance(tok.value, int | float)
-                self.advance()
-                return Number(tok.value)
-            case TokenKind.SYMBOL:
-                assert isinstance(tok.value, str)
-                self.advance()
-                return Symbol(tok.value)
-            case TokenKind.LPAREN:
-                self.advance()
-                return self.parse_sum()
-        raise ParserError(f"Token {tok} not an atom")
+                consume()
+            precedence = _BINARY_PRECEDENCE[kind]
+            _reduce(operands, operators, precedence + (kind in _RIGHT_ASSOCIATIVE))
+            operators.append((precedence, kind, False))
+            expect_operand = True
+            sign_allowed = kind in _SIGNS
+
+        (tree,) = operands
+        return tree
+
+
+def _reduce(
+    operands: list[ParserNode],
+    operators: list[tuple[int, TokenKind | None, bool]],
+    min_precedence: int,
+) -> None:
+    """
+    Applies the operators on top of the stack while they bind at least min_precedence.
+    Open parentheses have precedence 0, so only min_precedence 0 (the end of the input) removes them
+    """
+    while operators and operators[-1][0] >= min_precedence:
+        precedence, op, is_sign = operators.pop()
+        if op is None:
+            continue
+        if is_sign:
+            operands.append(Unary(op, operands.pop()))
+        else:
+            right = operands.pop()
+            operands.append(Binary(op, operands.pop(), right))
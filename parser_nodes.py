@@ -1,21 +1,24 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from tokens import TokenKind
 from collections.abc import Iterator
 
 
 class ParserNode:
+    __slots__ = ()
+
     def children(self) -> Iterator["ParserNode"]:
-        return (value for value in vars(self).values() if isinstance(value, ParserNode))
+        return iter(())
 
     def label(self) -> str:
         parts = []
-        for name, value in vars(self).items():
+        for field in fields(self):  # type: ignore[arg-type]
+            value = getattr(self, field.name)
             if isinstance(value, ParserNode):
                 continue
             if isinstance(value, TokenKind):
-                parts.append(f"{name}={value.name}")
+                parts.append(f"{field.name}={value.name}")
             else:
-                parts.append(f"{name}={value!r}")
+                parts.append(f"{field.name}={value!r}")
         return f"{self.__class__.__name__}({', '.join(parts)})"
 
     def pretty(self, prefix: str = "", is_last: bool = True) -> str:
@@ -37,24 +40,31 @@ class ParserNode:
         return self.pretty(prefix="", is_last=True)
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Number(ParserNode):
     value: int | float
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Symbol(ParserNode):
     name: str
 
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Unary(ParserNode):
     op: TokenKind
     expr: ParserNode
 
+    def children(self) -> Iterator[ParserNode]:
+        yield self.expr
+
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class Binary(ParserNode):
     op: TokenKind
     left: ParserNode
     right: ParserNode
+
+    def children(self) -> Iterator[ParserNode]:
+        yield self.left
+        yield self.right
@@ -0,0 +1,234 @@
+"""
+Runs the whole CAS pipeline (Lexer -> Parser -> Converter -> Simplifier) on one input,
+optionally recording the wall time, output size and peak memory of every stage
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+import tracemalloc
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+from algebra_nodes import AlgebraNode
+from ast_to_algebra import Converter
+from disk_cache import DiskCache
+from lexer import Lexer
+from parser import Parser
+from parser_nodes import ParserNode
+from simplify import Simplifier
+
+log = logging.getLogger(__name__)
+
+STAGES = ("lex", "parse", "convert", "simplify")
+
+
+@dataclass
+class StageMetrics:
+    """
+    What one stage of the pipeline cost.
+
+    Attributes:
+        stage (str): One of STAGES.
+        wall_time (float): Seconds spent in the stage.
+        items (int): Tokens produced by "lex", nodes produced by the other stages.
+        peak_memory (int | None): Peak bytes allocated during the stage (tracemalloc),
+            None if memory was not tracked.
+    """
+
+    stage: str
+    wall_time: float = 0.0
+    items: int = 0
+    peak_memory: int | None = None
+
+
+@dataclass
+class PipelineMetrics:
+    """
+    Per-stage metrics of one pipeline run.
+
+    Attributes:
+        source_length (int): Number of characters in the input.
+        stages (list[StageMetrics]): One entry per stage that ran, in order.
+    """
+
+    source_length: int
+    stages: list[StageMetrics] = field(default_factory=list)
+
+    @property
+    def total_time(self) -> float:
+        return sum(stage.wall_time for stage in self.stages)
+
+    def stage(self, name: str) -> StageMetrics:
+        for stage in self.stages:
+            if stage.stage == name:
+                return stage
+        raise KeyError(name)
+
+    def to_dict(self) -> dict:
+        out = asdict(self)
+        out["total_time"] = self.total_time
+        return out
+
+    def to_json(self, indent: int | None = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+
+@dataclass
+class PipelineResult:
+    """
+    Attributes:
+        source (str): The input.
+        result (AlgebraNode): The simplified expression.
+        metrics (PipelineMetrics | None): Per-stage metrics, None unless they were collected.
+    """
+
+    source: str
+    result: AlgebraNode
+    metrics: PipelineMetrics | None = None
+
+
+def count_parser_nodes(tree: ParserNode) -> int:
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children())
+    return count
+
+
+@contextmanager
+def _measure(
+    metrics: PipelineMetrics | None, name: str, track_memory: bool
+) -> Iterator[StageMetrics]:
+    stage = StageMetrics(name)
+    if metrics is None:
+        yield stage
+        return
+    if track_memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield stage
+    stage.wall_time = time.perf_counter() - start
+    if track_memory:
+        stage.peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+    metrics.stages.append(stage)
+    log.debug("%s: %d items in %.6fs", name, stage.items, stage.wall_time)
+
+
+def run_pipeline(
+    source: str,
+    simplifier: Simplifier | None = None,
+    *,
+    disk_cache: DiskCache | None = None,
+    bindings: Mapping[str, AlgebraNode] | None = None,
+    multi_letter_symbols: bool = False,
+    history_references: bool = False,
+    collect_metrics: bool = False,
+    track_memory: bool = True,
+) -> PipelineResult:
+    """
+    Lexes, parses, converts and simplifies source.
+    Args:
+        source (str): The expression
+        simplifier (Simplifier | None): The simplifier to use, reuse one to keep its cache warm.
+            A fresh one is created if None
+        disk_cache (DiskCache | None): Persistent results to reuse, and to store the result in
+        bindings (Mapping[str, AlgebraNode] | None): Trees that replace the variables of these
+            names after converting, e.g. earlier results
+        multi_letter_symbols (bool): See Lexer
+        history_references (bool): See Lexer
+        collect_metrics (bool): Record per-stage metrics in the result
+        track_memory (bool): With collect_metrics, also record peak memory per stage.
+            tracemalloc slows every allocation down, so the stage times grow with it
+    """
+    if simplifier is None:
+        simplifier = Simplifier()
+    metrics = PipelineMetrics(len(source)) if collect_metrics else None
+    track_memory = collect_metrics and track_memory
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        with _measure(metrics, "lex", track_memory) as stage:
+            tokens = Lexer(source, multi_letter_symbols, history_references).tokenize()
+            stage.items = len(tokens)
+        log.debug("Tokens: %s", tokens)
+
+        with _measure(metrics, "parse", track_memory) as stage:
+            tree = Parser(tokens).parse()
+            if metrics is not None:
+                stage.items = count_parser_nodes(tree)
+        log.debug("AST tree: \n %s", tree)
+
+        with _measure(metrics, "convert", track_memory) as stage:
+            alg_tree = Converter(tree).convert_full()
+            if bindings:
+                alg_tree = alg_tree.substitute(bindings)
+            stage.items = alg_tree.size
+        log.debug("Algebra tree: %s", alg_tree)
+
+        with _measure(metrics, "simplify", track_memory) as stage:
+            if disk_cache is None:
+                simplified = simplifier.simplify(alg_tree)
+            else:
+                simplified = disk_cache.simplify(simplifier, alg_tree)
+            stage.items = simplified.size
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    return PipelineResult(source, simplified, metrics)
+
+
+@dataclass
+class BatchItem:
+    """
+    The outcome of one input of a batch, exactly one of result and error is set.
+
+    Attributes:
+        index (int): Position of the input in the batch, starting at 0.
+        source (str): The input.
+        result (AlgebraNode | None): The simplified expression.
+        error (str | None): "ErrorType: message" if the input could not be simplified.
+    """
+
+    index: int
+    source: str
+    result: AlgebraNode | None = None
+    error: str | None = None
+
+
+def simplify_source(
+    index: int, source: str, simplifier: Simplifier, disk_cache: DiskCache | None = None
+) -> BatchItem:
+    """Runs the pipeline on one input of a batch, capturing any error in the returned item"""
+    try:
+        result = run_pipeline(source, simplifier, disk_cache=disk_cache).result
+    except Exception as e:
+        # one bad input must not abort the rest of the batch
+        log.debug("input %d failed", index, exc_info=True)
+        return BatchItem(index, source, error=f"{type(e).__name__}: {e}")
+    return BatchItem(index, source, result)
+
+
+def simplify_lines(
+    lines: Iterable[str],
+    simplifier: Simplifier | None = None,
+    disk_cache: DiskCache | None = None,
+) -> Iterator[BatchItem]:
+    """
+    Lazily simplifies one expression per line, so memory stays constant however long the input is.
+    Trailing newlines are stripped, blank lines are skipped (their index is still counted)
+    """
+    if simplifier is None:
+        simplifier = Simplifier()
+    for index, line in enumerate(lines):
+        source = line.rstrip("\r\n")
+        if not source.strip():
+            continue
+        yield simplify_source(index, source, simplifier, disk_cache)
@@ -0,0 +1,272 @@
+"""
+Sparse multivariate polynomials, the simplifier's canonical form for polynomial Sum and Prod trees.
+Like terms are merged by a dict lookup on their exponent vector, instead of by rebuilding and
+re-simplifying Prod nodes.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from algebra_nodes import AlgebraNode, Num, Var, Neg, Inv, Sum, Prod, Pow
+from cache import LRUCache
+from expand import Coefficient, Monomial, expand_product, multiply_terms, power_terms
+
+log = logging.getLogger(__name__)
+
+
+class PolynomialError(Exception):
+    pass
+
+
+def _monomial_order(item: tuple[Monomial, Coefficient]) -> tuple:
+    # by ascending degree, so the constant comes first, then x before y before x^2 before xy ...
+    monomial = item[0]
+    return (sum(monomial), tuple(-e for e in monomial))
+
+
+class Polynomial:
+    """
+    A sparse multivariate polynomial with numeric coefficients.
+    Args:
+        variables (tuple[str, ...]): The variable names, sorted
+        terms (dict[Monomial, Coefficient]): The coefficient of every monomial, e.g. with the
+            variables ("x", "y"), {(2, 0): 3, (0, 0): 1} is 3x^2 + 1. Zero coefficients are dropped
+    """
+
+    __slots__ = ("variables", "terms")
+
+    def __init__(
+        self,
+        variables: tuple[str, ...] = (),
+        terms: dict[Monomial, Coefficient] | None = None,
+    ):
+        if list(variables) != sorted(set(variables)):
+            raise PolynomialError(f"the variables {variables} are not sorted and unique")
+        self.variables = tuple(variables)
+        self.terms = {}
+        for monomial, coefficient in (terms or {}).items():
+            if len(monomial) != len(variables):
+                raise PolynomialError(
+                    f"the monomial {monomial} does not match the variables {variables}"
+                )
+            if coefficient != 0:
+                self.terms[tuple(monomial)] = coefficient
+
+    @classmethod
+    def _make(cls, variables: tuple[str, ...], terms: dict[Monomial, Coefficient]) -> Polynomial:
+        # trusted constructor: terms are already keyed by valid monomials and free of zeros
+        poly = cls.__new__(cls)
+        poly.variables = variables
+        poly.terms = terms
+        return poly
+
+    @classmethod
+    def constant(cls, value: Coefficient, variables: tuple[str, ...] = ()) -> Polynomial:
+        if value == 0:
+            return cls._make(variables, {})
+        return cls._make(variables, {(0,) * len(variables): value})
+
+    @classmethod
+    def variable(cls, name: str, variables: tuple[str, ...] | None = None) -> Polynomial:
+        if variables is None:
+            variables = (name,)
+        monomial = tuple(int(other == name) for other in variables)
+        if 1 not in monomial:
+            raise PolynomialError(f"{name} is not one of the variables {variables}")
+        return cls._make(variables, {monomial: 1})
+
+    def is_zero(self) -> bool:
+        return not self.terms
+
+    def is_constant(self) -> bool:
+        return not self.terms or (len(self.terms) == 1 and not any(next(iter(self.terms))))
+
+    def constant_value(self) -> Coefficient:
+        """Returns the constant term, 0 if there is none"""
+        return self.terms.get((0,) * len(self.variables), 0)
+
+    def degree(self) -> int:
+        """Returns the total degree, -1 for the zero polynomial"""
+        return max((sum(monomial) for monomial in self.terms), default=-1)
+
+    def with_variables(self, variables: tuple[str, ...]) -> Polynomial:
+        """Re-expresses the polynomial over a sorted superset of its variables"""
+        if variables == self.variables:
+            return self
+        try:
+            positions = [variables.index(name) for name in self.variables]
+        except ValueError:
+            raise PolynomialError(
+                f"{variables} does not contain all of the variables {self.variables}"
+            ) from None
+        width = len(variables)
+        terms: dict[Monomial, Coefficient] = {}
+        for monomial, coefficient in self.terms.items():
+            widened = [0] * width
+            for position, exponent in zip(positions, monomial):
+                widened[position] = exponent
+            terms[tuple(widened)] = coefficient
+        return Polynomial._make(variables, terms)
+
+    def _align(self, other: Polynomial | Coefficient) -> tuple[Polynomial, Polynomial]:
+        if not isinstance(other, Polynomial):
+            return self, Polynomial.constant(other, self.variables)
+        if other.variables == self.variables:
+            return self, other
+        variables = tuple(sorted({*self.variables, *other.variables}))
+        return self.with_variables(variables), other.with_variables(variables)
+
+    def __add__(self, other: Polynomial | Coefficient) -> Polynomial:
+        if not isinstance(other, (Polynomial, int, float, complex)):
+            return NotImplemented
+        a, b = self._align(other)
+        terms = a.terms.copy()
+        for monomial, coefficient in b.terms.items():
+            total = terms.get(monomial, 0) + coefficient
+            if total == 0:
+                terms.pop(monomial, None)
+            else:
+                terms[monomial] = total
+        return Polynomial._make(a.variables, terms)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> Polynomial:
+        return Polynomial._make(
+            self.variables, {monomial: -c for monomial, c in self.terms.items()}
+        )
+
+    def __sub__(self, other: Polynomial | Coefficient) -> Polynomial:
+        if not isinstance(other, (Polynomial, int, float, complex)):
+            return NotImplemented
+        return self + -other
+
+    def __rsub__(self, other: Coefficient) -> Polynomial:
+        return -self + other
+
+    def multiply(self, other: Polynomial | Coefficient, max_terms: int | None = None) -> Polynomial:
+        """Like *, but raises ExpansionError if the product has more than max_terms terms"""
+        a, b = self._align(other)
+        return Polynomial._make(a.variables, multiply_terms(a.terms, b.terms, max_terms))
+
+    def __mul__(self, other: Polynomial | Coefficient) -> Polynomial:
+        if not isinstance(other, (Polynomial, int, float, complex)):
+            return NotImplemented
+        return self.multiply(other)
+
+    __rmul__ = __mul__
+
+    def power(self, n: int, max_terms: int | None = None) -> Polynomial:
+        """Like **, but raises ExpansionError if the result has more than max_terms terms"""
+        if type(n) is not int or n < 0:
+            raise PolynomialError(f"polynomials can only be raised to natural powers, not {n}")
+        terms = power_terms(self.terms, n, len(self.variables), max_terms)
+        return Polynomial._make(self.variables, terms)
+
+    def __pow__(self, n: int) -> Polynomial:
+        return self.power(n)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Polynomial):
+            return NotImplemented
+        a, b = self._align(other)
+        return a.terms == b.terms
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Polynomial({self.variables}, {self.terms})"
+
+    @classmethod
+    def from_node(
+        cls, node: AlgebraNode, max_terms: int | None = None, cache: LRUCache | None = None
+    ) -> Polynomial:
+        """
+        Converts a tree with node.is_polynomial set, expanding its products and powers.
+        Numeric subtrees become constants, so the coefficients are computed like Simplifier.eval would.
+        cache keeps the polynomials of subtrees across calls. Every subtree is converted over its
+        own variables and widened where it is combined, so a tree that differs from an earlier one
+        in a single term only converts the path to that term again, even if the term brings in a
+        new variable.
+        Raises ExpansionError if an expanded subtree has more than max_terms terms
+        """
+        if not node.is_polynomial:
+            raise PolynomialError(f"{node!r} is not a polynomial")
+        # subtrees mostly share their free_vars sets, so each is sorted once
+        sorted_variables: dict[frozenset[str], tuple[str, ...]] = {}
+        converted: dict[AlgebraNode, Polynomial] = {}
+        # post-order with an explicit stack, shared subtrees are converted once
+        stack: list[tuple[AlgebraNode, bool]] = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current in converted:
+                continue
+            children = current.children()
+            if children and not children_done:
+                if cache is not None:
+                    cached = cache.get(current)
+                    if cached is not None:
+                        converted[current] = cached
+                        continue
+                stack.append((current, True))
+                stack.extend((child, False) for child in children)
+                continue
+            variables = sorted_variables.get(current.free_vars)
+            if variables is None:
+                variables = sorted_variables[current.free_vars] = tuple(sorted(current.free_vars))
+            match current:
+                case Num(value):
+                    poly = cls.constant(value)
+                case Var(name):
+                    poly = cls._make(variables, {(1,): 1})
+                case Sum(terms):
+                    poly = cls._make(variables, {})
+                    for term in terms:
+                        poly = poly + converted[term]
+                case Prod(factors):
+                    terms = expand_product(
+                        (converted[factor].with_variables(variables).terms for factor in factors),
+                        len(variables),
+                        max_terms,
+                    )
+                    poly = cls._make(variables, terms)
+                case Neg(expr):
+                    poly = -converted[expr]
+                case Inv(expr):
+                    poly = cls.constant(1 / converted[expr].constant_value())
+                case Pow(base, exp):
+                    base_poly = converted[base]
+                    exponent = converted[exp].constant_value()
+                    if base_poly.is_constant():
+                        poly = cls.constant(base_poly.constant_value() ** exponent, variables)
+                    else:
+                        poly = base_poly.power(exponent, max_terms)
+                case _:
+                    raise PolynomialError(f"Node type {type(current)} not recognized")
+            converted[current] = poly
+            if cache is not None and children:
+                cache.put(current, poly)
+        return converted[node]
+
+    def to_node(self) -> AlgebraNode:
+        """
+        Converts back to a tree in canonical form: a Sum of terms by ascending degree, each a
+        product of the coefficient (left out if it is 1) and the variables' powers
+        """
+        if not self.terms:
+            return Num(0)
+        var_nodes = [Var(name) for name in self.variables]
+        out_terms: list[AlgebraNode] = []
+        for monomial, coefficient in sorted(self.terms.items(), key=_monomial_order):
+            factors: list[AlgebraNode] = [
+                var if exponent == 1 else Pow(var, Num(exponent))
+                for var, exponent in zip(var_nodes, monomial)
+                if exponent
+            ]
+            if not factors or coefficient != 1:
+                factors.insert(0, Num(coefficient))
+            out_terms.append(factors[0] if len(factors) == 1 else Prod(tuple(factors)))
+        if len(out_terms) == 1:
+            return out_terms[0]
+        return Sum(tuple(out_terms))
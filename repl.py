@@ -0,0 +1,204 @@
+"""
+An interactive session that keeps one warm Simplifier, so only the first query pays for startup.
+
+Every result is numbered and can be used in later inputs as %N, and "name = expression" binds a
+name. Both are stored simplified and substituted into later trees directly, without parsing them
+again. Commands start with a colon, see HELP.
+
+Run it with:
+    python repl.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import sys
+
+from algebra_nodes import AlgebraNode
+from lexer import Lexer
+from logging_setup import setup_logging
+from parallel import DEFAULT_CACHE_SIZE
+from pipeline import PipelineMetrics, PipelineResult, run_pipeline
+from simplify import Simplifier
+from tokens import TokenKind
+
+log = logging.getLogger(__name__)
+
+PROMPT = ">>> "
+HELP = """\
+expression        simplify it, the result is stored as %N
+name = expression simplify it and bind the result to name
+%N                the N-th result, usable in any expression
+:time expression  simplify it and show how long every stage took
+:vars             list the bound names
+:unset name       remove a binding
+:help             show this help
+:quit             leave (or Ctrl-D)"""
+
+_ASSIGNMENT_RE = re.compile(r"\s*([^\W\d_]+)\s*=(.*)", re.DOTALL)
+_REFERENCE_RE = re.compile(r"%(\d+)")
+
+
+class ReplError(Exception):
+    pass
+
+
+def format_metrics(metrics: PipelineMetrics) -> str:
+    """One line per stage and one for the total, times in milliseconds"""
+    lines = [
+        f"{stage.stage:<9}{stage.wall_time * 1000:10.3f} ms  {stage.items} items"
+        for stage in metrics.stages
+    ]
+    lines.append(f"{'total':<9}{metrics.total_time * 1000:10.3f} ms")
+    return "\n".join(lines)
+
+
+class ReplSession:
+    """
+    The state of one REPL session.
+    Args:
+        simplifier (Simplifier | None): Kept for the whole session, so its caches stay warm.
+            A Simplifier caching DEFAULT_CACHE_SIZE results is created if None
+        multi_letter_symbols (bool): See Lexer
+    Attributes:
+        history (list[AlgebraNode]): The results, %N is history[N - 1]
+        names (dict[str, AlgebraNode]): The bound names
+        running (bool): False once :quit was entered
+    """
+
+    def __init__(self, simplifier: Simplifier | None = None, multi_letter_symbols: bool = False):
+        if simplifier is None:
+            simplifier = Simplifier(cache_size=DEFAULT_CACHE_SIZE)
+        self.simplifier = simplifier
+        self.multi_letter_symbols = multi_letter_symbols
+        self.history: list[AlgebraNode] = []
+        self.names: dict[str, AlgebraNode] = {}
+        self.running = True
+
+    def bindings(self) -> dict[str, AlgebraNode]:
+        bindings = {f"%{number}": result for number, result in enumerate(self.history, 1)}
+        bindings.update(self.names)
+        return bindings
+
+    def simplify(self, source: str, collect_metrics: bool = False) -> PipelineResult:
+        """Runs the pipeline on source with the session's results and names substituted"""
+        for match in _REFERENCE_RE.finditer(source):
+            number = int(match.group(1))
+            if not 1 <= number <= len(self.history):
+                raise ReplError(f"there is no result %{number}")
+        return run_pipeline(
+            source,
+            self.simplifier,
+            bindings=self.bindings(),
+            multi_letter_symbols=self.multi_letter_symbols,
+            history_references=True,
+            collect_metrics=collect_metrics,
+            track_memory=False,
+        )
+
+    def _record(self, result: AlgebraNode) -> str:
+        self.history.append(result)
+        return f"%{len(self.history)} = {result!r}"
+
+    def _check_name(self, name: str) -> None:
+        tokens = Lexer(name, self.multi_letter_symbols).tokenize()
+        if len(tokens) != 2 or tokens[0].kind != TokenKind.SYMBOL:
+            raise ReplError(
+                f"{name} is not a single variable, only single letters can be bound"
+                " unless multi-letter symbols are enabled"
+            )
+
+    def execute(self, line: str) -> str | None:
+        """Runs one input line, returns what to print"""
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith(":"):
+            return self._command(line[1:])
+        assignment = _ASSIGNMENT_RE.fullmatch(line)
+        if assignment is not None:
+            name, source = assignment.groups()
+            self._check_name(name)
+            result = self.simplify(source).result
+            self.names[name] = result
+            return f"{name} = {self._record(result)}"
+        return self._record(self.simplify(line).result)
+
+    def _command(self, command: str) -> str | None:
+        name, _, argument = command.partition(" ")
+        argument = argument.strip()
+        match name:
+            case "time":
+                if not argument:
+                    raise ReplError(":time needs an expression")
+                result = self.simplify(argument, collect_metrics=True)
+                assert result.metrics is not None
+                return f"{self._record(result.result)}\n{format_metrics(result.metrics)}"
+            case "vars":
+                return "\n".join(f"{name} = {value!r}" for name, value in self.names.items())
+            case "unset":
+                if self.names.pop(argument, None) is None:
+                    raise ReplError(f"{argument} is not bound")
+                return None
+            case "help":
+                return HELP
+            case "quit" | "q" | "exit":
+                self.running = False
+                return None
+        raise ReplError(f"unknown command :{name}, see :help")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(description="Interactive CAS session")
+    arg_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="how many simplified subexpressions are memoized for the session, 0 to disable",
+    )
+    arg_parser.add_argument(
+        "--multi-letter",
+        action="store_true",
+        help="lex runs of letters as one variable, so that names can be longer than a letter",
+    )
+    return arg_parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    # logs go to stdout as well, so only warnings may interleave with the results
+    setup_logging(level=logging.WARNING)
+    try:
+        import readline  # noqa: F401  line editing and history for input(), where available
+    except ImportError:
+        pass
+    session = ReplSession(Simplifier(cache_size=args.cache_size or None), args.multi_letter)
+    interactive = sys.stdin.isatty()
+    while session.running:
+        try:
+            line = input(PROMPT if interactive else "")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+        try:
+            output = session.execute(line)
+        except KeyboardInterrupt:
+            # Ctrl-C stops a long simplification, the session with its history and caches stays
+            print("interrupted")
+            continue
+        except Exception as e:
+            # a bad input must not end the session
+            log.debug("input failed", exc_info=True)
+            print(f"error: {type(e).__name__}: {e}")
+            continue
+        if output:
+            print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Rewrite rules over algebra trees, and the engines that apply them.
+
+Rules are registered in a RuleSet with a pattern: a node shape like Pow(Num(1), ANY). The
+patterns are compiled into a discrimination tree, so finding the rules that match a node
+follows the node's shape through the tree instead of trying every rule in turn.
+
+rewrite_node applies the first matching rule to a node. rewrite_operands is a worklist engine for
+the operands of n-ary nodes (the terms of a Sum, the factors of a Prod): it looks at every operand
+once, and again only if a rule replaced it, so the work done is proportional to the rewrites that
+actually happen. A step budget guarantees that it terminates even if rules rewrite each other's
+results back and forth.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Generator, Iterable
+from dataclasses import dataclass
+from types import GeneratorType
+from typing import Any
+
+from algebra_nodes import AlgebraNode, Num, Var
+
+log = logging.getLogger(__name__)
+
+# rewrites per operand list before the engine gives up and keeps the remaining operands as they are
+DEFAULT_MAX_STEPS = 100_000
+
+
+class RewriteError(Exception):
+    pass
+
+
+class _Any:
+    def __repr__(self) -> str:
+        return "ANY"
+
+
+# matches any subtree
+ANY: Any = _Any()
+
+
+@dataclass(frozen=True, slots=True)
+class Pattern:
+    """
+    A node shape.
+    Attributes:
+        head (type[AlgebraNode]): The type of the node.
+        args (tuple | None): None matches any node of the type. Otherwise one entry per child,
+            each a Pattern or ANY, or for Num and Var the value / name, e.g. Pattern(Num, (1,))
+            matches Num(1) and Num(1.0).
+    """
+
+    head: type[AlgebraNode]
+    args: tuple | None = None
+
+    def keys(self) -> list:
+        """The pattern in pre-order, as the keys of the discrimination tree"""
+        keys: list = []
+        stack: list = [self]
+        while stack:
+            pattern = stack.pop()
+            if pattern is ANY:
+                keys.append(ANY)
+            elif pattern.args is None:
+                keys.append((pattern.head,))
+            elif pattern.head in (Num, Var):
+                (value,) = pattern.args
+                keys.append((pattern.head, value))
+            else:
+                keys.append((pattern.head, len(pattern.args)))
+                stack.extend(reversed(pattern.args))
+        return keys
+
+
+def literal(value: int | float) -> Pattern:
+    """A pattern matching the number value"""
+    return Pattern(Num, (value,))
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    """
+    A rewrite of the nodes matching a pattern.
+    Attributes:
+        name (str): For logging and error messages.
+        pattern (Pattern | type[AlgebraNode]): The rule is only tried on matching nodes, a type
+            matches every node of that type.
+        rewrite (Callable): Takes the matching node and returns what the engine running the
+            rule set expects (see rewrite_node and rewrite_operands), or None if the rule does not
+            apply after all. A generator function can yield subtrees to simplify, like a
+            simplification step.
+        simplify (bool): Whether rewrite_operands has to simplify the replacements before they
+            are looked at again. Rules that only take simplified operands apart do not need to.
+    """
+
+    name: str
+    pattern: Pattern | type[AlgebraNode]
+    rewrite: Callable
+    simplify: bool = False
+
+
+_RULES = None  # key of the rules that end at a discrimination tree node
+
+
+class RuleSet:
+    """
+    Rules in a discrimination tree: a trie over their patterns' keys in pre-order, in which ANY
+    skips a whole subtree. Matching rules are returned in the order they were added
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self._root: dict = {}
+        self._rules: list[Rule] = []
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: Rule) -> None:
+        if any(other.name == rule.name for other in self._rules):
+            raise RewriteError(f"a rule named {rule.name} is already registered")
+        pattern = rule.pattern
+        if not isinstance(pattern, Pattern):
+            pattern = Pattern(pattern)
+        trie = self._root
+        for key in pattern.keys():
+            trie = trie.setdefault(key, {})
+        trie.setdefault(_RULES, []).append((len(self._rules), rule))
+        self._rules.append(rule)
+
+    def register(
+        self, pattern: Pattern | type[AlgebraNode], *, simplify: bool = False
+    ) -> Callable[[Callable], Callable]:
+        """Decorator that adds a function as a rule named after it"""
+
+        def decorator(function: Callable) -> Callable:
+            self.add(Rule(function.__name__, pattern, function, simplify))
+            return function
+
+        return decorator
+
+    def rules_for(self, node: AlgebraNode) -> list[Rule]:
+        """Gets the rules whose pattern matches node"""
+        found: list[tuple[int, Rule]] = []
+        # (trie node, subtrees of node still to match in pre-order)
+        stack: list[tuple[dict, tuple[AlgebraNode, ...]]] = [(self._root, (node,))]
+        while stack:
+            trie, pending = stack.pop()
+            if not pending:
+                found.extend(trie.get(_RULES, ()))
+                continue
+            term = pending[0]
+            rest = pending[1:]
+            head = type(term)
+            if ANY in trie:
+                stack.append((trie[ANY], rest))
+            if (head,) in trie:
+                stack.append((trie[(head,)], rest))
+            if isinstance(term, Num):
+                exact = trie.get((Num, term.value))
+                if exact is not None:
+                    stack.append((exact, rest))
+            elif isinstance(term, Var):
+                exact = trie.get((Var, term.name))
+                if exact is not None:
+                    stack.append((exact, rest))
+            else:
+                children = term.children()
+                exact = trie.get((head, len(children)))
+                if exact is not None:
+                    stack.append((exact, children + rest))
+        if len(found) > 1:
+            found.sort(key=lambda entry: entry[0])
+        return [rule for _, rule in found]
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+
+def _apply(rule: Rule, node: AlgebraNode) -> Generator[AlgebraNode, AlgebraNode, Any]:
+    result = rule.rewrite(node)
+    if isinstance(result, GeneratorType):
+        result = yield from result
+    return result
+
+
+def rewrite_node(
+    node: AlgebraNode, rules: RuleSet
+) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    """
+    Rewrites node with the first matching rule that applies, a rule returns the replacement
+    node. Returns node itself if none applies. This is a simplification step (see simplify._Steps)
+    """
+    for rule in rules.rules_for(node):
+        result = yield from _apply(rule, node)
+        if result is not None:
+            log.debug("rule %s rewrote %s", rule.name, node)
+            return result
+    return node
+
+
+def rewrite_operands(
+    operands: Iterable[AlgebraNode], rules: RuleSet, max_steps: int = DEFAULT_MAX_STEPS
+) -> Generator[AlgebraNode, AlgebraNode, list[AlgebraNode]]:
+    """
+    Rewrites operands until no rule applies to any of them, keeping their order: a rule returns
+    the replacement operands, which take the operand's place. This is a simplification step (see
+    simplify._Steps): it yields the nodes to simplify and is sent the results.
+    Returns the rewritten operands
+    """
+    done: list[AlgebraNode] = []
+    pending = list(operands)
+    pending.reverse()  # popped from the end, so the first operand comes first
+    steps = 0
+    while pending:
+        operand = pending.pop()
+        for rule in rules.rules_for(operand):
+            replacements = yield from _apply(rule, operand)
+            if replacements is None:
+                continue
+            steps += 1
+            if steps > max_steps:
+                log.warning(f"stopped rewriting after {max_steps} steps, at the rule {rule.name}")
+                done.append(operand)
+                pending.reverse()
+                done.extend(pending)
+                return done
+            if rule.simplify:
+                simplified = []
+                for replacement in replacements:
+                    simplified.append((yield replacement))
+                replacements = tuple(simplified)
+            pending.extend(reversed(replacements))
+            break
+        else:
+            done.append(operand)
+    return done
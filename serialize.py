@@ -0,0 +1,265 @@
+"""
+Canonical serialization of algebra trees into a compact binary format, used as the key and value
+of the persistent cache (see disk_cache.py) and to pickle trees.
+
+The binary form is a header, a constant pool with every distinct number, a symbol table with every
+distinct variable name, and the nodes as post-order opcodes that refer to both. A subtree that
+occurs more than once is only encoded the first time, after that it is a back-reference. Counts
+and indices are unsigned LEB128 varints, ints are zigzag varints of any size, floats and the parts
+of complex numbers are little-endian doubles:
+    header          b"CAS" and the format version
+    constant pool   count, then per constant a tag (_INT, _FLOAT, _COMPLEX) and the value
+    symbol table    count, then per name the length of its UTF-8 encoding and the encoding
+    code            count of opcodes, then the opcodes with their operands
+"""
+
+from __future__ import annotations
+
+import logging
+import struct
+
+from algebra_nodes import AlgebraNode, Num, Var, Neg, Inv, Sum, Prod, Pow, number_key
+
+log = logging.getLogger(__name__)
+
+
+class SerializeError(Exception):
+    pass
+
+
+def _pop(stack: list[AlgebraNode], count: int, position: int) -> tuple[AlgebraNode, ...]:
+    if count > len(stack):
+        raise SerializeError(f"the node at the position {position} has missing operands")
+    if count == 0:
+        return ()
+    operands = tuple(stack[-count:])
+    del stack[-count:]
+    return operands
+
+
+_MAGIC = b"CAS"
+_FORMAT_VERSION = 1
+
+# constant tags
+_INT = 0
+_FLOAT = 1
+_COMPLEX = 2
+
+# opcodes, each followed by its varint operand if it has one
+_CONST = 0  # constant pool index
+_VAR = 1  # symbol table index
+_SUM = 2  # number of terms
+_PROD = 3  # number of factors
+_NEG = 4
+_INV = 5
+_POW = 6
+_REF = 7  # index of an earlier compound node, in the order they were built
+
+_DOUBLE = struct.Struct("<d")
+_COMPLEX_DOUBLES = struct.Struct("<dd")
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_constant(out: bytearray, value: int | float | complex) -> None:
+    if type(value) is int:
+        out.append(_INT)
+        # zigzag, so small negative ints stay short: 0, -1, 1, -2 ... -> 0, 1, 2, 3 ...
+        _write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif type(value) is float:
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif type(value) is complex:
+        out.append(_COMPLEX)
+        out += _COMPLEX_DOUBLES.pack(value.real, value.imag)
+    else:
+        raise SerializeError(f"Num values of the type {type(value).__name__} cannot be serialized")
+
+
+def to_bytes(node: AlgebraNode) -> bytes:
+    """Serializes node into the binary form"""
+    constants: dict[tuple, int] = {}  # by number_key, the value is its second element
+    symbols: dict[str, int] = {}
+    built: dict[AlgebraNode, int] = {}  # compound nodes, by the order they are built in
+    code = bytearray()
+    opcodes = 0
+    stack: list[tuple[AlgebraNode, bool]] = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        opcodes += 1
+        match current:
+            case Num(value):
+                index = constants.setdefault(number_key(value), len(constants))
+                code.append(_CONST)
+                _write_varint(code, index)
+                continue
+            case Var(name):
+                code.append(_VAR)
+                _write_varint(code, symbols.setdefault(name, len(symbols)))
+                continue
+        if not children_done:
+            index = built.get(current)
+            if index is not None:
+                code.append(_REF)
+                _write_varint(code, index)
+                continue
+            opcodes -= 1  # counted when its opcode is written
+            stack.append((current, True))
+            stack.extend((child, False) for child in reversed(current.children()))
+            continue
+        built[current] = len(built)
+        match current:
+            case Sum(terms):
+                code.append(_SUM)
+                _write_varint(code, len(terms))
+            case Prod(factors):
+                code.append(_PROD)
+                _write_varint(code, len(factors))
+            case Neg():
+                code.append(_NEG)
+            case Inv():
+                code.append(_INV)
+            case Pow():
+                code.append(_POW)
+            case _:
+                raise SerializeError(f"Node type {type(current)} not recognized")
+
+    out = bytearray(_MAGIC)
+    out.append(_FORMAT_VERSION)
+    _write_varint(out, len(constants))
+    for _, value, *_ in constants:
+        _write_constant(out, value)
+    _write_varint(out, len(symbols))
+    for name in symbols:
+        encoded = name.encode("utf-8")
+        _write_varint(out, len(encoded))
+        out += encoded
+    _write_varint(out, opcodes)
+    out += code
+    return bytes(out)
+
+
+class _Reader:
+    """Reads the binary form from a memoryview, without copying it"""
+
+    def __init__(self, data: bytes | bytearray | memoryview):
+        self.view = memoryview(data).cast("B")
+        self.pos = 0
+
+    def byte(self) -> int:
+        if self.pos >= len(self.view):
+            raise SerializeError("the data ends too early")
+        value = self.view[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def take(self, length: int) -> memoryview:
+        end = self.pos + length
+        if end > len(self.view):
+            raise SerializeError("the data ends too early")
+        chunk = self.view[self.pos : end]
+        self.pos = end
+        return chunk
+
+    def constant(self) -> int | float | complex:
+        tag = self.byte()
+        if tag == _INT:
+            zigzag = self.varint()
+            return zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(self.take(_DOUBLE.size))[0]
+        if tag == _COMPLEX:
+            real, imag = _COMPLEX_DOUBLES.unpack(self.take(_COMPLEX_DOUBLES.size))
+            return complex(real, imag)
+        raise SerializeError(f"unknown constant tag {tag} at the position {self.pos - 1}")
+
+
+def from_bytes(data: bytes | bytearray | memoryview) -> AlgebraNode:
+    """Rebuilds the tree from its binary form (see to_bytes), reading data in place"""
+    reader = _Reader(data)
+    if bytes(reader.take(len(_MAGIC))) != _MAGIC:
+        raise SerializeError("the data is not a serialized algebra tree")
+    version = reader.byte()
+    if version != _FORMAT_VERSION:
+        raise SerializeError(f"unsupported format version {version}")
+    constants = [Num(reader.constant()) for _ in range(reader.varint())]
+    symbols = []
+    for _ in range(reader.varint()):
+        encoded = reader.take(reader.varint())
+        try:
+            symbols.append(Var(str(encoded, "utf-8")))
+        except UnicodeDecodeError as e:
+            raise SerializeError(f"a variable name is not valid UTF-8: {e}") from None
+
+    stack: list[AlgebraNode] = []
+    built: list[AlgebraNode] = []
+    count = reader.varint()
+    # the hot loop reads the view directly instead of through the reader's methods
+    view = reader.view
+    pos = reader.pos
+    try:
+        for _ in range(count):
+            position = pos
+            opcode = view[pos]
+            pos += 1
+            if opcode < _NEG or opcode == _REF:
+                operand = view[pos]
+                pos += 1
+                if operand >= 0x80:
+                    operand &= 0x7F
+                    shift = 7
+                    while True:
+                        byte = view[pos]
+                        pos += 1
+                        operand |= (byte & 0x7F) << shift
+                        if byte < 0x80:
+                            break
+                        shift += 7
+                if opcode == _CONST:
+                    stack.append(constants[operand])
+                    continue
+                if opcode == _VAR:
+                    stack.append(symbols[operand])
+                    continue
+                if opcode == _REF:
+                    stack.append(built[operand])
+                    continue
+                if opcode == _SUM:
+                    node: AlgebraNode = Sum(_pop(stack, operand, position))
+                else:
+                    node = Prod(_pop(stack, operand, position))
+            elif opcode == _POW:
+                node = Pow(*_pop(stack, 2, position))
+            elif opcode == _NEG:
+                node = Neg(*_pop(stack, 1, position))
+            elif opcode == _INV:
+                node = Inv(*_pop(stack, 1, position))
+            else:
+                raise SerializeError(f"unknown opcode {opcode} at the position {position}")
+            built.append(node)
+            stack.append(node)
+    except IndexError:
+        raise SerializeError(
+            f"the data is cut off or out of range at the position {position}"
+        ) from None
+    reader.pos = pos
+    if reader.pos != len(reader.view):
+        raise SerializeError(f"{len(reader.view) - reader.pos} bytes left after the tree")
+    if len(stack) != 1:
+        raise SerializeError(f"the data holds {len(stack)} trees instead of one")
+    return stack[0]
@@ -0,0 +1,269 @@
+"""
+A long-lived simplification server speaking JSON lines over a Unix socket or TCP on localhost.
+
+Every request is one line holding a JSON object:
+    {"id": 1, "op": "simplify", "expr": "x + x"}
+and gets exactly one response line with the same id, in completion order:
+    {"id": 1, "ok": true, "result": "2x"}
+    {"id": 2, "ok": false, "error": "LexerError: ..."}
+Supported ops are "simplify" and "eval" (the numeric value of an expression without variables).
+A complex value is sent as {"re": ..., "im": ...}.
+The pipeline runs in a pool of warm worker processes, whose simplifier caches persist across requests.
+
+Run it with:
+    python server.py --unix /tmp/cas.sock
+    python server.py --port 8765
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import Executor, Future
+
+from algebra_nodes import Num
+from logging_setup import setup_logging
+from parallel import DEFAULT_CACHE_SIZE, make_pool, worker_simplifier
+from pipeline import run_pipeline
+
+log = logging.getLogger(__name__)
+
+OPS = ("simplify", "eval")
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_PENDING = 256
+# long machine generated expressions do not fit asyncio's default 64 KiB line limit
+DEFAULT_MAX_LINE = 16 * 1024 * 1024
+
+
+class ServerError(Exception):
+    pass
+
+
+def run_op(op: str, source: str) -> str | int | float:
+    """Runs one request in a worker process, using that worker's warm simplifier"""
+    result = run_pipeline(source, worker_simplifier()).result
+    if op == "simplify":
+        return repr(result)
+    if not isinstance(result, Num):
+        raise ServerError(f"{source!r} does not evaluate to a number, it simplifies to {result!r}")
+    return result.value
+
+
+class SimplificationServer:
+    """
+    Dispatches JSON-lines requests to a worker pool.
+    Args:
+        workers (int | None): Worker processes, defaults to the number of CPUs
+        cache_size (int | None): Memoization cache size of each worker's Simplifier
+        timeout (float | None): Seconds a request may take before an error is sent back.
+            The worker keeps computing the abandoned request, and it keeps its place among the
+            max_pending requests in the pool until it finishes
+        max_pending (int): Requests accepted but not yet answered, over all connections, and
+            requests in the pool, answered or not. When either is reached, the server stops
+            reading from its sockets until a request completes
+        max_line (int): The longest accepted request line, in bytes
+        executor (Executor | None): A pool to use instead of creating one, it is not shut down by close()
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int | None = None,
+        cache_size: int | None = DEFAULT_CACHE_SIZE,
+        timeout: float | None = DEFAULT_TIMEOUT,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_line: int = DEFAULT_MAX_LINE,
+        executor: Executor | None = None,
+    ):
+        self.timeout = timeout
+        self.max_line = max_line
+        self._own_executor = executor is None
+        self._executor = make_pool(workers, cache_size) if executor is None else executor
+        self._slots = asyncio.Semaphore(max_pending)
+        # held from submitting a request to the pool until the pool is done with it, which can be
+        # after its response, since a timed out request keeps running
+        self._pool_slots = asyncio.Semaphore(max_pending)
+        self._servers: list[asyncio.AbstractServer] = []
+        self._connections: set[asyncio.Task] = set()
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=self.max_line
+        )
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        server = await asyncio.start_unix_server(
+            self.handle_connection, path, limit=self.max_line
+        )
+        self._servers.append(server)
+        return server
+
+    async def close(self) -> None:
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        for connection in list(self._connections):
+            connection.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._own_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = asyncio.current_task()
+        assert connection is not None
+        self._connections.add(connection)
+        write_lock = asyncio.Lock()
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                # waiting for a free slot before reading is what pushes back on the clients
+                await self._slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    self._slots.release()
+                    await self._respond(writer, write_lock, error_response(None, "request line too long"))
+                    break
+                if not line:
+                    self._slots.release()
+                    break
+                task = asyncio.create_task(self._serve_line(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            log.debug("client disconnected", exc_info=True)
+        except asyncio.CancelledError:
+            # the server is closing. Returning instead of re-raising, because asyncio's stream
+            # server logs a traceback for every cancelled connection handler
+            log.debug("connection cancelled")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self._connections.discard(connection)
+
+    async def _serve_line(
+        self, line: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock
+    ) -> None:
+        try:
+            response = await self.handle_request(line)
+            await self._respond(writer, write_lock, response)
+        finally:
+            self._slots.release()
+
+    async def handle_request(self, line: bytes) -> dict:
+        """Returns the response for one raw request line"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return error_response(None, f"invalid JSON: {e}")
+        if not isinstance(request, dict):
+            return error_response(None, "a request has to be a JSON object")
+        request_id = request.get("id")
+        op = request.get("op", "simplify")
+        source = request.get("expr")
+        if op not in OPS:
+            return error_response(request_id, f"unknown op {op!r}, expected one of {OPS}")
+        if not isinstance(source, str):
+            return error_response(request_id, "expr has to be a string")
+
+        try:
+            result = await asyncio.wait_for(self._run(op, source), self.timeout)
+        except asyncio.TimeoutError:
+            return error_response(request_id, f"timed out after {self.timeout}s")
+        except Exception as e:
+            return error_response(request_id, f"{type(e).__name__}: {e}")
+        if isinstance(result, complex):
+            return {"id": request_id, "ok": True, "result": {"re": result.real, "im": result.imag}}
+        return {"id": request_id, "ok": True, "result": result}
+
+    async def _run(self, op: str, source: str) -> str | int | float:
+        await self._pool_slots.acquire()
+        try:
+            future = self._executor.submit(run_op, op, source)
+        except BaseException:
+            self._pool_slots.release()
+            raise
+        loop = asyncio.get_running_loop()
+
+        def release(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._pool_slots.release)
+            except RuntimeError:
+                pass  # the loop is closed, nobody waits for the slot anymore
+
+        future.add_done_callback(release)
+        # cancelling this (on a timeout) cancels the pool's future only if it has not started yet
+        return await asyncio.wrap_future(future)
+
+    async def _respond(
+        self, writer: asyncio.StreamWriter, write_lock: asyncio.Lock, response: dict
+    ) -> None:
+        try:
+            line = json.dumps(response)
+        except (TypeError, ValueError) as e:
+            # every request gets its line, even if its result cannot be encoded
+            line = json.dumps(
+                error_response(response.get("id"), f"the response cannot be encoded: {e}"),
+                default=repr,
+            )
+        async with write_lock:
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+
+
+def error_response(request_id: object, message: str) -> dict:
+    return {"id": request_id, "ok": False, "error": message}
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = SimplificationServer(
+        workers=args.workers,
+        cache_size=args.cache_size or None,
+        timeout=args.timeout or None,
+        max_pending=args.max_pending,
+    )
+    try:
+        if args.unix:
+            listener = await server.start_unix(args.unix)
+        else:
+            listener = await server.start_tcp(args.host, args.port)
+        for sock in listener.sockets:
+            log.info(f"listening on {sock.getsockname()}")
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Serves simplification requests as JSON lines")
+    where = arg_parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--unix", metavar="PATH", help="listen on this Unix socket")
+    where.add_argument("--port", type=int, help="listen on this TCP port")
+    arg_parser.add_argument("--host", default="127.0.0.1", help="TCP address, localhost by default")
+    arg_parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    arg_parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per request, 0 for none"
+    )
+    arg_parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING)
+    args = arg_parser.parse_args()
+
+    setup_logging(level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 from algebra_nodes import AlgebraNode, Num, Var, Neg, Inv, Sum, Prod, Pow
+from cache import CacheInfo, LRUCache
+from expand import DEFAULT_MAX_TERMS, ExpansionError
+from polynomial import Polynomial
+from rewrite import ANY, Pattern, RuleSet, literal, rewrite_node, rewrite_operands
+import hashlib
 import logging
-from collections.abc import Iterable
+from collections.abc import Generator, Iterable
 import math
-import itertools
 from typing import reveal_type
 
 
@@ -13,57 +17,218 @@ class SimplifierError(Exception):
     pass
 
 
+def _is_num(node: AlgebraNode, value: int | float) -> bool:
+    """Checks whether node is the literal value. Nodes are interned and compare by identity, so Num(1.0) is not Num(1)"""
+    return isinstance(node, Num) and node.value == value
+
+
+_MISSING = object()
+
+# Bump whenever a change to the simplification logic changes results, so that results persisted
+# by an older version (see disk_cache.py) are not reused
+RULES_VERSION = 2
+
+# Rules that bring the terms of a Sum into the forms _simplify_sum combines
+SUM_TERM_RULES = RuleSet()
+
+
+@SUM_TERM_RULES.register(Neg, simplify=True)
+def negated_term(term: Neg) -> tuple[AlgebraNode, ...]:
+    return (Prod((Num(-1), term.expr)),)
+
+
+@SUM_TERM_RULES.register(Inv, simplify=True)
+def inverted_term(term: Inv) -> tuple[AlgebraNode, ...]:
+    return (Pow(term.expr, Num(-1)),)
+
+
+@SUM_TERM_RULES.register(Sum)
+def nested_sum(term: Sum) -> tuple[AlgebraNode, ...]:
+    return term.terms
+
+
+# Rules that flatten the factors of a Prod for _simplify_prod
+PROD_FACTOR_RULES = RuleSet()
+
+
+@PROD_FACTOR_RULES.register(Neg)
+def negated_factor(factor: Neg) -> tuple[AlgebraNode, ...]:
+    return (factor.expr, Num(-1))
+
+
+@PROD_FACTOR_RULES.register(Prod)
+def nested_prod(factor: Prod) -> tuple[AlgebraNode, ...]:
+    return factor.factors
+
+
+# Rules for the other nodes, the first one that applies wins. Pow nodes have their base and
+# exponent simplified before the rules are tried, Neg and Inv nodes do not
+NODE_RULES = RuleSet()
+
+
+@NODE_RULES.register(Pattern(Pow, (literal(1), ANY)))
+def power_of_one(node: Pow) -> AlgebraNode:
+    return Num(1)
+
+
+@NODE_RULES.register(Pattern(Pow, (ANY, literal(0))))
+def zeroth_power(node: Pow) -> AlgebraNode:
+    return Num(1)
+
+
+@NODE_RULES.register(Pattern(Pow, (literal(0), ANY)))
+def power_of_zero(node: Pow) -> AlgebraNode:
+    return Num(0)
+
+
+@NODE_RULES.register(Pattern(Pow, (ANY, literal(1))))
+def first_power(node: Pow) -> AlgebraNode:
+    return node.base
+
+
+@NODE_RULES.register(Pattern(Pow, (Pattern(Pow), ANY)))
+def power_of_power(node: Pow) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    return Pow(node.base.base, (yield Prod((node.exp, node.base.exp))))
+
+
+@NODE_RULES.register(Pattern(Pow, (Pattern(Prod), ANY)))
+def power_of_product(node: Pow) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    powers = []
+    for factor in node.base.factors:
+        powers.append((yield Pow(factor, node.exp)))
+    out = Prod(tuple(powers))
+    log.debug("%s", out)
+    return out
+
+
+@NODE_RULES.register(Pattern(Neg, (Pattern(Neg),)))
+def double_negation(node: Neg) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    return (yield node.expr.expr)
+
+
+@NODE_RULES.register(Pattern(Inv, (Pattern(Inv),)))
+def double_inversion(node: Inv) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    return (yield node.expr.expr)
+
+
+@NODE_RULES.register(Inv)
+def inverse_as_power(node: Inv) -> Generator[AlgebraNode, AlgebraNode, AlgebraNode]:
+    return (yield Pow(node.expr, Num(-1)))
+
+
+# A simplification step. It yields the subtrees it needs simplified and is sent their results,
+# so the recursion of the rules runs on an explicit stack (see Simplifier.simplify)
+_Steps = Generator[AlgebraNode, AlgebraNode, AlgebraNode]
+
+
 class Simplifier:
-    def _is_numerical(self, tree: AlgebraNode):
-        is_numerical = True
-        for node in tree.walk():
-            if isinstance(node, Var):
-                is_numerical = False
-        return is_numerical
+    """
+    Simplifies algebra trees.
+    Args:
+        cache_size (int | None): Opt-in memoization of simplify(), keyed by the input node.
+            At most cache_size results are kept, the least recently used are evicted first.
+            The polynomials of expanded subtrees are kept in a second cache of the same size.
+            None (the default) disables both caches.
+        max_terms (int | None): Products and powers whose expansion would have more terms than
+            this are left factored, and so are powers whose coefficients could grow past
+            expand.MAX_COEFFICIENT_BITS. None expands everything.
+    """
+
+    def __init__(self, cache_size: int | None = None, max_terms: int | None = DEFAULT_MAX_TERMS):
+        self._cache = LRUCache(cache_size) if cache_size is not None else None
+        self._polynomial_cache = LRUCache(cache_size) if cache_size is not None else None
+        self.max_terms = max_terms
+
+    def cache_info(self) -> CacheInfo | None:
+        """Returns hit / miss statistics of the memoization cache, None if it is disabled"""
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def polynomial_cache_info(self) -> CacheInfo | None:
+        """Returns hit / miss statistics of the cache of expanded subtrees, None if it is disabled"""
+        if self._polynomial_cache is None:
+            return None
+        return self._polynomial_cache.info()
+
+    def cache_clear(self) -> None:
+        if self._cache is not None:
+            self._cache.clear()
+        if self._polynomial_cache is not None:
+            self._polynomial_cache.clear()
+
+    @property
+    def version(self) -> str:
+        """
+        Identifies what this simplifier computes: the rules version, the registered rules and
+        the settings that change results
+        """
+        rules = ",".join(
+            rule.name for rules in (SUM_TERM_RULES, PROD_FACTOR_RULES, NODE_RULES) for rule in rules
+        )
+        digest = hashlib.sha256(f"{rules}:{self.max_terms}".encode()).hexdigest()
+        return f"{RULES_VERSION}-{digest[:16]}"
+
+    def _is_numerical(self, tree: AlgebraNode) -> bool:
+        return tree.is_numeric
 
     def simplify(self, node: AlgebraNode) -> AlgebraNode:
+        """
+        Simplifies node. The rules are generators (see _Steps), run by this loop with an explicit
+        stack of the unfinished ones, so deep trees never hit the recursion limit
+        """
+        cache = self._cache
+        # nodes are interned and frozen, so they are cheap and safe keys
+        if cache is not None:
+            result = cache.get(node, _MISSING)
+            if result is not _MISSING:
+                return result
+        stack: list[tuple[AlgebraNode, _Steps]] = [(node, self._simplify(node))]
+        sent: AlgebraNode | None = None
+        while True:
+            current, steps = stack[-1]
+            try:
+                child = steps.send(sent)  # type: ignore[arg-type]
+            except StopIteration as done:
+                stack.pop()
+                sent = done.value
+                if cache is not None:
+                    cache.put(current, sent)
+                if not stack:
+                    return sent  # type: ignore[return-value]
+                continue
+            if isinstance(child, (Num, Var)):
+                sent = child
+                continue
+            if cache is not None:
+                sent = cache.get(child, _MISSING)
+                if sent is not _MISSING:
+                    continue
+            stack.append((child, self._simplify(child)))
+            sent = None
 
+    def _simplify(self, node: AlgebraNode) -> _Steps:
         if self._is_numerical(node):
             return self.eval(node)
 
+        if node.is_polynomial and isinstance(node, (Sum, Prod, Pow)):
+            # like terms and factors are merged in the polynomial's dict, in a single pass
+            try:
+                return Polynomial.from_node(node, self.max_terms, self._polynomial_cache).to_node()
+            except ExpansionError as e:
+                log.debug("not expanding %d nodes: %s", node.size, e)
+                return (yield from self._simplify_unexpanded(node))
+
         match node:
             case Sum():
-                return self._simplify_sum(node)
+                return (yield from self._simplify_sum(node))
             case Prod():
-                return self._simplify_prod(node)
+                return (yield from self._simplify_prod(node))
             case Pow(base, exp):
-                simplified_pow = Pow(self.simplify(base), self.simplify(exp))
-                if simplified_pow.base == Num(1) or simplified_pow.exp == Num(0):
-                    return Num(1)
-                if simplified_pow.base == Num(0):
-                    return Num(0)
-                if simplified_pow.exp == Num(1):
-                    return simplified_pow.base
-                if isinstance(simplified_pow.base, Pow):
-                    return Pow(
-                        simplified_pow.base.base,
-                        self.simplify(
-                            Prod((simplified_pow.exp, simplified_pow.base.exp))
-                        ),
-                    )
-                if isinstance(simplified_pow.base, Prod):
-                    out = Prod(
-                        tuple(
-                            self.simplify(Pow(factor, exp))
-                            for factor in simplified_pow.base.factors
-                        )
-                    )
-                    log.debug(out)
-                    return out
-                return simplified_pow
-            case Neg(expr):
-                if isinstance(expr, Neg):
-                    return self.simplify(expr.expr)
-                return node
-            case Inv(expr):
-                if isinstance(expr, Inv):
-                    return self.simplify(expr.expr)
-                return self.simplify(Pow(expr, Num(-1)))
+                simplified_pow = Pow((yield base), (yield exp))
+                return (yield from rewrite_node(simplified_pow, NODE_RULES))
+            case Neg() | Inv():
+                return (yield from rewrite_node(node, NODE_RULES))
             case Num():
                 return node
             case Var():
@@ -71,6 +236,32 @@ class Simplifier:
 
         raise SimplifierError(f"Node type {type(node)} not recognized")
 
+    def _simplify_unexpanded(self, node: Sum | Prod | Pow) -> _Steps:
+        match node:
+            case Sum():
+                # the terms that can be expanded are, and like terms are still combined
+                return (yield from self._simplify_sum(node))
+            case Prod(factors):
+                # the numbers are multiplied into one leading factor, the rest is kept as it is
+                number_factor: int | float | complex = 1
+                kept: list[AlgebraNode] = []
+                for factor in factors:
+                    simplified = yield factor
+                    parts = simplified.factors if isinstance(simplified, Prod) else (simplified,)
+                    for part in parts:
+                        if isinstance(part, Num):
+                            number_factor *= part.value
+                        else:
+                            kept.append(part)
+                if number_factor == 0:
+                    return Num(0)
+                if number_factor != 1 or not kept:
+                    kept.insert(0, Num(number_factor))
+                return kept[0] if len(kept) == 1 else Prod(tuple(kept))
+            case Pow(base, exp):
+                return Pow((yield base), exp)
+        raise SimplifierError(f"Node type {type(node)} not recognized")
+
     def _get_vars(self, node: Prod) -> tuple[AlgebraNode, ...]:
         vars = []
         for factor in node.factors:
@@ -85,38 +276,20 @@ class Simplifier:
                 coeffs.append(self.eval(factor))
         return tuple(coeffs)
 
-    def _simplify_terms(self, terms: Iterable) -> tuple:
+    def _simplify_terms(self, terms: Iterable) -> Generator[AlgebraNode, AlgebraNode, tuple]:
         reformed_terms = []  # contains terms after each of them has been simplified enough
-        simplified = False
         for term in terms:
-            reformed_terms.append(self.simplify(term))
-        while not simplified:
-            log.debug(reformed_terms)
-            reformed_terms_buf = []
-            simplified = True
-            for term in reformed_terms:
-                match term:
-                    case Neg(expr):
-                        reformed_terms_buf.append(self.simplify(Prod((Num(-1), expr))))
-                        simplified = False
-                    case Inv(expr):
-                        reformed_terms_buf.append(self.simplify(Pow(expr, Num(-1))))
-                        simplified = False
-                    case Sum(terms):
-                        reformed_terms_buf.remove(term)
-                        reformed_terms_buf.extend(terms)
-                        simplified = False
-                    case _:
-                        reformed_terms_buf.append(term)
-            reformed_terms = reformed_terms_buf
+            reformed_terms.append((yield term))
+        reformed_terms = yield from rewrite_operands(reformed_terms, SUM_TERM_RULES)
+        log.debug("rewritten terms: %s", reformed_terms)
         return tuple(reformed_terms)
 
-    def _simplify_sum(self, node: Sum) -> AlgebraNode:
-        log.debug(f"simplifying sum: {node}")
-        reformed_terms = self._simplify_terms(
+    def _simplify_sum(self, node: Sum) -> _Steps:
+        log.debug("simplifying sum: %s", node)
+        reformed_terms = yield from self._simplify_terms(
             node.terms
         )  # contains factors after each of them has been simplified enough
-        log.debug(f"simplified terms: {reformed_terms}")
+        log.debug("simplified terms: %s", reformed_terms)
         # Now every numerical term is simplified
         numerical_term: int | float = 0
         term_coeff_dict: dict[
@@ -145,10 +318,10 @@ class Simplifier:
                         f"Unexpected Behaviour: {type(node)} inside a Sum"
                     )
 
-        non_numerical_tuple = tuple(
-            self.simplify(Prod((Num(coefficient), *term)))
-            for term, coefficient in term_coeff_dict.items()
-        )
+        non_numerical_terms = []
+        for term, coefficient in term_coeff_dict.items():
+            non_numerical_terms.append((yield Prod((Num(coefficient), *term))))
+        non_numerical_tuple = tuple(non_numerical_terms)
         if numerical_term == 0:
             out_terms = non_numerical_tuple
         else:
@@ -160,30 +333,14 @@ class Simplifier:
 
         return Sum(out_terms)
 
-    def _simplify_prod(self, node: Prod) -> AlgebraNode:
+    def _simplify_prod(self, node: Prod) -> _Steps:
         # flattening the factors, by reducing Inv, Neg and Prod
         # log.debug("started simplifying factors")
-        reformed_factors = [
-            self.simplify(factor) for factor in node.factors
-        ]  # contains factors after each of them has been simplified enough
-        simplified = False
-        while not simplified:
-            # cycle over nested factors
-            simplified = True
-            reformed_factors_buf = []
-            for factor in reformed_factors:
-                match factor:
-                    case Neg(expr):
-                        reformed_factors_buf.append(expr)
-                        reformed_factors_buf.append(Num(-1))
-                        simplified = False
-                    case Prod(factors):
-                        reformed_factors_buf.extend(factors)
-                        simplified = False
-                    case _:
-                        reformed_factors_buf.append(factor)
-            reformed_factors = reformed_factors_buf
-        log.debug(f"finished simplifying factors: {reformed_factors}")
+        reformed_factors = []  # contains factors after each of them has been simplified enough
+        for factor in node.factors:
+            reformed_factors.append((yield factor))
+        reformed_factors = yield from rewrite_operands(reformed_factors, PROD_FACTOR_RULES)
+        log.debug("finished simplifying factors: %s", reformed_factors)
         number_factor: int | float = 1
         vars_factor_dict: dict[
             str, tuple[AlgebraNode, ...]
@@ -191,7 +348,7 @@ class Simplifier:
         distributive_terms = []
         # combining like terms
         for factor in reformed_factors:
-            log.debug(f"processing term: {factor}")
+            log.debug("processing term: %s", factor)
             match factor:
                 case Num(value):
                     number_factor *= value
@@ -225,14 +382,14 @@ class Simplifier:
                     )
         alg_vars_factor_dict: dict[str, AlgebraNode] = {}
         for key, exp in vars_factor_dict.items():  # type: ignore
-            alg_vars_factor_dict[key] = self.simplify(Sum(exp))  # type: ignore
+            alg_vars_factor_dict[key] = yield Sum(exp)  # type: ignore
         vars_factor_dict = dict(sorted(vars_factor_dict.items()))
 
-        non_numerical_factor_tuple = tuple(
-            self.simplify(Pow(Var(var_name), exp))
-            for var_name, exp in alg_vars_factor_dict.items()
-            if exp != Num(0)
-        )
+        non_numerical_factors = []
+        for var_name, exp in alg_vars_factor_dict.items():
+            if not _is_num(exp, 0):
+                non_numerical_factors.append((yield Pow(Var(var_name), exp)))
+        non_numerical_factor_tuple = tuple(non_numerical_factors)
         # Multiplication by 0 check inside iterators
         if number_factor == 1 and len(non_numerical_factor_tuple) > 0:
             factors = non_numerical_factor_tuple
@@ -245,36 +402,70 @@ class Simplifier:
             out = Prod(factors)
 
         if len(distributive_terms) > 0:
-            distributed_terms = itertools.product(*distributive_terms)
-            return Sum(
-                tuple(self.simplify(Prod((out, *term))) for term in distributed_terms)
-            )
+            return (yield from self._distribute(out, distributive_terms))
 
         return out
 
+    def _distribute(
+        self, out: AlgebraNode, distributive_terms: list[tuple[AlgebraNode, ...]]
+    ) -> _Steps:
+        """
+        Multiplies out by the sums whose terms are given, one sum at a time.
+        Equal products are merged after every step, so the partial expansion stays as small as
+        possible instead of growing to the full cross product of the sums
+        """
+        expanded: dict[AlgebraNode, int] = {out: 1}
+        for terms in distributive_terms:
+            step: dict[AlgebraNode, int] = {}
+            for product, count in expanded.items():
+                for term in terms:
+                    new_product = yield Prod((product, term))
+                    step[new_product] = step.get(new_product, 0) + count
+            expanded = step
+        out_terms = []
+        for product, count in expanded.items():
+            out_terms.append(product if count == 1 else (yield Prod((Num(count), product))))
+        return Sum(tuple(out_terms))
+
     def eval(self, node) -> Num:
         if not self._is_numerical(node):
             print(
                 "Can't Evaluate a expression that contains variables. Evaluation is for purely numerical expressions"
             )
             raise SimplifierError("cant evaluate a expr containing variables")
-        match node:
-            case Pow(base=b, exp=e):
-                return Num(self.eval(b).value ** self.eval(e).value)
-            case Sum(terms=t):
-                ret: int | float = 0
-                for term in t:
-                    ret += self.eval(term).value
-                return Num(ret)
-            case Prod(factors=f):
-                ret = 1
-                for factor in f:
-                    ret *= self.eval(factor).value
-                return Num(ret)
-            case Neg(expr=e):
-                return Num(-1 * self.eval(e).value)
-            case Inv(expr=e):
-                return Num(1 / self.eval(e).value)
-            case Num(value=v):
-                return node
-        raise Exception(f"Node type {type(node)} not recognized")
+        if isinstance(node, Num):
+            return node
+        values: dict[AlgebraNode, int | float] = {}
+        # post-order with an explicit stack, shared subtrees are evaluated once
+        stack: list[tuple[AlgebraNode, bool]] = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current in values:
+                continue
+            if isinstance(current, Num):
+                values[current] = current.value
+                continue
+            if not children_done:
+                stack.append((current, True))
+                stack.extend((child, False) for child in current.children())
+                continue
+            match current:
+                case Pow(base=b, exp=e):
+                    values[current] = values[b] ** values[e]
+                case Sum(terms=t):
+                    ret: int | float = 0
+                    for term in t:
+                        ret += values[term]
+                    values[current] = ret
+                case Prod(factors=f):
+                    ret = 1
+                    for factor in f:
+                        ret *= values[factor]
+                    values[current] = ret
+                case Neg(expr=e):
+                    values[current] = -1 * values[e]
+                case Inv(expr=e):
+                    values[current] = 1 / values[e]
+                case _:
+                    raise Exception(f"Node type {type(current)} not recognized")
+        return Num(values[node])
@@ -0,0 +1,107 @@
+# tests/algebra_nodes_tests.py
+
+import copy
+import pickle
+
+import pytest
+
+from algebra_nodes import AlgebraNode, Num, Var, Sum, Prod, Neg, Pow
+
+
+def test_equal_nodes_are_the_same_object() -> None:
+    assert Sum((Num(1), Var("x"))) is Sum((Num(1), Var("x")))
+
+
+def test_keyword_construction_is_interned() -> None:
+    assert Pow(exp=Num(2), base=Var("x")) is Pow(Var("x"), Num(2))
+
+
+def test_int_and_float_literals_stay_distinct() -> None:
+    assert Num(1) is not Num(1.0)
+    assert repr(Num(1.0)) == "1.0"
+
+
+def test_signed_zeros_stay_distinct() -> None:
+    assert Num(-0.0) is not Num(0.0)
+    assert repr(Num(-0.0)) == "-0.0"
+    assert Num(complex(0.0, -0.0)) is not Num(0j)
+
+
+def test_different_structure_is_not_equal() -> None:
+    assert Prod((Var("x"), Var("y"))) != Prod((Var("y"), Var("x")))
+
+
+def test_hash_matches_for_equal_nodes() -> None:
+    assert hash(Sum((Var("x"), Num(2)))) == hash(Sum((Var("x"), Num(2))))
+
+
+def test_pickle_and_copy_keep_identity() -> None:
+    node = Pow(Sum((Var("x"), Num(1))), Num(2))
+    assert pickle.loads(pickle.dumps(node)) is node
+    assert copy.deepcopy(node) is node
+
+
+def test_metadata_of_leaves() -> None:
+    x = Var("x")
+    assert (x.free_vars, x.size, x.depth, x.is_numeric) == (frozenset("x"), 1, 1, False)
+    n = Num(3)
+    assert (n.free_vars, n.size, n.depth, n.is_numeric) == (frozenset(), 1, 1, True)
+
+
+def test_metadata_is_derived_from_children() -> None:
+    node = Sum((Pow(Var("x"), Num(2)), Prod((Num(3), Var("y"))), Num(1)))
+    assert node.free_vars == frozenset("xy")
+    assert node.size == 8
+    assert node.depth == 3
+    assert not node.is_numeric
+
+
+def test_numeric_subtree() -> None:
+    assert Pow(Sum((Num(1), Num(2))), Num(3)).is_numeric
+
+
+def test_walk_is_pre_order_and_handles_deep_trees() -> None:
+    expr = Sum((Var("x"), Prod((Num(2), Var("y")))))
+    assert list(expr.walk()) == [expr, Var("x"), expr.terms[1], Num(2), Var("y")]
+    deep: AlgebraNode = Var("x")
+    for _ in range(20_000):
+        deep = Neg(deep)
+    assert sum(1 for _ in deep.walk()) == 20_001
+
+
+def test_with_children_rebuilds_the_same_type() -> None:
+    x, y = Var("x"), Var("y")
+    assert Pow(x, y).with_children((y, x)) is Pow(y, x)
+    assert Sum((x, y)).with_children([y]) is Sum((y,))
+    assert Neg(x).with_children((y,)) is Neg(y)
+    assert Num(1).with_children(()) is Num(1)
+    with pytest.raises(ValueError):
+        x.with_children((y,))
+
+
+def test_node_classes_have_to_define_children() -> None:
+    with pytest.raises(TypeError, match="children"):
+
+        class Leaf(AlgebraNode):
+            pass
+
+    with pytest.raises(TypeError, match="with_children"):
+
+        class Frozen(AlgebraNode):
+            def children(self) -> tuple[AlgebraNode, ...]:
+                return ()
+
+
+def test_deep_trees_pickle() -> None:
+    tree = Var("x")
+    for _ in range(20_000):
+        tree = Neg(tree)
+    assert pickle.loads(pickle.dumps(tree)) is tree
+
+
+def test_substitute_rebuilds_only_the_bound_paths() -> None:
+    x, y = Var("x"), Var("y")
+    untouched = Pow(y, Num(2))
+    tree = Sum((Prod((Num(2), x)), untouched))
+    assert tree.substitute({"x": Sum((y, Num(1)))}) is Sum((Prod((Num(2), Sum((y, Num(1))))), untouched))
+    assert tree.substitute({"z": x}) is tree
@@ -0,0 +1,34 @@
+# tests/converter_tests.py
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from ast_to_algebra import Converter
+from lexer import Lexer
+from parser import Parser
+
+
+def convert(source: str):
+    return Converter(Parser(Lexer(source).tokenize()).parse()).convert_full()
+
+
+def test_sum_chain_is_flat() -> None:
+    assert convert("a+b-c+d") == Sum((Var("a"), Var("b"), Neg(Var("c")), Var("d")))
+
+
+def test_only_the_right_operand_is_negated() -> None:
+    assert convert("a-b-c") == Sum((Var("a"), Neg(Var("b")), Neg(Var("c"))))
+    assert convert("a-(b+c)") == Sum((Var("a"), Neg(Sum((Var("b"), Var("c"))))))
+
+
+def test_product_chain_is_flat() -> None:
+    assert convert("a/b/c*2") == Prod((Var("a"), Inv(Var("b")), Inv(Var("c")), Num(2)))
+
+
+def test_power_and_signs() -> None:
+    assert convert("-x^2+y") == Sum((Neg(Pow(Var("x"), Num(2))), Var("y")))
+    assert convert("+x") == Var("x")
+
+
+def test_long_chain() -> None:
+    tree = convert("+".join(f"{i}x" for i in range(20_000)))
+    assert isinstance(tree, Sum) and len(tree.terms) == 20_000
+    assert tree.depth == 3
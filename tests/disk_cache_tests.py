@@ -0,0 +1,91 @@
+# tests/disk_cache_tests.py
+
+import sqlite3
+
+import pytest
+
+from algebra_nodes import Num, Var, Prod, Pow
+from disk_cache import DiskCache
+from parallel import simplify_parallel
+from pipeline import run_pipeline
+from simplify import Simplifier
+
+
+def test_results_persist_across_instances(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    with DiskCache(path) as cache:
+        assert run_pipeline("x*x", disk_cache=cache).result is Pow(Var("x"), Num(2))
+        assert cache.info().misses == 1
+    with DiskCache(path) as cache:
+        assert run_pipeline("x*x", disk_cache=cache).result is Pow(Var("x"), Num(2))
+        assert cache.info().hits == 1
+        assert len(cache) == 1
+
+
+def test_other_versions_are_not_reused(tmp_path) -> None:
+    node = Prod((Var("x"), Var("x")))
+    with DiskCache(str(tmp_path / "cache.sqlite")) as cache:
+        cache.put(node, Num(0), "stale")
+        assert cache.get(node, "stale") is Num(0)
+        assert cache.simplify(Simplifier(), node) is Pow(Var("x"), Num(2))
+        assert Simplifier(max_terms=10).version != Simplifier().version
+
+
+def test_least_recently_used_are_evicted(tmp_path) -> None:
+    with DiskCache(str(tmp_path / "cache.sqlite"), max_entries=2) as cache:
+        for name in "abc":
+            cache.put(Var(name), Num(1), "v")
+        cache.get(Var("a"), "v")
+        cache.put(Var("d"), Num(1), "v")
+        assert cache.evict() == 2
+        assert cache.get(Var("a"), "v") is Num(1)
+        assert cache.get(Var("b"), "v") is None
+
+
+def test_access_times_are_written_in_batches(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+
+    def accessed() -> float:
+        with sqlite3.connect(path) as connection:
+            return connection.execute("SELECT accessed FROM results").fetchone()[0]
+
+    with DiskCache(path) as cache:
+        cache.put(Var("x"), Num(1), "v")
+        stored = accessed()
+        assert cache.get(Var("x"), "v") is Num(1)
+        assert accessed() == stored
+    assert accessed() > stored
+
+
+def test_databases_of_an_older_schema_are_recreated(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    node = Prod((Var("x"), Var("x")))
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE results (version TEXT, input TEXT, result TEXT, accessed REAL,"
+            " PRIMARY KEY (version, input))"
+        )
+        connection.execute(
+            "INSERT INTO results VALUES (?, 'v1:x v1:x *2', 'i0', 0)", (Simplifier().version,)
+        )
+    with DiskCache(path) as cache:
+        assert len(cache) == 0
+        assert cache.simplify(Simplifier(), node) is Pow(Var("x"), Num(2))
+    with DiskCache(path) as cache:
+        assert len(cache) == 1
+
+
+def test_positive_size_cap(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        DiskCache(str(tmp_path / "cache.sqlite"), max_entries=0)
+
+
+def test_workers_share_the_database(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite")
+    sources = [f"{i}x*x" for i in range(20)]
+    first = simplify_parallel(sources, max_workers=2, chunk_size=3, disk_cache_path=path)
+    second = simplify_parallel(sources, max_workers=2, chunk_size=3, disk_cache_path=path)
+    assert [item.result for item in first] == [item.result for item in second]
+    assert all(item.error is None for item in first)
+    with DiskCache(path) as cache:
+        assert len(cache) == len(sources)
@@ -0,0 +1,55 @@
+# tests/eval_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from eval import EvalError, compile_expr, evaluate
+from simplify import Simplifier
+
+# 3x^2 - y/(x+1)
+EXPR = Sum(
+    (
+        Prod((Num(3), Pow(Var("x"), Num(2)))),
+        Neg(Prod((Var("y"), Inv(Sum((Var("x"), Num(1))))))),
+    )
+)
+
+
+def test_positional_and_named_bindings() -> None:
+    compiled = compile_expr(EXPR)
+    assert compiled.variables == ("x", "y")
+    assert compiled(1, 4) == 1.0
+    assert compiled(y=4, x=1) == 1.0
+    assert compiled.evaluate({"x": 1, "y": 4, "unused": 0}) == 1.0
+
+
+def test_numeric_expression() -> None:
+    assert evaluate(Prod((Num(2), Pow(Num(3), Num(2))))) == 18
+
+
+def test_compilation_is_cached() -> None:
+    assert compile_expr(EXPR) is compile_expr(EXPR)
+
+
+def test_renamed_variables_share_code() -> None:
+    a = compile_expr(Sum((Var("a"), Pow(Var("b"), Num(2)))))
+    b = compile_expr(Sum((Var("p"), Pow(Var("q"), Num(2)))))
+    assert a.function.__code__ is b.function.__code__
+
+
+def test_long_sum() -> None:
+    expr = Sum(tuple(Prod((Num(i), Var("x"))) for i in range(500)))
+    assert compile_expr(expr)(2) == 2 * sum(range(500))
+
+
+def test_complex_and_signed_constants() -> None:
+    root = Simplifier().simplify(Pow(Num(-2), Num(0.5)))
+    assert isinstance(root, Num) and isinstance(root.value, complex)
+    assert evaluate(Prod((Var("x"), root)), {"x": 2}) == 2 * root.value
+    assert evaluate(Pow(Var("x"), Num(-0.0)), {"x": 2}) == 1.0
+    assert evaluate(Sum((Num(1j), Num(2 - 1j)))) == 2
+
+
+def test_missing_variable() -> None:
+    with pytest.raises(EvalError, match="y"):
+        compile_expr(EXPR)(x=1)
@@ -0,0 +1,78 @@
+# tests/expand_tests.py
+
+import math
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Pow
+from expand import ExpansionError, expand_product, multiply_terms, power_terms
+from polynomial import Polynomial
+from simplify import Simplifier
+
+x, y, z = (Polynomial.variable(name, ("x", "y", "z")) for name in "xyz")
+
+
+def test_multinomial_coefficients() -> None:
+    terms = power_terms((x + y + z).terms, 12, 3)
+    assert len(terms) == math.comb(14, 2)
+    assert terms[(4, 4, 4)] == math.factorial(12) // math.factorial(4) ** 3
+    assert sum(terms.values()) == 3**12
+
+
+def test_power_matches_repeated_multiplication() -> None:
+    base = 2 * x - y + 3
+    repeated = Polynomial.constant(1, base.variables)
+    for _ in range(7):
+        repeated = repeated * base
+    assert base**7 == repeated
+
+
+def test_power_with_many_like_terms() -> None:
+    # far more exponent distributions than distinct terms, expanded by squaring
+    base = sum((x**i for i in range(20)), Polynomial())
+    assert (base**20).terms[(380, 0, 0)] == 1
+    assert len((base**20).terms) == 381
+
+
+def test_expand_product_merges_like_terms() -> None:
+    terms = expand_product([(x + y).terms, (x - y).terms, (x + 1).terms], 3)
+    assert Polynomial(("x", "y", "z"), terms) == (x**2 - y**2) * (x + 1)
+    assert expand_product([(x + y).terms, {}], 3) == {}
+
+
+def test_max_terms() -> None:
+    with pytest.raises(ExpansionError):
+        power_terms((x + y + z + 1).terms, 30, 3, max_terms=100)
+    with pytest.raises(ExpansionError):
+        multiply_terms((x + y).terms, (x + z).terms, max_terms=3)
+    with pytest.raises(ExpansionError):
+        power_terms((x + y).terms, 2, 3, max_terms=0)
+
+
+def test_huge_coefficients_are_refused_before_expanding() -> None:
+    # few terms, but coefficients of thousands of digits
+    with pytest.raises(ExpansionError):
+        power_terms((x + y).terms, 20_000, 3, max_terms=100_000)
+    with pytest.raises(ExpansionError):
+        power_terms((3 * x).terms, 5_000, 3, max_terms=100_000)
+    power = Pow(Sum((Var("x"), Var("y"))), Num(100_000))
+    assert Simplifier().simplify(power) is power
+
+
+def test_simplifier_expands_powers_of_sums() -> None:
+    expr = Pow(Sum((Var("x"), Num(1))), Num(2))
+    assert repr(Simplifier().simplify(expr)) == "(1 + 2x + (x^2))"
+
+
+def test_simplifier_leaves_large_expansions_factored() -> None:
+    power = Pow(Sum((Var("x"), Var("y"), Var("z"))), Num(12))
+    expr = Sum((power, Var("x"), Var("x")))
+    expected = Sum((power, Prod((Num(2), Var("x")))))
+    assert Simplifier(max_terms=50).simplify(expr) == expected
+
+
+def test_numbers_of_unexpanded_products_are_combined() -> None:
+    power = Pow(Sum((Var("x"), Var("y"))), Num(12))
+    expr = Prod((Num(2), Num(3), power))
+    assert Simplifier(max_terms=5).simplify(expr) is Prod((Num(6), power))
+    assert Simplifier(max_terms=5).simplify(Prod((Num(0), power))) is Num(0)
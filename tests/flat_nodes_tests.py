@@ -0,0 +1,84 @@
+# tests/flat_nodes_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from flat_nodes import NEG, POW, PROD, SUM, FlatTree, FlatTreeError
+
+
+def test_round_trip_and_layout() -> None:
+    x, y = Var("x"), Var("y")
+    tree = Sum((Prod((Num(2), x)), Pow(y, Num(0.5)), Neg(Inv(x))))
+    flat = FlatTree.from_node(tree)
+    assert len(flat) == tree.size
+    assert flat.to_node() is tree
+    root = flat.root
+    assert root == len(flat) - 1
+    assert flat.children(root) == [2, 5, 8]
+    assert list(flat.subtree(2)) == [0, 1, 2]
+    assert [flat.ops[i] for i in flat.walk()][:2] == [SUM, PROD]
+
+
+def test_builder() -> None:
+    flat = FlatTree()
+    flat.append_num(2)
+    flat.append_var("x")
+    flat.append(PROD, 2)
+    flat.append_var("x")
+    flat.append(NEG)
+    flat.append(SUM, 2)
+    assert flat.to_node() is Sum((Prod((Num(2), Var("x"))), Neg(Var("x"))))
+    with pytest.raises(FlatTreeError):
+        flat.append(POW)
+    with pytest.raises(FlatTreeError):
+        flat.append(SUM)
+
+
+def test_evaluate() -> None:
+    flat = FlatTree.from_node(Sum((Prod((Num(3), Var("x"))), Inv(Var("y")), Neg(Num(1)))))
+    assert flat.evaluate({"x": 2, "y": 4}) == 5.25
+    with pytest.raises(FlatTreeError):
+        flat.evaluate({"x": 2})
+
+
+@pytest.mark.parametrize(
+    ("tree", "expected"),
+    [
+        (Sum((Num(1), Var("x"), Num(2))), Sum((Num(3), Var("x")))),
+        (Prod((Var("x"), Num(0), Var("y"))), Num(0)),
+        (Sum((Var("x"), Sum((Var("y"), Var("z"))), Num(0))), Sum((Var("x"), Var("y"), Var("z")))),
+        (Prod((Num(1), Prod((Var("x"), Num(2))))), Prod((Num(2), Var("x")))),
+        (Pow(Sum((Var("x"), Num(0))), Num(1)), Var("x")),
+        (Pow(Var("x"), Num(0)), Num(1)),
+        (Neg(Neg(Neg(Neg(Var("x"))))), Var("x")),
+        (Inv(Inv(Pow(Num(2), Num(3)))), Num(8.0)),
+        (Sum((Num(0.5), Num(0.5))), Num(1.0)),
+        (Sum((Sum((Var("y"), Num(2))), Num(-2))), Var("y")),
+        (Prod((Num(2), Prod((Num(3), Var("x"))), Var("y"))), Prod((Num(6), Var("x"), Var("y")))),
+        (Sum((Num(1), Sum((Var("x"), Sum((Num(2), Var("y"))))))), Sum((Num(3), Var("x"), Var("y")))),
+    ],
+)
+def test_simplify(tree, expected) -> None:
+    simplified = FlatTree.from_node(tree).simplify()
+    assert simplified.to_node() is expected
+    assert FlatTree.from_node(expected).starts == simplified.starts
+    # a second pass finds nothing left to do
+    assert simplified.simplify().to_node() is expected
+
+
+def test_deep_tree() -> None:
+    tree = Var("x")
+    for _ in range(20_000):
+        tree = Neg(Sum((tree, Num(1))))
+    flat = FlatTree.from_node(tree)
+    assert flat.to_node() is tree
+    assert flat.evaluate({"x": 1}) == 1
+    assert flat.simplify().evaluate({"x": 1}) == 1
+
+
+def test_numpy_views() -> None:
+    np = pytest.importorskip("numpy")
+    flat = FlatTree.from_node(Pow(Var("x"), Num(2)))
+    views = flat.to_numpy()
+    assert views["ops"].tolist() == list(flat.ops)
+    assert flat.evaluate({"x": np.arange(3)}).tolist() == [0, 1, 4]
@@ -0,0 +1,65 @@
+# tests/incremental_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Pow
+from incremental import IncrementalError, IncrementalSession, node_at, replace_at, to_algebra
+from simplify import Simplifier
+
+
+def test_replace_copies_only_the_path() -> None:
+    x, y = Var("x"), Var("y")
+    untouched = Pow(y, Var("z"))
+    tree = Sum((Prod((Num(2), x)), untouched))
+    new = replace_at(tree, (0, 1), y)
+    assert new == Sum((Prod((Num(2), y)), untouched))
+    assert new.terms[1] is untouched
+    assert replace_at(tree, (), x) is x
+    assert node_at(new, (0, 1)) is y
+
+
+def test_invalid_paths() -> None:
+    tree = Sum((Var("x"), Var("y")))
+    with pytest.raises(IncrementalError):
+        node_at(tree, (2,))
+    with pytest.raises(IncrementalError):
+        replace_at(tree, (0, 0), Num(1))
+
+
+def test_edits_match_simplifying_from_scratch() -> None:
+    source = "+".join(f"{i}x^y/(x+{i})" for i in range(50))
+    session = IncrementalSession(source)
+    assert session.result == Simplifier().simplify(to_algebra(source))
+    result = session.replace((3,), "2z")
+    assert result == Simplifier().simplify(session.tree)
+    assert session.node_at((3,)) == to_algebra("2z")
+
+
+def test_untouched_subtrees_are_reused() -> None:
+    simplifier = Simplifier(cache_size=10_000)
+    session = IncrementalSession("+".join(f"{i}x^y/(x+{i})" for i in range(200)), simplifier)
+    session.result
+    before = simplifier.cache_info()
+    session.replace((7,), "q^y")
+    after = simplifier.cache_info()
+    # the new term, its children and the root, not the 199 other terms
+    assert after.misses - before.misses < 10
+
+
+@pytest.mark.parametrize("replacement", ["x*y", "x*y*z"])
+def test_polynomial_subtrees_are_reused(replacement: str) -> None:
+    simplifier = Simplifier(cache_size=10_000)
+    session = IncrementalSession("+".join(f"{i}x^3(y+{i})^2" for i in range(100)), simplifier)
+    session.result
+    before = simplifier.polynomial_cache_info()
+    # a new variable does not invalidate the expansions of the other terms
+    result = session.replace((0,), replacement)
+    after = simplifier.polynomial_cache_info()
+    assert result == Simplifier().simplify(session.tree)
+    assert after.hits - before.hits >= 99
+    assert after.misses - before.misses < 10
+
+
+def test_simplifier_has_to_memoize() -> None:
+    with pytest.raises(IncrementalError):
+        IncrementalSession("x", Simplifier())
@@ -0,0 +1,87 @@
+# tests/lexer_tests.py
+
+import pytest
+
+from lexer import Lexer, LexerError, map_file
+from tokens import TokenKind
+
+
+def kinds(source: str, **kwargs) -> list[TokenKind]:
+    return [tok.kind for tok in Lexer(source, **kwargs).tokenize()]
+
+
+def test_operators_and_eof() -> None:
+    assert kinds("(+-*/^)") == [
+        TokenKind.LPAREN,
+        TokenKind.PLUS,
+        TokenKind.MINUS,
+        TokenKind.STAR,
+        TokenKind.SLASH,
+        TokenKind.CARET,
+        TokenKind.RPAREN,
+        TokenKind.EOF,
+    ]
+
+
+def test_positions_skip_whitespace() -> None:
+    tokens = Lexer(" x +\t12").tokenize()
+    assert [tok.pos for tok in tokens] == [1, 3, 5, 7]
+
+
+def test_numbers() -> None:
+    values = [tok.value for tok in Lexer("12+3.5+2,5").tokenize()[:-1] if tok.value]
+    assert values == [12, 3.5, 2.5]
+
+
+def test_letters_are_single_symbols_by_default() -> None:
+    tokens = Lexer("xy").tokenize()
+    assert [tok.value for tok in tokens[:-1]] == ["x", "y"]
+
+
+def test_multi_letter_symbols() -> None:
+    tokens = Lexer("2 area+rx", multi_letter_symbols=True).tokenize()
+    assert [tok.value for tok in tokens[:-1]] == [2, "area", None, "rx"]
+
+
+def test_unknown_character_reports_position() -> None:
+    with pytest.raises(LexerError, match="position 4"):
+        Lexer("1 + $").tokenize()
+
+
+def test_space_inside_number() -> None:
+    with pytest.raises(LexerError, match="Space in the middle of a number"):
+        Lexer("2 3").tokenize()
+
+
+def test_too_many_separators() -> None:
+    with pytest.raises(LexerError, match="position 2"):
+        Lexer("x+1.2.3").tokenize()
+
+
+def test_iter_tokens_is_lazy() -> None:
+    tokens = Lexer("x+y @").iter_tokens()
+    assert next(tokens).kind is TokenKind.SYMBOL
+    assert next(tokens).kind is TokenKind.PLUS
+    assert next(tokens).kind is TokenKind.SYMBOL
+    with pytest.raises(LexerError):
+        next(tokens)
+
+
+def test_bytes_and_mapped_sources(tmp_path) -> None:
+    source = "2,5x^2 - (y+12)"
+    expected = Lexer(source).tokenize()
+    assert Lexer(source.encode()).tokenize() == expected
+    path = tmp_path / "expr.txt"
+    path.write_bytes(source.encode())
+    with map_file(str(path)) as mapped:
+        assert list(Lexer(mapped).iter_tokens()) == expected
+
+
+def test_history_references_are_opt_in() -> None:
+    tokens = Lexer("%12x", history_references=True).tokenize()
+    assert [(token.kind, token.value) for token in tokens[:2]] == [
+        (TokenKind.SYMBOL, "%12"),
+        (TokenKind.SYMBOL, "x"),
+    ]
+    with pytest.raises(LexerError):
+        Lexer("%12x").tokenize()
@@ -0,0 +1,73 @@
+# tests/main_tests.py
+
+import io
+import json
+
+import pytest
+
+from algebra_nodes import Num
+from main import build_arg_parser, main, run_batch
+from pipeline import BatchItem
+
+LINES = "x*x\n\nx$\n1+1\n"
+
+
+@pytest.mark.parametrize("option", ["--jobs", "--cache-size"])
+def test_counts_have_to_be_non_negative(option: str) -> None:
+    assert build_arg_parser().parse_args(["--batch", option, "0"]) is not None
+    with pytest.raises(SystemExit):
+        build_arg_parser().parse_args(["--batch", option, "-1"])
+
+
+def test_disk_cache_size_has_to_be_positive() -> None:
+    assert build_arg_parser().parse_args(["--disk-cache-size", "1"]).disk_cache_size == 1
+    with pytest.raises(SystemExit):
+        build_arg_parser().parse_args(["--disk-cache-size", "0"])
+
+
+@pytest.mark.parametrize("argv", [["-x+2"], ["--", "-x+2"]])
+def test_expression_with_a_leading_minus(capsys, argv) -> None:
+    assert main(argv) == 0
+    assert capsys.readouterr().out == "(2 + -1x)\n"
+
+
+def test_unrecognized_arguments() -> None:
+    with pytest.raises(SystemExit):
+        main(["x", "-y"])
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch_file(tmp_path, capsys, jobs) -> None:
+    path = tmp_path / "input.txt"
+    path.write_text(LINES, encoding="utf-8")
+    assert main(["--batch", str(path), "--jobs", jobs]) == 1
+    output = capsys.readouterr()
+    lines = output.out.splitlines()
+    assert len(lines) == 3
+    assert lines[0] == "(x^2)"
+    assert lines[1].startswith("error: line 3: LexerError")
+    assert lines[2] == "2"
+    assert "3 expressions, 1 errors" in output.err
+
+
+def test_batch_from_stdin_leaves_it_open(monkeypatch, capsys) -> None:
+    stdin = io.StringIO("x+x\n")
+    monkeypatch.setattr("sys.stdin", stdin)
+    assert main(["--batch", "--format", "json"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"line": 1, "input": "x+x", "result": "2x"}
+    assert not stdin.closed
+
+
+def test_run_batch_flushes_every_line() -> None:
+    class Out(io.StringIO):
+        def __init__(self) -> None:
+            super().__init__()
+            self.flushed: list[str] = []
+
+        def flush(self) -> None:
+            self.flushed.append(self.getvalue())
+
+    out = Out()
+    items = [BatchItem(0, "1", Num(1)), BatchItem(1, "(", None, "ParserError: ...")]
+    assert run_batch(items, out, "text") == (2, 1)
+    assert out.flushed == ["1\n", "1\nerror: line 2: ParserError: ...\n"]
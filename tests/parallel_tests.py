@@ -0,0 +1,62 @@
+# tests/parallel_tests.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import parallel
+from algebra_nodes import Num, Var, Pow
+from parallel import iter_simplify_parallel, make_pool, simplify_parallel
+
+
+SOURCES = ["x*x", "2 3", "x+x", "1+2"] * 10
+
+
+def test_results_in_input_order() -> None:
+    items = simplify_parallel(SOURCES, max_workers=2, chunk_size=3)
+    assert [item.index for item in items] == list(range(len(SOURCES)))
+    assert [item.source for item in items] == SOURCES
+    assert items[0].result is Pow(Var("x"), Num(2))
+    assert items[3].result is Num(3)
+
+
+def test_errors_are_captured_per_item() -> None:
+    items = simplify_parallel(SOURCES[:4], max_workers=2, chunk_size=1)
+    assert items[1].result is None
+    assert items[1].error is not None and items[1].error.startswith("LexerError")
+    assert all(item.error is None for i, item in enumerate(items) if i != 1)
+
+
+def test_streaming_with_a_shared_pool() -> None:
+    with make_pool(max_workers=2) as pool:
+        for _ in range(2):
+            items = list(
+                iter_simplify_parallel(iter(SOURCES), max_workers=2, executor=pool, chunk_size=4)
+            )
+            assert sorted(item.index for item in items) == list(range(len(SOURCES)))
+
+
+def test_slow_first_chunk_bounds_the_chunks_read(monkeypatch) -> None:
+    run_chunk = parallel._run_chunk
+
+    def slow_first(start: int, sources: list[str]) -> list:
+        if start == 0:
+            time.sleep(0.3)
+        return run_chunk(start, sources)
+
+    monkeypatch.setattr(parallel, "_run_chunk", slow_first)
+    read = 0
+
+    def sources():
+        nonlocal read
+        for source in SOURCES:
+            read += 1
+            yield source
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        items = iter_simplify_parallel(
+            sources(), max_workers=2, chunk_size=1, ordered=True, executor=pool
+        )
+        assert next(items).index == 0
+        # 2 chunks per worker, the finished ones waiting behind the first included
+        assert read == 4
+        assert [item.index for item in items] == list(range(1, len(SOURCES)))
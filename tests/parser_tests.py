@@ -0,0 +1,164 @@
+# tests/parser_tests.py
+
+import random
+
+import pytest
+
+from lexer import Lexer
+from parser import Parser, ParserError
+from parser_nodes import Binary, Number, Symbol, Unary
+from tokens import TokenKind
+
+
+# tokens that start an operand, and an implicit product after another one
+IMPLICIT = (TokenKind.NUMBER, TokenKind.SYMBOL, TokenKind.LPAREN)
+
+
+def parse(source: str):
+    return Parser(Lexer(source).tokenize()).parse()
+
+
+def reference(source: str):
+    """A recursive descent parser of the same grammar, parse() has to agree with it"""
+    tokens = Lexer(source).tokenize()
+    pos = 0
+
+    def advance():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_sum():
+        left = parse_unary()
+        while tokens[pos].kind in (TokenKind.PLUS, TokenKind.MINUS):
+            op = advance().kind
+            left = Binary(op, left, parse_unary())
+        if tokens[pos].kind is TokenKind.RPAREN:
+            advance()
+        return left
+
+    def parse_unary():
+        if tokens[pos].kind in (TokenKind.PLUS, TokenKind.MINUS):
+            return Unary(advance().kind, parse_prod())
+        return parse_prod()
+
+    def parse_prod():
+        left = parse_exp()
+        while tokens[pos].kind in (*IMPLICIT, TokenKind.STAR, TokenKind.SLASH):
+            op = TokenKind.STAR if tokens[pos].kind in IMPLICIT else advance().kind
+            left = Binary(op, left, parse_exp())
+        return left
+
+    def parse_exp():
+        left = parse_atom()
+        if tokens[pos].kind is TokenKind.CARET:
+            advance()
+            return Binary(TokenKind.CARET, left, parse_exp())
+        return left
+
+    def parse_atom():
+        tok = tokens[pos]
+        if tok.kind not in IMPLICIT:
+            raise ParserError(f"Token {tok} not an atom")
+        advance()
+        if tok.kind is TokenKind.NUMBER:
+            return Number(tok.value)
+        if tok.kind is TokenKind.SYMBOL:
+            return Symbol(tok.value)
+        return parse_sum()
+
+    return parse_sum()
+
+
+def test_precedence_and_associativity() -> None:
+    # a - b*c^d^e
+    assert parse("a-b*c^d^e") == Binary(
+        TokenKind.MINUS,
+        Symbol("a"),
+        Binary(
+            TokenKind.STAR,
+            Symbol("b"),
+            Binary(
+                TokenKind.CARET,
+                Symbol("c"),
+                Binary(TokenKind.CARET, Symbol("d"), Symbol("e")),
+            ),
+        ),
+    )
+
+
+def test_sign_applies_to_the_product() -> None:
+    assert parse("-2x+y") == Binary(
+        TokenKind.PLUS,
+        Unary(TokenKind.MINUS, Binary(TokenKind.STAR, Number(2), Symbol("x"))),
+        Symbol("y"),
+    )
+
+
+def test_implicit_multiplication() -> None:
+    assert parse("2x(y)") == parse("2*x*(y)")
+    assert parse("x^2y") == parse("(x^2)*y")
+
+
+@pytest.mark.parametrize(
+    ("source", "message"),
+    [
+        ("--x", "Token Token(MINUS, '-', pos=1) not an atom"),
+        ("2*-3", "Token Token(MINUS, '-', pos=2) not an atom"),
+        ("2^-1", "Token Token(MINUS, '-', pos=2) not an atom"),
+        ("x+", "Token Token(EOF, '', pos=2) not an atom"),
+        ("()", "Token Token(RPAREN, ')', pos=1) not an atom"),
+        ("", "empty Input"),
+    ],
+)
+def test_errors(source: str, message: str) -> None:
+    with pytest.raises(ParserError) as error:
+        parse(source)
+    assert str(error.value) == message
+
+
+def test_unbalanced_parentheses() -> None:
+    assert parse("(x+1") == parse("(x+1)")
+    # a ")" without a "(" ends the input
+    assert parse("x)+y") == Symbol("x")
+
+
+def test_random_inputs_match_recursive_descent() -> None:
+    rng = random.Random(0)
+    for _ in range(2000):
+        source = "".join(rng.choice("xy12+-*/^()") for _ in range(rng.randint(1, 15)))
+        try:
+            expected = reference(source)
+        except ParserError:
+            with pytest.raises(ParserError):
+                parse(source)
+            continue
+        assert parse(source) == expected, source
+
+
+def test_deep_nesting_and_long_input() -> None:
+    depth = 20_000
+    tree = parse("(" * depth + "x" + ")" * depth)
+    assert tree == Symbol("x")
+    tree = parse("+".join(["x"] * 100_000))
+    assert isinstance(tree, Binary) and tree.right == Symbol("x")
+
+
+def test_streamed_tokens_use_bounded_lookahead() -> None:
+    source = "+".join(f"{i}x" for i in range(200))
+    ahead = []
+
+    def counting_tokens():
+        for produced, tok in enumerate(Lexer(source).iter_tokens()):
+            # tokens handed out but not yet consumed by the parser
+            ahead.append(produced - parser.pos)
+            yield tok
+
+    parser = Parser(counting_tokens())
+    assert parser.parse() == parse(source)
+    assert max(ahead) <= 1
+
+
+def test_tokens_without_eof() -> None:
+    with pytest.raises(ParserError, match="EOF"):
+        Parser(Lexer("x+y").tokenize()[:-1]).parse()
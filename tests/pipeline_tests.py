@@ -0,0 +1,44 @@
+# tests/pipeline_tests.py
+
+import json
+
+from algebra_nodes import Num, Var, Prod
+from pipeline import STAGES, run_pipeline, simplify_lines
+
+
+def test_result_without_metrics() -> None:
+    result = run_pipeline("x + x")
+    assert result.result == Prod((Num(2), Var("x")))
+    assert result.metrics is None
+
+
+def test_metrics_cover_every_stage() -> None:
+    metrics = run_pipeline("2x*x", collect_metrics=True).metrics
+    assert metrics is not None
+    assert [stage.stage for stage in metrics.stages] == list(STAGES)
+    assert metrics.stage("lex").items == 5
+    assert all(stage.peak_memory is not None for stage in metrics.stages)
+    assert metrics.total_time > 0
+
+
+def test_metrics_without_memory_tracking() -> None:
+    metrics = run_pipeline("x", collect_metrics=True, track_memory=False).metrics
+    assert metrics is not None
+    assert metrics.stage("simplify").peak_memory is None
+
+
+def test_metrics_json() -> None:
+    metrics = run_pipeline("1+2", collect_metrics=True).metrics
+    assert metrics is not None
+    data = json.loads(metrics.to_json())
+    assert data["source_length"] == 3
+    assert len(data["stages"]) == len(STAGES)
+
+
+def test_simplify_lines_captures_errors_and_skips_blank_lines() -> None:
+    items = list(simplify_lines(["x+x\n", "\n", "2 3\n", "x*x\n"]))
+    assert [item.index for item in items] == [0, 2, 3]
+    assert items[0].result == Prod((Num(2), Var("x")))
+    assert items[1].result is None
+    assert items[1].error is not None and items[1].error.startswith("LexerError")
+    assert items[2].error is None
@@ -0,0 +1,78 @@
+# tests/polynomial_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from cache import LRUCache
+from polynomial import Polynomial, PolynomialError
+from simplify import Simplifier
+
+x = Polynomial.variable("x")
+y = Polynomial.variable("y")
+
+
+def test_arithmetic_aligns_variables() -> None:
+    p = (x + y) * (x - y)
+    assert p.variables == ("x", "y")
+    assert p == x**2 - y**2
+    assert (p - p).is_zero()
+
+
+def test_power() -> None:
+    p = (x + 1) ** 3
+    assert p.terms == {(3,): 1, (2,): 3, (1,): 3, (0,): 1}
+    assert (2 * x) ** 2 == 4 * x**2
+    with pytest.raises(PolynomialError):
+        x**-1
+
+
+def test_from_node() -> None:
+    # (x + 1)(x - 1) / 2 + y^2
+    node = Sum(
+        (
+            Prod((Sum((Var("x"), Num(1))), Sum((Var("x"), Neg(Num(1)))), Inv(Num(2)))),
+            Pow(Var("y"), Num(2)),
+        )
+    )
+    assert Polynomial.from_node(node) == 0.5 * x**2 - 0.5 + y**2
+
+
+def test_from_node_rejects_non_polynomials() -> None:
+    assert not Inv(Var("x")).is_polynomial
+    assert not Pow(Var("x"), Var("y")).is_polynomial
+    assert not Pow(Var("x"), Num(0.5)).is_polynomial
+    assert Pow(Num(2), Num(0.5)).is_polynomial
+    with pytest.raises(PolynomialError):
+        Polynomial.from_node(Pow(Var("x"), Num(-1)))
+
+
+def test_to_node_is_canonical() -> None:
+    p = 3 * y * x + 2 * x**2 - 1
+    assert p.to_node() == Sum(
+        (
+            Num(-1),
+            Prod((Num(2), Pow(Var("x"), Num(2)))),
+            Prod((Num(3), Var("x"), Var("y"))),
+        )
+    )
+    assert Polynomial().to_node() == Num(0)
+
+
+def test_simplifier_merges_expanded_terms() -> None:
+    # (x + 1)(x + 1) used to keep x twice after distributing
+    expr = Prod((Sum((Var("x"), Num(1))), Sum((Var("x"), Num(1)))))
+    expected = Sum((Num(1), Prod((Num(2), Var("x"))), Pow(Var("x"), Num(2))))
+    assert Simplifier().simplify(expr) == expected
+
+
+def test_cached_subtrees_are_not_converted_again() -> None:
+    x, y = Var("x"), Var("y")
+    cache = LRUCache(100)
+    square = Pow(Sum((x, y)), Num(2))
+    first = Polynomial.from_node(Sum((square, x)), cache=cache)
+    misses = cache.info().misses
+    second = Polynomial.from_node(Sum((square, y)), cache=cache)
+    assert second == Polynomial.from_node(Sum((square, y)))
+    assert first != second
+    # only the new root missed, the square was found
+    assert cache.info().misses == misses + 1
@@ -0,0 +1,84 @@
+# tests/repl_tests.py
+
+import pytest
+
+import repl
+from algebra_nodes import Num, Var, Prod, Pow
+from repl import ReplError, ReplSession
+
+
+def test_results_are_numbered_and_reused() -> None:
+    session = ReplSession()
+    assert session.execute("x+x") == "%1 = 2x"
+    assert session.execute("%1/2") == "%2 = x"
+    assert session.history == [Prod((Num(2), Var("x"))), Var("x")]
+    with pytest.raises(ReplError):
+        session.execute("%3")
+
+
+def test_assignments() -> None:
+    session = ReplSession()
+    assert session.execute("a = x*x") == "a = %1 = (x^2)"
+    session.execute("a*x")
+    assert session.history[-1] is Pow(Var("x"), Num(3))
+    assert session.execute(":vars") == "a = (x^2)"
+    session.execute(":unset a")
+    session.execute("a")
+    assert session.history[-1] is Var("a")
+    with pytest.raises(ReplError):
+        session.execute("ab = 1")
+
+
+def test_multi_letter_names() -> None:
+    session = ReplSession(multi_letter_symbols=True)
+    session.execute("area = 2r")
+    session.execute("area*area")
+    assert session.history[-1] == session.simplify("4r^2").result
+
+
+def test_time_shows_every_stage() -> None:
+    output = ReplSession().execute(":time 2x*x")
+    assert output is not None
+    lines = output.splitlines()
+    assert lines[0] == "%1 = 2(x^2)"
+    assert [line.split()[0] for line in lines[1:]] == ["lex", "parse", "convert", "simplify", "total"]
+
+
+def test_commands() -> None:
+    session = ReplSession()
+    assert session.execute("  ") is None
+    assert ":time" in session.execute(":help")
+    with pytest.raises(ReplError):
+        session.execute(":nonsense")
+    session.execute(":quit")
+    assert not session.running
+
+
+def test_the_simplifier_stays_warm() -> None:
+    session = ReplSession()
+    session.execute("(x+1)^y + z/(x+1)")
+    info = session.simplifier.cache_info()
+    session.execute("(x+1)^y + z/(x+1)")
+    assert session.simplifier.cache_info().hits > info.hits
+
+
+def test_ctrl_c_interrupts_only_the_running_input(monkeypatch, capsys) -> None:
+    lines = iter(["x+x", "slow", "%1"])
+
+    def next_line(prompt: str) -> str:
+        try:
+            return next(lines)
+        except StopIteration:
+            raise EOFError from None
+
+    simplify = ReplSession.simplify
+
+    def interruptible(self, source: str, collect_metrics: bool = False):
+        if source == "slow":
+            raise KeyboardInterrupt
+        return simplify(self, source, collect_metrics)
+
+    monkeypatch.setattr("builtins.input", next_line)
+    monkeypatch.setattr(ReplSession, "simplify", interruptible)
+    assert repl.main([]) == 0
+    assert capsys.readouterr().out.splitlines() == ["%1 = 2x", "interrupted", "%2 = 2x"]
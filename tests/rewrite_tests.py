@@ -0,0 +1,103 @@
+# tests/rewrite_tests.py
+
+import pytest
+
+from algebra_nodes import AlgebraNode, Num, Var, Sum, Prod, Neg, Pow
+from rewrite import ANY, Pattern, Rule, RuleSet, RewriteError, literal, rewrite_node, rewrite_operands
+
+
+def run(steps, simplify=lambda node: node):
+    """Drives a rewrite generator, simplifying the nodes it yields with simplify"""
+    try:
+        node = next(steps)
+        while True:
+            node = steps.send(simplify(node))
+    except StopIteration as done:
+        return done.value
+
+
+def flatten_rules() -> RuleSet:
+    rules = RuleSet()
+
+    @rules.register(Sum)
+    def nested_sum(term: Sum) -> tuple[AlgebraNode, ...]:
+        return term.terms
+
+    return rules
+
+
+def test_replacements_take_the_operands_place() -> None:
+    x, y, z = Var("x"), Var("y"), Var("z")
+    operands = [x, Sum((y, Sum((z, Num(1))))), Num(2)]
+    assert run(rewrite_operands(operands, flatten_rules())) == [x, y, z, Num(1), Num(2)]
+
+
+def test_rules_only_apply_to_their_type() -> None:
+    rules = flatten_rules()
+    assert len(rules.rules_for(Sum((Var("x"),)))) == 1
+    assert rules.rules_for(Prod((Var("x"),))) == []
+
+
+def test_simplifying_rules_yield_their_replacements() -> None:
+    rules = RuleSet()
+    rules.add(Rule("negation", Neg, lambda node: (Prod((Num(-1), node.expr)),), simplify=True))
+    yielded = []
+
+    def simplify(node: AlgebraNode) -> AlgebraNode:
+        yielded.append(node)
+        return Var("done")
+
+    assert run(rewrite_operands([Neg(Var("x"))], rules), simplify) == [Var("done")]
+    assert yielded == [Prod((Num(-1), Var("x")))]
+
+
+def test_step_budget_terminates_cycles() -> None:
+    rules = RuleSet()
+    rules.add(Rule("swap", Var, lambda node: (Var("b" if node.name == "a" else "a"),)))
+    result = run(rewrite_operands([Var("a"), Num(1)], rules, max_steps=11))
+    assert result == [Var("b"), Num(1)]
+
+
+def test_rule_names_are_unique() -> None:
+    rules = flatten_rules()
+    with pytest.raises(RewriteError):
+        rules.add(Rule("nested_sum", Sum, lambda node: None))
+
+
+def test_patterns_match_by_shape() -> None:
+    rules = RuleSet()
+    rules.add(Rule("one", Pattern(Pow, (literal(1), ANY)), lambda node: Num(1)))
+    rules.add(Rule("nested", Pattern(Pow, (Pattern(Pow), ANY)), lambda node: None))
+    rules.add(Rule("square", Pattern(Pow, (ANY, literal(2))), lambda node: None))
+    rules.add(Rule("any_power", Pow, lambda node: None))
+    x = Var("x")
+
+    def names(node: AlgebraNode) -> list[str]:
+        return [rule.name for rule in rules.rules_for(node)]
+
+    assert names(Pow(Num(1), x)) == ["one", "any_power"]
+    assert names(Pow(Num(1.0), x)) == ["one", "any_power"]
+    assert names(Pow(Pow(x, x), Num(2))) == ["nested", "square", "any_power"]
+    assert names(Pow(x, Num(3))) == ["any_power"]
+    assert names(Neg(x)) == []
+
+
+def test_first_applying_rule_wins() -> None:
+    rules = RuleSet()
+    rules.add(Rule("skipped", Pattern(Neg, (ANY,)), lambda node: None))
+    rules.add(Rule("unwrap", Pattern(Neg, (Pattern(Neg),)), lambda node: node.expr.expr))
+    rules.add(Rule("never", Neg, lambda node: Num(0)))
+    x = Var("x")
+    assert run(rewrite_node(Neg(Neg(x)), rules)) == x
+    assert run(rewrite_node(x, rules)) == x
+
+
+def test_generator_rules_yield_subtrees() -> None:
+    rules = RuleSet()
+
+    def halve(node: Pow):
+        return Pow(node.base, (yield node.exp))
+
+    rules.add(Rule("halve", Pow, halve))
+    result = run(rewrite_node(Pow(Var("x"), Num(4)), rules), lambda node: Num(2))
+    assert result == Pow(Var("x"), Num(2))
@@ -0,0 +1,64 @@
+# tests/serialize_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from serialize import SerializeError, from_bytes, to_bytes
+
+
+def test_int_and_float_stay_apart() -> None:
+    assert from_bytes(to_bytes(Num(1))) is Num(1)
+    assert from_bytes(to_bytes(Num(1.0))) is Num(1.0)
+
+
+def test_signed_zeros_stay_apart() -> None:
+    tree = Sum((Num(0.0), Num(-0.0)))
+    assert from_bytes(to_bytes(tree)) is tree
+
+
+def test_binary_round_trip() -> None:
+    tree = Sum(
+        (
+            Prod((Num(2), Var("x"), Pow(Var("ä"), Num(0.5)))),
+            Neg(Inv(Var("y"))),
+            Num(1.0),
+            Num(1 + 2j),
+            Num(-3),
+            Num(-(10**40)),
+        )
+    )
+    data = to_bytes(tree)
+    assert data.startswith(b"CAS")
+    assert from_bytes(data) is tree
+    # read in place from a slice of a larger buffer
+    buffer = bytearray(b"xx" + data + b"yy")
+    assert from_bytes(memoryview(buffer)[2:-2]) is tree
+
+
+def test_repeated_subtrees_are_back_references() -> None:
+    term = Pow(Sum((Var("x"), Num(1))), Var("y"))
+    once = len(to_bytes(Sum((term, Var("z")))))
+    # every repetition is one opcode with a one-byte index
+    assert len(to_bytes(Sum((term, term, term, Var("z"))))) == once + 4
+    assert from_bytes(to_bytes(Sum((term, term)))) is Sum((term, term))
+
+
+def test_binary_deep_tree() -> None:
+    tree = Var("x")
+    for i in range(20_000):
+        tree = Pow(tree, Num(i))
+    assert from_bytes(to_bytes(tree)) is tree
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"XYZ\x01", b"CAS\x09", b"CAS\x01\x00\x00\x01\x00\x00", b"CAS\x01\x00\x00\x01\x09"],
+)
+def test_invalid_bytes(data: bytes) -> None:
+    with pytest.raises(SerializeError):
+        from_bytes(data)
+
+
+def test_trailing_bytes() -> None:
+    with pytest.raises(SerializeError):
+        from_bytes(to_bytes(Var("x")) + b"\x00")
@@ -0,0 +1,112 @@
+# tests/server_tests.py
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import server
+from server import SimplificationServer
+
+
+async def roundtrip(srv: SimplificationServer, lines: list[bytes]) -> list[dict]:
+    listener = await srv.start_tcp()
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.writelines(line + b"\n" for line in lines)
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    await srv.close()
+    return responses
+
+
+def run(lines: list[bytes], **kwargs) -> list[dict]:
+    async def main() -> list[dict]:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            srv = SimplificationServer(executor=executor, **kwargs)
+            return await roundtrip(srv, lines)
+
+    return asyncio.run(main())
+
+
+def request(request_id: int, op: str, expr: str) -> bytes:
+    return json.dumps({"id": request_id, "op": op, "expr": expr}).encode()
+
+
+def test_simplify_and_eval() -> None:
+    responses = run([request(1, "simplify", "x+x"), request(2, "eval", "2^10")])
+    by_id = {response["id"]: response for response in responses}
+    assert by_id[1] == {"id": 1, "ok": True, "result": "2x"}
+    assert by_id[2] == {"id": 2, "ok": True, "result": 1024}
+
+
+def test_complex_values() -> None:
+    (response,) = run([request(1, "eval", "(-2)^0.5")])
+    assert response["ok"]
+    assert response["result"]["re"] == pytest.approx(0)
+    assert response["result"]["im"] == pytest.approx(2**0.5)
+
+
+def test_unencodable_results_still_get_a_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, "run_op", lambda op, source: {1, 2})
+    (response,) = run([request(1, "eval", "1")])
+    assert response["id"] == 1
+    assert not response["ok"]
+    assert "cannot be encoded" in response["error"]
+
+
+def test_errors_are_responses() -> None:
+    responses = run(
+        [
+            request(1, "simplify", "2 3"),
+            request(2, "eval", "x"),
+            request(3, "integrate", "x"),
+            b"not json",
+        ]
+    )
+    assert all(not response["ok"] for response in responses)
+    assert {response["id"] for response in responses} == {1, 2, 3, None}
+
+
+def test_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    def slow_op(op: str, source: str) -> str:
+        time.sleep(0.5)
+        return source
+
+    monkeypatch.setattr(server, "run_op", slow_op)
+    (response,) = run([request(1, "simplify", "x")], timeout=0.05)
+    assert not response["ok"]
+    assert "timed out" in response["error"]
+
+
+def test_more_requests_than_slots() -> None:
+    lines = [request(i, "simplify", f"{i}x+x") for i in range(20)]
+    responses = run(lines, max_pending=2)
+    assert sorted(response["id"] for response in responses) == list(range(20))
+    assert all(response["ok"] for response in responses)
+
+
+def test_timed_out_requests_keep_their_pool_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+
+    def slow_op(op: str, source: str) -> str:
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.2)
+        with lock:
+            running -= 1
+        return source
+
+    monkeypatch.setattr(server, "run_op", slow_op)
+    lines = [request(i, "simplify", "x") for i in range(3)]
+    responses = run(lines, timeout=0.05, max_pending=1)
+    assert all("timed out" in response["error"] for response in responses)
+    assert most_running == 1
@@ -2,7 +2,7 @@
 
 import pytest
 
-from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+from algebra_nodes import AlgebraNode, Num, Var, Sum, Prod, Neg, Inv, Pow
 from simplify import Simplifier
 
 
@@ -170,3 +170,61 @@ def test_discard_empty_sum_to_zero(s: Simplifier) -> None:
 
 def test_discard_empty_prod_to_one(s: Simplifier) -> None:
     assert s.simplify(Prod(tuple())) == Num(1)
+
+
+def test_cache_is_disabled_by_default(s: Simplifier) -> None:
+    assert s.cache_info() is None
+
+
+def test_cached_simplify_matches_uncached(s: Simplifier) -> None:
+    cached = Simplifier(cache_size=64)
+    expr = Sum((Prod((Num(2), Var("x"))), Prod((Num(3), Var("x"))), Num(0)))
+    assert cached.simplify(expr) == s.simplify(expr)
+
+
+def test_cache_counts_hits_and_misses() -> None:
+    cached = Simplifier(cache_size=64)
+    expr = Prod((Var("x"), Var("x")))
+    cached.simplify(expr)
+    misses = cached.cache_info().misses
+    cached.simplify(expr)
+    info = cached.cache_info()
+    assert info.hits >= 1
+    assert info.misses == misses
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cached = Simplifier(cache_size=2)
+    for name in "xyz":
+        cached.simplify(Var(name))
+    assert cached.cache_info().currsize == 2
+
+
+def test_nested_sum_terms_are_flattened(s: Simplifier) -> None:
+    expr = Sum((Sum((Var("x"), Pow(Var("x"), Var("y")))), Pow(Var("x"), Var("y"))))
+    expected = Sum((Var("x"), Prod((Num(2), Pow(Var("x"), Var("y"))))))
+    assert s.simplify(expr) == expected
+
+
+DEPTH = 20_000  # far beyond the recursion limit
+
+
+def test_deep_power_tower(s: Simplifier) -> None:
+    tower: AlgebraNode = Var("x")
+    for _ in range(DEPTH):
+        tower = Pow(Var("x"), tower)
+    assert s.simplify(tower) == tower
+
+
+def test_deep_negations(s: Simplifier) -> None:
+    expr: AlgebraNode = Pow(Var("x"), Var("y"))
+    for _ in range(DEPTH):
+        expr = Neg(Neg(expr))
+    assert s.simplify(expr) == Pow(Var("x"), Var("y"))
+
+
+def test_deep_numeric_expression(s: Simplifier) -> None:
+    expr: AlgebraNode = Num(1)
+    for _ in range(DEPTH):
+        expr = Neg(Sum((expr, Num(2))))
+    assert s.eval(expr) == Num(1)
@@ -0,0 +1,54 @@
+# tests/vectorize_tests.py
+
+import pytest
+
+from algebra_nodes import Num, Var, Sum, Prod, Neg, Inv, Pow
+
+np = pytest.importorskip("numpy")
+
+from vectorize import evaluate_array, evaluate_grid  # noqa: E402
+
+# 3x^2 - y/(x+1)
+EXPR = Sum(
+    (
+        Prod((Num(3), Pow(Var("x"), Num(2)))),
+        Neg(Prod((Var("y"), Inv(Sum((Var("x"), Num(1))))))),
+    )
+)
+
+
+def reference(x, y):
+    return 3 * x**2 - y / (x + 1)
+
+
+def test_broadcasting() -> None:
+    x = np.linspace(0, 1, 7)[:, None]
+    y = np.linspace(-1, 1, 5)
+    assert np.allclose(evaluate_array(EXPR, {"x": x, "y": y}), reference(x, y))
+
+
+def test_chunked_matches_unchunked() -> None:
+    x = np.linspace(0, 1, 101)[:, None]
+    y = np.linspace(-1, 1, 37)
+    chunked = evaluate_array(EXPR, {"x": x, "y": y}, chunk_size=10)
+    assert chunked.shape == (101, 37)
+    assert np.allclose(chunked, reference(x, y))
+
+
+def test_grid_axes_follow_mapping_order() -> None:
+    x = np.linspace(0, 1, 4)
+    y = np.linspace(-1, 1, 3)
+    grid = evaluate_grid(EXPR, {"y": y, "x": x}, chunk_size=5)
+    assert grid.shape == (3, 4)
+    assert np.allclose(grid, reference(x[None, :], y[:, None]))
+
+
+def test_constant_expression() -> None:
+    assert evaluate_array(Pow(Num(2), Num(3)), {}) == 8
+
+
+def test_integer_inputs_are_evaluated_as_floats() -> None:
+    x = np.arange(1, 4)
+    assert np.allclose(evaluate_array(Pow(Var("x"), Num(-1)), {"x": x}), 1 / x)
+    complex_x = np.array([1j, 2])
+    assert evaluate_array(Prod((Var("x"), Var("x"))), {"x": complex_x}).dtype == complex_x.dtype
@@ -19,7 +19,7 @@ class TokenKind(Enum):
         return self.name
 
 
-@dataclass
+@dataclass(slots=True)
 class Token:
     """
     The class for Tokens outputted by the lexer
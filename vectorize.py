@@ -0,0 +1,126 @@
+"""
+Evaluates algebra trees over NumPy arrays of variable values, e.g. to sample an expression on a grid.
+NumPy is optional for the rest of the CAS, only this module needs it.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from collections.abc import Mapping
+from typing import Any
+
+from algebra_nodes import AlgebraNode
+from eval import EvalError, compile_expr
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+# elements evaluated at once, bounds the memory taken by the intermediate arrays
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("vectorized evaluation needs numpy (pip install numpy)")
+
+
+def _chunk_slices(shape: tuple[int, ...], chunk_size: int):
+    """
+    Yields index tuples that split an array of the given shape into blocks of at most chunk_size
+    elements (or a single row of the last axis, if that is longer). Blocks are views, never copies
+    """
+    # split along the first axis whose trailing block fits into a chunk
+    axis = len(shape) - 1
+    while axis > 0 and math.prod(shape[axis:]) <= chunk_size:
+        axis -= 1
+    block = math.prod(shape[axis + 1 :])
+    step = max(1, chunk_size // max(block, 1))
+    for outer in np.ndindex(*shape[:axis]):
+        for start in range(0, shape[axis], step):
+            yield (*outer, slice(start, start + step))
+
+
+def _input_array(values: Any, dtype: Any) -> np.ndarray:
+    array = np.asarray(values, dtype=dtype)
+    # NumPy refuses negative powers of integers, so bool and integer inputs are evaluated as floats
+    if dtype is None and array.dtype.kind in "biu":
+        return array.astype(float)
+    return array
+
+
+def evaluate_array(
+    node: AlgebraNode,
+    bindings: Mapping[str, Any],
+    *,
+    dtype: Any = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> np.ndarray:
+    """
+    Evaluates node element-wise over arrays of variable values.
+    The arrays are broadcast against each other like in any NumPy operation, and the result has
+    the broadcast shape. Large inputs are evaluated chunk by chunk, so only the output array and
+    about chunk_size elements per intermediate result are in memory at once.
+    Args:
+        node (AlgebraNode): The expression
+        bindings (Mapping[str, ArrayLike]): An array (or scalar) per variable, extra names are ignored
+        dtype: Converts the inputs to this dtype first. If None, bool and integer inputs are
+            converted to float and the others are used as they are
+        chunk_size (int): Elements evaluated at once
+    """
+    _require_numpy()
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size has to be positive, got {chunk_size}")
+    compiled = compile_expr(node)
+    try:
+        arrays = [_input_array(bindings[name], dtype) for name in compiled.variables]
+    except KeyError as e:
+        raise EvalError(f"no values given for the variable {e.args[0]}") from None
+    shape = np.broadcast_shapes(*(array.shape for array in arrays))
+    size = math.prod(shape)
+
+    if size <= chunk_size:
+        return np.asarray(np.broadcast_to(compiled.function(*arrays), shape))
+
+    # broadcast_to only creates views, so slicing them does not materialize the full inputs
+    views = [np.broadcast_to(array, shape) for array in arrays]
+    out: np.ndarray | None = None
+    for index in _chunk_slices(shape, chunk_size):
+        result = compiled.function(*(view[index] for view in views))
+        if out is None:
+            out = np.empty(shape, dtype=np.asarray(result).dtype)
+        out[index] = result
+    log.debug("evaluated %d elements in chunks of %d", size, chunk_size)
+    assert out is not None
+    return out
+
+
+def evaluate_grid(
+    node: AlgebraNode,
+    axes: Mapping[str, Any],
+    *,
+    dtype: Any = float,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> np.ndarray:
+    """
+    Samples node on the grid spanned by one 1-D array per variable, e.g. for graphing.
+    The result has one axis per entry of axes, in the mapping's order. The grid is never
+    materialized: every axis is reshaped so the arrays broadcast against each other.
+    """
+    _require_numpy()
+    open_axes = {}
+    for i, (name, values) in enumerate(axes.items()):
+        values = np.asarray(values, dtype=dtype)
+        if values.ndim != 1:
+            raise ValueError(f"the values of {name} have to be one dimensional")
+        shape = [1] * len(axes)
+        shape[i] = values.shape[0]
+        open_axes[name] = values.reshape(shape)
+    full_shape = tuple(np.shape(values)[0] for values in axes.values())
+    result = evaluate_array(node, open_axes, dtype=dtype, chunk_size=chunk_size)
+    # variables that do not occur in node leave their axis at length 1
+    return np.broadcast_to(result, full_shape)